@@ -1,6 +1,10 @@
+import io
+import os
 import sys
-import ast
+import time
+import shlex
 import cmd
+import functools
 
 import argparse
 import logging
@@ -12,11 +16,29 @@ from pyalup.Device import Device
 from pyalup.Frame import Frame, Command
 # import led effects and animations
 import effects
-import animator
 
-from inspect import getmembers, isfunction
-
-from tools import metrics, ping
+from inspect import getmembers, isfunction, isclass
+
+from tools.player import AnimationPlayer
+from tools.lazy import LazyImport
+from tools import daemon, discovery
+from tools.sessions import SessionManager
+from tools.baud import DetectBaud, SaveBaud
+from tools.supervisor import SupervisedDevice
+from tools import clock
+from tools import calibration
+from tools import cache
+from tools.arguments import CastString, CheckAnimationArguments
+
+# modules depending on NumPy, matplotlib or tqdm are loaded on first use to keep the startup fast
+animator = LazyImport("animator")
+sequencer = LazyImport("sequencer")
+timeline = LazyImport("timeline")
+metrics = LazyImport("tools.metrics")
+ping = LazyImport("tools.ping")
+clip = LazyImport("tools.clip")
+recorder = LazyImport("tools.recorder")
+resync = LazyImport("tools.resync")
 
 #sys.path.insert(0,'Python-ALUP')
 #import importlib  
@@ -37,6 +59,15 @@ from tools import metrics, ping
 #
 #
 
+# directory into which baked animation clips are saved, independent of the working directory
+CLIP_DIR = os.path.join(cache.CACHE_DIR, "clips")
+# frame rate at which animations are baked
+CLIP_FPS = 30
+# frame rate at which playlists and timelines are played
+PLAYLIST_FPS = 30
+# the number of reconnection attempts after the connection to a device was lost
+RECONNECT_RETRIES = 10
+
 
 class AlupController(cmd.Cmd):
     intro = """
@@ -52,49 +83,42 @@ Type 'help' for available commands"""
         super().__init__(completekey, stdin, stdout)
         logging.basicConfig()
         self.logger = logging.getLogger(__name__)
+        # all open device sessions
+        self.sessions = SessionManager()
         
 
     def do_connect(self, args):
-        """connect\nconnect [com] [baud]\t:\t Connect to serial device"""
-        try:
-            # extract com port and baud
-            splittedArgs = args.split(" ")
-            com_port = splittedArgs[0]
-            baud = 115200
-
-            if len(splittedArgs) > 1:
-                baud = int(splittedArgs[1])
-
-            # create new ALUP device
-            device = Device()
-            device.SerialConnect(com_port, baud) #todo: this hangs if baud is wrong
-            conn = AlupConnection(device, com_port)
-            conn.cmdloop()
-
-        except serial.serialutil.SerialException:
-            print("\nError: Could not connect to device: Device not found.\nType \"list\" to list all devices or \"exit\" to return")
+        """connect\nconnect [com] [baud | auto]\t:\t Connect to serial device. 'auto' detects the baud rate"""
+        if(OpenSerialSession(self.sessions, args) is not None):
+            self._RunSessions()
 
     def do_tcpconnect(self, args):
         """tcpconnect\nconnect [ip] [port]\t:\t Connect to a remote device via TCP"""
-        try:
-            # extract com port and baud
-            splittedArgs = args.split(" ")
-            ip = splittedArgs[0]
-            port = 5012
+        if(OpenTcpSession(self.sessions, args) is not None):
+            self._RunSessions()
+
+    def do_use(self, args):
+        """use [name]\t\t:\t Switch to an open device session (see 'sessions')"""
+        if(UseSession(self.sessions, args.strip())):
+            self._RunSessions()
 
-            if len(splittedArgs) > 1:
-                port = int(splittedArgs[1])
+    def do_sessions(self, args):
+        """sessions\t\t:\t List all open device sessions"""
+        PrintSessions(self.sessions)
 
-            # create new ALUP device
-            device = Device()
-            device.TcpConnect(ip, port)
-            conn = AlupConnection(device, ip + ":" + str(port))
-            conn.cmdloop()
+    def do_on(self, args):
+        """on [all | name | tag] [command]\t:\t Execute a command on all open sessions, the named session or all sessions with the tag"""
+        RunOnSessions(self.sessions, args)
 
-        except TimeoutError as e:
-            print("Could not connect to remote device: Device did not answer (timeout).")
-        except ConnectionRefusedError as e:
-            print("Connection Refused by remote device.")
+    def do_all(self, args):
+        """all [command]\t\t:\t Execute a command on all open sessions"""
+        RunOnSessions(self.sessions, "all " + args)
+
+    def _RunSessions(self):
+        # run the shell of the active session until no session is active anymore.
+        # 'use' ends the shell of a session and activates another one
+        while(self.sessions.active is not None):
+            self.sessions.Get(self.sessions.active).cmdloop()
 
 
     def do_loglevel(self, args):
@@ -127,8 +151,48 @@ Type 'help' for available commands"""
     def do_list(self, args):
         """list\t\t\t:\t List available serial devices"""
         ScanForDevices()
+
+    def do_discover(self, args):
+        """
+        discover\t\t:\t Find ALUP devices by probing all serial ports and the given network hosts concurrently
+        Options: --hosts [hosts] (e.g. 192.168.1.0/24, 192.168.1.10-20 or alup.local, comma separated),
+                 --port [tcp port], -b/--baud [baud], -t/--timeout [s], --no-serial
+        """
+        parser = argparse.ArgumentParser(
+                    prog='discover',
+                    description='find ALUP devices on serial ports and in the network',
+                    exit_on_error=False)
+        parser.add_argument('--hosts', help="the network hosts to probe", default="")
+        parser.add_argument('--port', help="the TCP port of the devices", type=int, default=discovery.TCP_PORT)
+        parser.add_argument('-b', '--baud', help="the baud rate of serial devices", type=int, default=115200)
+        parser.add_argument('-t', '--timeout', help="the maximum time in s for the discovery", type=float, default=2.0)
+        parser.add_argument('--no-serial', help="do not probe serial ports", action='store_true')
+        try:
+            args = parser.parse_args(args.split())
+            hosts = discovery.ExpandHosts(args.hosts)
+        except Exception as e:
+            # Do not exit on error
+            print(e)
+            return
+        print("Probing %s%d hosts for up to %.1fs..." % ("" if args.no_serial else "serial ports and ", len(hosts), args.timeout))
+        try:
+            devices = discovery.Discover([] if args.no_serial else None, hosts, args.baud, args.port, args.timeout)
+        except RuntimeError as e:
+            # e.g. no more threads can be started
+            print("Error: discovery failed: %s" % (e))
+            return
+        if(len(devices) == 0):
+            print("No ALUP devices found")
+            return
+        print("\nFound %d ALUP device(s):" % (len(devices)))
+        for device in devices:
+            command = "connect %s %d" % (device.address, args.baud) if device.kind == "serial" else "tcpconnect %s" % (device.address.replace(":", " "))
+            print("[%s]: '%s', %d LEDs\t(%s)" % (device.address, device.configuration.deviceName, device.configuration.ledCount, command))
     def do_exit(self, args):
         """exit\t\t\t:\t Exit program"""
+        # disconnect all sessions which are still open
+        if(len(self.sessions) > 0):
+            RunOnSessions(self.sessions, "all disconnect")
         return True
     
     def preloop(self):
@@ -137,13 +201,23 @@ Type 'help' for available commands"""
                     prog='Alup-Controller',
                     description='Interface with ALUP devices to control addressable LEDs')  
         parser.add_argument('-p', '--port', action='store')      # option that takes a value
-        parser.add_argument('-b', '--baud', action='store', default="115200")  
+        parser.add_argument('-b', '--baud', action='store', default="115200", help="the baud rate or 'auto'")  
         parser.add_argument('--debug', action='store_true')  
+        parser.add_argument('--daemon', action='store_true', help="keep the connection to the device given by --port open and execute commands from alup-ctl.py clients")
+        parser.add_argument('--socket', action='store', default=daemon.DEFAULT_SOCKET, help="the Unix socket of the daemon")
         args = parser.parse_args()
 
         # apply the commandline arguments
         if(args.debug):
             logging.root.setLevel(logging.DEBUG)
+        if(args.daemon):
+            if(args.port is None):
+                parser.error("--daemon requires --port")
+            print("Connecting to port '%s' with baud %s" % (args.port, args.baud))
+            if(OpenSerialSession(self.sessions, "%s %s" % (args.port, args.baud)) is None):
+                sys.exit(1)
+            RunDaemon(self.sessions, args.socket)
+            sys.exit(0)
         if(not args.port is None):
            print("Connecting to port '%s' with baud %s from command line arguments"  % (args.port, args.baud))
            self.do_connect(args=str(args.port) + " " + str(args.baud))
@@ -156,11 +230,27 @@ Type 'help' for available commands"""
 
 
 class AlupConnection(cmd.Cmd):
-    def __init__(self, device : Device,  com_port : str):   
+    # commands which send frames themselves and therefore stop a running animation
+    SENDING_COMMANDS = ["set", "setall", "clear", "effect", "calibrate", "ping", "measure_drift", "replay", "disconnect", "dc", "exit"]
+
+    def __init__(self, device : Device,  com_port : str, sessions : SessionManager = None):   
         self.device = device
+        self.name = com_port
         self.prompt = "(%s)> " % (com_port)
+        # all open device sessions of the CLI, including this one
+        if(sessions is None):
+            sessions = SessionManager()
+            sessions.Add(com_port, self)
+            sessions.Use(com_port)
+        self.sessions = sessions
         # cache the latest set of metrics for further use
         self._metrics_cache = None
+        # the active recording of sent frames, if any
+        self._recorder = None
+        # the animation playing in the background, if any
+        self._player = None
+        # the background resynchronization of the time delta, if any
+        self._resync = None
         super(AlupConnection, self).__init__()
     
     def __del__(self):
@@ -225,11 +315,15 @@ class AlupConnection(cmd.Cmd):
         effect [function name] [optional params]\t:\t Apply an effect from the effects.py library. [Function name] is the name of the effect function in effects.py
         effect [function name] help: Print help text (docstring) for the specified effect function from effects.py
         effect l | list : List all available effects from effects.py
+        effect expr "[expression]" : Apply a math expression of i, n and x to all LEDs, e.g. effect expr "hsv(x)". See expressions.py
         """
         splittedArgs = args.split(" ")
         if(len(splittedArgs) <= 0):
             print("No effect specified. Specify an effect function from effects.py or list all effects using \"effect list\"")
             return
+        if(splittedArgs[0] == "expr"):
+            ApplyExpressionEffect(self.device, args[len("expr"):])
+            return
         if(splittedArgs[0] == "l"):
             #short for 'list' but without printing the whole docstring for each effect
             ListEffects(verbose=False)
@@ -251,13 +345,20 @@ class AlupConnection(cmd.Cmd):
     def do_animation(self, args):
         """
         Apply an animation function from animator.py to the LEDs.
-        Press 'Ctl + c' to stop.
+        Animations play in the background; the prompt stays usable.
         Usage:
         animation [function name] [optional params]\t:\t Apply an animation from the animator.py library. [Function name] is the name of the animation
+        animation [function name] [optional params] --workers [n] : Render the animation in n worker processes
+        animation [function name] [optional params] --upsample [n] : Render every n-th frame only and interpolate the frames in between
         animation l | list : List all available animations
+        animation stop | pause | resume : Control the running animation
+        animation status : Show the state and live statistics (fps, dropped frames, send latency) of the running animation
+        animation bake [function name] [frames] [optional params] : Render the animation once into a clip file
+        animation clip [file or name] : Play a baked clip file without rendering. Names are looked up in the clip directory
+        animation expr "[expression]" : Play a math expression of i, n, x and t, e.g. animation expr "hsv(x + t / 100)". See expressions.py
         """
         splittedArgs = args.split(" ")
-        if(len(splittedArgs) <= 0):
+        if(len(splittedArgs) <= 0 or splittedArgs[0] == ""):
             print("No animation specified. Specify an animation function from animator.py or list all animations using \"animation list\"")
             return
         if(splittedArgs[0] == "l"):
@@ -267,15 +368,146 @@ class AlupConnection(cmd.Cmd):
         if(splittedArgs[0] == "list"):
             ListAnimations(verbose=True)
             return
+        if(splittedArgs[0] in ["stop", "pause", "resume", "status"]):
+            self._ControlAnimation(splittedArgs[0])
+            return
         if(len(splittedArgs) > 1 and splittedArgs[1] == "help"):
             AnimationHelp(splittedArgs[0])
             return
+        if(splittedArgs[0] == "bake"):
+            BakeAnimation(self.device, splittedArgs[1:])
+            return
+        if(splittedArgs[0] == "clip"):
+            self._StartAnimation(lambda: PlayClip(self.device, " ".join(splittedArgs[1:])))
+            return
+        if(splittedArgs[0] == "expr"):
+            self._StartAnimation(lambda: ApplyExpressionAnimation(self.device, args[len("expr"):]))
+            return
         # call function from effect library
         # the <n> parameter will be applied automatically
         # example: "effect StaticColors 0xffffff"
         #           "effect Rainbow"
-        ApplyAnimation(self.device, splittedArgs)
+        self._StartAnimation(lambda: ApplyAnimation(self.device, splittedArgs))
 
+    def _StartAnimation(self, createPlayer):
+        """
+        Start playing an animation in the background, replacing the running animation
+        @param createPlayer: function returning the AnimationPlayer or None on error.
+                             Called after the running animation stopped, as creating an Animator may send to the device
+        """
+        self._StopAnimation()
+        player = createPlayer()
+        if(player is None):
+            return
+        self._player = player
+        player.Start()
+        print("Playing animation '%s'. Use \"animation stop\" to stop it" % (player.name))
+
+    def _StopAnimation(self, verbose=False):
+        """
+        Stop the running animation, if any
+        """
+        if(self._player is None):
+            return
+        if(not self._player.Stop()):
+            # never let a second sender use the device
+            print("Waiting for animation '%s' to finish sending..." % (self._player.name))
+            self._player.Stop(None)
+        self.device.FlushBuffer()
+        if(verbose):
+            print(self._player.Status())
+        self._player = None
+
+    def _ControlAnimation(self, command):
+        if(self._player is None):
+            print("No animation is playing")
+            return
+        if(command == "stop"):
+            self._StopAnimation(verbose=True)
+        elif(command == "pause"):
+            self._player.Pause()
+            print("Paused animation '%s'" % (self._player.name))
+        elif(command == "resume"):
+            self._player.Resume()
+            print("Resumed animation '%s'" % (self._player.name))
+        elif(command == "status"):
+            print(self._player.Status())
+
+    def precmd(self, line):
+        # commands which send to the device stop a running animation first,
+        # as only one sender may use the device at a time
+        command = line.split(" ")[0]
+        if(self._player is not None and (command in self.SENDING_COMMANDS or line.startswith("metrics measure"))):
+            print("Stopping animation '%s'" % (self._player.name))
+            self._StopAnimation()
+        return super().precmd(line)
+
+
+    def do_playlist(self, args):
+        """
+        Play a playlist of effects and animations with crossfades in the background.
+        Use 'animation stop|pause|resume|status' to control it.
+        Options: [file], -c --crossfade [crossfade duration in s], --once (do not loop)
+        Playlist file format: one item per line: <duration in s> effect|animation <name> [optional params]
+        """
+        parser = argparse.ArgumentParser(
+                    prog='playlist',
+                    description='play a playlist of effects and animations',
+                    exit_on_error=False)
+        parser.add_argument('file', help="the playlist file")
+        parser.add_argument('-c', '--crossfade', help="the duration of crossfades in s", type=float, default=1.0)
+        parser.add_argument('--once', help="stop after the last item instead of looping", action='store_true')
+        try:
+            args = parser.parse_args(args.split(" "))
+        except Exception as e:
+            # Do not exit on error
+            print(e)
+            return False
+        try:
+            items = sequencer.LoadPlaylist(args.file, PLAYLIST_FPS)
+        except (OSError, ValueError) as e:
+            print("Error: could not load playlist: %s" % (e))
+            return
+        if(len(items) == 0):
+            print("The playlist is empty")
+            return
+        crossfade = round(args.crossfade * PLAYLIST_FPS)
+        print("Loaded %d items: %s" % (len(items), ", ".join(item.name for item in items)))
+        # playlists use a fixed frame rate, as item durations are given in time steps
+        self._StartAnimation(lambda: AnimationPlayer(animator.Animator(self.device, PLAYLIST_FPS, coalesce=True),
+                                                     sequencer.Sequencer, (items, crossfade, not args.once), name=args.file))
+
+    def do_timeline(self, args):
+        """
+        Play a keyframe timeline in the background.
+        Use 'animation stop|pause|resume|status' to control it.
+        Options: [file], --once (do not loop)
+        Timeline file format: one keyframe per line: <time in s> <easing> <effect name> [optional params]
+        Easings: linear, step, in, out, inout, sine
+        """
+        parser = argparse.ArgumentParser(
+                    prog='timeline',
+                    description='play a keyframe timeline',
+                    exit_on_error=False)
+        parser.add_argument('file', help="the timeline file")
+        parser.add_argument('--once', help="stop after the last keyframe instead of looping", action='store_true')
+        try:
+            args = parser.parse_args(args.split(" "))
+        except Exception as e:
+            # Do not exit on error
+            print(e)
+            return False
+        try:
+            keyframes = timeline.LoadTimeline(args.file, self.device.configuration.ledCount, PLAYLIST_FPS)
+        except (OSError, ValueError, TypeError) as e:
+            print("Error: could not load timeline: %s" % (e))
+            return
+        if(len(keyframes) == 0):
+            print("The timeline is empty")
+            return
+        # keyframe times are given in time steps, so the frame rate is fixed
+        self._StartAnimation(lambda: AnimationPlayer(animator.Animator(self.device, PLAYLIST_FPS, coalesce=True),
+                                                     timeline.Timeline, (keyframes, not args.once), name=args.file))
 
     def do_loglevel(self, args):
         """Get or set the log level.
@@ -306,10 +538,27 @@ class AlupConnection(cmd.Cmd):
 
     def do_calibrate(self, args):
         """
-        Calibrate the time sychronization for the connected device
+        Calibrate the time sychronization for the connected device.
+        Frames are sent until the time delta is accurate enough or the time budget is used up.
+        The result is saved and used as starting point for the next connection.
+        Options: -a --accuracy [target accuracy in ms], -b --budget [maximum duration in s]
         """
-        self.device.Calibrate()
-        print("Done.")
+        parser = argparse.ArgumentParser(
+                    prog='calibrate',
+                    description='calibrate the time synchronization of an ALUP device',
+                    exit_on_error=False)
+        parser.add_argument('-a', '--accuracy', type=float, default=1.0, help="the target accuracy of the time delta in ms")
+        parser.add_argument('-b', '--budget', type=float, default=5.0, help="the maximum duration of the calibration in s")
+        try:
+            args = parser.parse_args(args.split())
+        except Exception as e:
+            # Do not exit on error
+            print(e)
+            return False
+        result = calibration.Calibrate(self.device, args.accuracy, args.budget)
+        clock.SaveClockModel(self.device)
+        print("%s after %d frames (%.2fs): time delta %.1fms +- %.2fms" % ("Converged" if result.converged else "Budget used up",
+              result.frames, result.duration, result.delta, result.spread))
 
     def do_ping(self, args):
         """
@@ -352,6 +601,7 @@ class AlupConnection(cmd.Cmd):
                     exit_on_error=False)  
         parser.add_argument('command', choices=["measure", "plot", "print", "clear"])
         parser.add_argument('-n', help="number of measurements to take", type=int, default=10_000)
+        parser.add_argument('-w', '--window', help="maximum number of frames in flight (flow control). Unlimited if not given", type=int, default=None)
         try:
             args = parser.parse_args(args.split(" "))
         except Exception as e:
@@ -360,7 +610,7 @@ class AlupConnection(cmd.Cmd):
             return False
 
         if(args.command == "measure"):
-            self._metrics_cache = metrics.Measure(self.device, args.n)
+            self._metrics_cache = metrics.Measure(self.device, args.n, args.window)
             pass
         elif (args.command == "plot"):
             metrics.Plot(self.device, self._metrics_cache)
@@ -374,18 +624,135 @@ class AlupConnection(cmd.Cmd):
 
 
 
+    def do_record(self, args):
+        """
+        Record all frames sent to the device into a file
+        Usage:
+        record start [file]	:	 Start recording. If the file exists, frames are appended
+        record stop		:	 Stop recording
+        record status		:	 Show whether a recording is active
+        """
+        splittedArgs = args.split(" ")
+        if(splittedArgs[0] == "start"):
+            if(len(splittedArgs) < 2 or splittedArgs[1] == ""):
+                print("No file given. Usage: record start [file]")
+                return
+            if(self._recorder is not None):
+                print("Already recording to '%s'" % (self._recorder.path))
+                return
+            self._recorder = recorder.Recorder(self.device, " ".join(splittedArgs[1:]))
+            self._recorder.Start()
+            print("Recording to '%s'" % (self._recorder.path))
+        elif(splittedArgs[0] == "stop"):
+            self._StopRecording()
+        elif(splittedArgs[0] == "status"):
+            if(self._recorder is None):
+                print("Not recording")
+            else:
+                print("Recording to '%s' (%d frames)" % (self._recorder.path, self._recorder.frames))
+        else:
+            print("Unknown record command. Type 'help record' for more")
+
+    def _StopRecording(self):
+        if(self._recorder is None):
+            print("Not recording")
+            return
+        self._recorder.Stop()
+        print("Recorded %d frames to '%s'" % (self._recorder.frames, self._recorder.path))
+        self._recorder = None
+
+    def do_replay(self, args):
+        """
+        Replay a recording created with 'record'
+        Options: [file], -s --speed [playback speed factor], -m --max (send as fast as possible)
+        """
+        parser = argparse.ArgumentParser(
+                    prog='replay',
+                    description='replay a recording of sent frames',
+                    exit_on_error=False)
+        parser.add_argument('file', help="the recording file")
+        parser.add_argument('-s', '--speed', help="playback speed relative to the recording", type=float, default=1.0)
+        parser.add_argument('-m', '--max', help="send all frames as fast as possible", action='store_true')
+        try:
+            args = parser.parse_args(args.split(" "))
+        except Exception as e:
+            # Do not exit on error
+            print(e)
+            return False
+        speed = None if args.max else args.speed
+        start = time.time()
+        try:
+            count = recorder.Replay(self.device, args.file, speed)
+        except (OSError, ValueError) as e:
+            print("Error: could not replay recording: %s" % (e))
+            return
+        except KeyboardInterrupt:
+            print("Ctl + c pressed. Stopping replay.")
+            self.device.FlushBuffer()
+            return
+        runtime = time.time() - start
+        print("Replayed %d frames in %.2fs (%.1f fps)" % (count, runtime, count / max(runtime, 1e-6)))
+
     def do_measure_drift(self, args):
         """
-        Measure the drift of the device and calculate a linear correction factor
+        Measure the drift of the device and calculate a linear correction factor.
+        The drift is saved and used to predict the time synchronization of the next connection.
         Note: The measurement gets more accurate the longer it runs
         """
         #TODO: make number of measurements, delay between measurements configurable
         result = metrics.Measure(self.device)
         metrics.PrintDrift(result)
-        
+
+    def do_resync(self, args):
+        """
+        Keep the time synchronization up to date while the device is idle
+        Usage:
+        resync start [max error in ms]	:	 Send sync frames in the background, as often as the measured drift requires
+        resync stop		:	 Stop the background resynchronization
+        resync status		:	 Show the measured drift and sync interval
+        """
+        splittedArgs = args.split()
+        if(len(splittedArgs) == 0):
+            splittedArgs = ["status"]
+        if(splittedArgs[0] == "start"):
+            if(self._resync is not None):
+                print("Already resynchronizing")
+                return
+            try:
+                maxError = float(splittedArgs[1]) if len(splittedArgs) > 1 else 1.0
+            except ValueError:
+                print("Invalid max error: " + splittedArgs[1])
+                return
+            self._resync = resync.Resynchronizer(self.device, maxError)
+            self._resync.Start()
+            print("Resynchronizing with a max error of %.2fms" % (maxError))
+        elif(splittedArgs[0] == "stop"):
+            self._StopResync()
+        elif(splittedArgs[0] == "status"):
+            if(self._resync is None):
+                print("Not resynchronizing")
+            else:
+                print("Resynchronizing: drift %.2fppm, interval %.1fs, %d sync frames, %d skipped while busy" % (
+                      self._resync.drift * 1e6, self._resync.Interval(), self._resync.syncs, self._resync.skipped))
+        else:
+            print("Unknown resync command. Type 'help resync' for more")
+
+    def _StopResync(self):
+        if(self._resync is None):
+            print("Not resynchronizing")
+            return
+        self._resync.Stop()
+        self._resync = None
+        print("Stopped resynchronizing")
+
 
     def do_disconnect(self, args):
         """Send a Disconnect command, terminating the connection to the device without resetting LEDs"""
+        if(self._recorder is not None):
+            self._StopRecording()
+        if(self._resync is not None):
+            self._StopResync()
+        self.sessions.Remove(self.name)
         self.device.Disconnect()
         print("Disconnected")
         return True
@@ -399,10 +766,57 @@ class AlupConnection(cmd.Cmd):
 
     def do_exit(self, args):
         """Set LEDs to black and terminate connection to device"""
+        if(self._recorder is not None):
+            self._StopRecording()
+        if(self._resync is not None):
+            self._StopResync()
+        self.sessions.Remove(self.name)
         self.device.Clear()
         self.device.Disconnect()
         print("Cleared and Disconnected")
         return True
+
+    def do_connect(self, args):
+        """connect [com] [baud | auto]\t:\t Connect to another serial device and switch to it. This device stays connected"""
+        return OpenSerialSession(self.sessions, args) is not None
+
+    def do_tcpconnect(self, args):
+        """tcpconnect [ip] [port]\t:\t Connect to another remote device via TCP and switch to it. This device stays connected"""
+        return OpenTcpSession(self.sessions, args) is not None
+
+    def do_use(self, args):
+        """use [name]\t:\t Switch to another open device session (see 'sessions'). This device stays connected"""
+        return UseSession(self.sessions, args.strip()) and self.sessions.active != self.name
+
+    def do_sessions(self, args):
+        """sessions\t:\t List all open device sessions. The active session is marked with '*'"""
+        PrintSessions(self.sessions)
+
+    def do_tag(self, args):
+        """tag [tags...]\t:\t Add tags to this session, e.g. for 'on [tag] [command]'. Prints the tags if none are given"""
+        tags = args.split()
+        if(len(tags) > 0):
+            self.sessions.Tag(self.name, *tags)
+        print("Tags of '%s': %s" % (self.name, ", ".join(self.sessions.Tags(self.name)) or "none"))
+
+    def do_untag(self, args):
+        """untag [tags...]\t:\t Remove tags from this session"""
+        self.sessions.Untag(self.name, *args.split())
+        print("Tags of '%s': %s" % (self.name, ", ".join(self.sessions.Tags(self.name)) or "none"))
+
+    def do_on(self, args):
+        """
+        Execute a command on several device sessions
+        Usage: on [all | name | tag] [command]
+        Example: on stage setall 0xff0000
+        """
+        RunOnSessions(self.sessions, args)
+        # leave the shell if this session was closed by the command
+        return self.sessions.Get(self.name) is not self
+
+    def do_all(self, args):
+        """all [command]\t:\t Execute a command on all open device sessions, e.g. 'all setall 0x000000'"""
+        return self.do_on("all " + args)
     
 
 #-----------------------------------------------------------------------------
@@ -412,6 +826,178 @@ class AlupConnection(cmd.Cmd):
 #-----------------------------------------------------------------------------
 
 
+# serve commands from alup-ctl.py clients on the active session until all sessions are closed or Ctrl + c is pressed
+# @param sessions: the SessionManager with the open sessions
+# @param path: the path of the Unix socket
+def RunDaemon(sessions, path):
+    # only the output of the thread executing a command is sent to the client
+    stdout = daemon.OutputCapture(sys.stdout)
+
+    def Execute(line):
+        if(line.strip() == ""):
+            # do not repeat the last command like the interactive shell does
+            return daemon.OK, ""
+        conn = sessions.Get(sessions.active)
+        output = io.StringIO()
+        # cmd.Cmd writes its own messages (e.g. unknown commands) to its stdout
+        previous = conn.stdout
+        conn.stdout = output
+        try:
+            with stdout.Capture(output):
+                line = conn.precmd(line)
+                conn.postcmd(conn.onecmd(line), line)
+        finally:
+            conn.stdout = previous
+        if(sessions.active is None and len(sessions) > 0):
+            # the active session was closed; continue with the oldest open session
+            sessions.Use(sessions.Names()[0])
+        return (daemon.CLOSED if sessions.active is None else daemon.OK), output.getvalue()
+
+    server = daemon.DaemonServer(Execute, path)
+    try:
+        server.Start()
+    except OSError as e:
+        print("Error: could not start daemon: %s" % (e))
+        return
+    print("Daemon listening on '%s'. Use alup-ctl.py to send commands, press Ctrl + c to stop" % (path))
+    sys.stdout = stdout
+    try:
+        # wait with a timeout, so Ctrl + c is handled
+        while(not server.Wait(1)):
+            pass
+    except KeyboardInterrupt:
+        print("Stopping daemon")
+        RunOnSessions(sessions, "all disconnect")
+    finally:
+        sys.stdout = stdout.stream
+        server.Stop()
+
+
+# connect to a serial device and add it as new active session
+# @param args: string "<port> [baud]"
+# @return: the AlupConnection of the new session or None if the connection failed
+def OpenSerialSession(sessions, args):
+    try:
+        # extract com port and baud
+        splittedArgs = args.split(" ")
+        com_port = splittedArgs[0]
+        baud = 115200
+
+        if len(splittedArgs) > 1 and splittedArgs[1] == "auto":
+            # try all standard baud rates; SerialConnect hangs if the baud rate is wrong
+            print("Detecting baud rate of '%s'..." % (com_port))
+            result = DetectBaud(com_port)
+            if(result is None):
+                print("Error: Could not connect to '%s' using any standard baud rate" % (com_port))
+                return None
+            device, baud = result
+            print("Connected with baud rate %d" % (baud))
+            device = SupervisedDevice(functools.partial(_ConnectSerial, com_port, baud), device, RECONNECT_RETRIES)
+            return _AddSession(sessions, device, com_port)
+
+        if len(splittedArgs) > 1:
+            baud = int(splittedArgs[1])
+
+        # create new ALUP device which reconnects automatically if the connection is lost
+        device = SupervisedDevice(functools.partial(_ConnectSerial, com_port, baud), retries=RECONNECT_RETRIES)
+        # remember the working baud rate for 'auto'
+        SaveBaud(com_port, baud)
+        return _AddSession(sessions, device, com_port)
+
+    except serial.serialutil.SerialException:
+        print("\nError: Could not connect to device: Device not found.\nType \"list\" to list all devices or \"exit\" to return")
+    return None
+
+
+# connect to a remote device via TCP and add it as new active session
+# @param args: string "<ip> [port]"
+# @return: the AlupConnection of the new session or None if the connection failed
+def OpenTcpSession(sessions, args):
+    try:
+        # extract ip and port
+        splittedArgs = args.split(" ")
+        ip = splittedArgs[0]
+        port = 5012
+
+        if len(splittedArgs) > 1:
+            port = int(splittedArgs[1])
+
+        # create new ALUP device which reconnects automatically if the connection is lost
+        device = SupervisedDevice(functools.partial(_ConnectTcp, ip, port), retries=RECONNECT_RETRIES)
+        return _AddSession(sessions, device, ip + ":" + str(port))
+
+    except TimeoutError as e:
+        print("Could not connect to remote device: Device did not answer (timeout).")
+    except ConnectionRefusedError as e:
+        print("Connection Refused by remote device.")
+    return None
+
+
+def _ConnectSerial(com_port, baud):
+    device = Device()
+    device.SerialConnect(com_port, baud) #todo: this hangs if baud is wrong. Use 'auto' instead
+    return device
+
+
+def _ConnectTcp(ip, port):
+    device = Device()
+    device.TcpConnect(ip, port)
+    return device
+
+
+def _AddSession(sessions, device, name):
+    # start with the saved time synchronization of the device instead of an uncalibrated one
+    if(clock.SeedClock(device)):
+        print("Using saved time synchronization of '%s'" % (device.configuration.deviceName))
+    name = sessions.UniqueName(name)
+    conn = AlupConnection(device, name, sessions)
+    sessions.Add(name, conn)
+    sessions.Use(name)
+    return conn
+
+
+# make the given session the active one
+# @return: True on success
+def UseSession(sessions, name):
+    if(name not in sessions):
+        print("Unknown session '%s'. Open sessions: %s" % (name, ", ".join(sessions.Names()) or "none"))
+        return False
+    sessions.Use(name)
+    return True
+
+
+# print all open sessions; the active session is marked with '*'
+def PrintSessions(sessions):
+    if(len(sessions) == 0):
+        print("No open sessions")
+        return
+    for name in sessions.Names():
+        conn = sessions.Get(name)
+        marker = "*" if name == sessions.active else " "
+        tags = ", ".join(sessions.Tags(name)) or "-"
+        print("%s %s\t'%s', %d LEDs\tTags: %s\tReconnects: %d" % (marker, name, conn.device.configuration.deviceName, conn.device.configuration.ledCount, tags, getattr(conn.device, "reconnects", 0)))
+
+
+# execute a command on multiple sessions
+# @param args: string "<all | session name | tag> <command>"
+def RunOnSessions(sessions, args):
+    splittedArgs = args.strip().split(" ", 1)
+    if(len(splittedArgs) < 2 or splittedArgs[1].strip() == ""):
+        print("Usage: on [all | name | tag] [command]")
+        return
+    target, command = splittedArgs
+    if(command.split(" ")[0] in ["use", "on", "all", "connect", "tcpconnect"]):
+        print("Error: '%s' can not be executed on multiple sessions" % (command.split(" ")[0]))
+        return
+    targets = sessions.Select(target)
+    if(len(targets) == 0):
+        print("No session matches '%s'" % (target))
+        return
+    for name, conn in targets:
+        print("[%s]" % (name))
+        conn.onecmd(conn.precmd(command))
+
+
 # apply an effect from the effects.py module
 # the args parameter has to contain the function name of the effect as first argument
 # @param args: [<effect function name in effects.py>, <optional parameters for effect>...] where each element is a string
@@ -424,7 +1010,7 @@ def ApplyEffect(args, device):
         # they are converted into python datatypes automatically
 
         # try to automatically cast string arguments to their respective native types
-        castedArgs = [_castString(arg) for arg in args[1:]]
+        castedArgs = [CastString(arg, warn=True) for arg in args[1:]]
 
         # get effect function from effects.py by string name
         effect = getattr(effects, args[0])
@@ -443,6 +1029,52 @@ def ApplyEffect(args, device):
         print(e)
 
 
+# apply the effect described by a math expression (see expressions.py)
+# @param args: the expression, optionally in quotes
+def ApplyExpressionEffect(device, args):
+    expression = _ParseExpression(args)
+    if(expression is None):
+        return
+    try:
+        colors = effects.Expression(device.configuration.ledCount, expression)
+    except ValueError as e:
+        print("Error: %s" % (e))
+        return
+    device.SetColors(colors)
+    device.Send()
+
+
+# create a player for the animation described by a math expression (see expressions.py)
+# @param args: the expression, optionally in quotes
+# @return: an AnimationPlayer or None if the expression is invalid
+def ApplyExpressionAnimation(device, args):
+    expression = _ParseExpression(args)
+    if(expression is None):
+        return None
+    try:
+        # compile and check the expression now, as the animation is played on a background thread
+        animator.Expression(device.configuration.ledCount, 0, expression)
+    except ValueError as e:
+        print("Error: %s" % (e))
+        return None
+    anim = animator.Animator(device, coalesce=True)
+    return AnimationPlayer(anim, animator.Expression, (expression,), name="expr %s" % (expression))
+
+
+# get the expression of an 'expr' command and remove surrounding quotes
+# @return: the expression or None if none is given
+def _ParseExpression(args):
+    try:
+        expression = " ".join(shlex.split(args))
+    except ValueError as e:
+        print("Error: %s" % (e))
+        return None
+    if(expression == ""):
+        print("No expression given. Example: expr \"hsv(x)\"")
+        return None
+    return expression
+
+
 # print the docstring of the given effect
 # @param effectName: the string name of an effect function in effects.py
 def EffectHelp(effectName):
@@ -475,6 +1107,7 @@ def ListEffects(verbose=True):
 # the args parameter has to contain the function name of the animation as first argument and all non-optional function arguments except n and t.
 # For more info see animator.py
 # @param args: array of string: [<animation function name in animator.py>, <optional parameters for animation function>...]
+# @return: a tools.player.AnimationPlayer which plays the animation when started, or None on error
 def ApplyAnimation(device, args):
     global animator
     try:
@@ -483,33 +1116,109 @@ def ApplyAnimation(device, args):
         # Arguments for functions may be specified in args as string array
         # they are converted into python datatypes automatically
 
+        args = list(args)
+        # optional number of render worker processes: "--workers <n>"
+        # optional number of frames per animation time step: "--upsample <n>"
+        workers = _PopIntOption(args, "--workers")
+        upsample = _PopIntOption(args, "--upsample", 1)
+        if workers is False or upsample is False:
+            return
+
         # try to automatically cast string arguments to their respective native types
-        castedArgs = [_castString(arg) for arg in args[1:]]
+        castedArgs = [CastString(arg, warn=True) for arg in args[1:]]
 
         # get animation function from animator.py by string name
         animation = getattr(animator, args[0])
        
-        # initialize animator for the device with 10fps
-        anim = animator.Animator(device, 30)
-        print("Playing animation '%s'" % (animation.__name__))
-        try:
-            # Play the animation. Note: this function is blocking indefinitely
-            anim.Play(animation, *castedArgs)
-        except KeyboardInterrupt:
-            print("Ctl + c pressed. Stopping animation.")
-            device.FlushBuffer()
-            return
+        # check the arguments now, as the animation is played on a background thread
+        CheckAnimationArguments(animation, device.configuration.ledCount, castedArgs)
+
+        # initialize animator for the device; the fps are selected automatically from the link capacity
+        # frames are coalesced so the animation never lags behind if the link can not keep up
+        anim = animator.Animator(device, coalesce=True, workers=workers, upsample=upsample)
+        return AnimationPlayer(anim, animation, castedArgs)
 
     except AttributeError:
         print("Error: could not find function '%s' in animator.py" %(args[0]))
     except TypeError as e:
         print("Error: Wrong amount of arguments given for animation '%s'.\nAnimation documentation:\n" % str(args[0]))
-        print(anim.__doc__)
+        print(animation.__doc__)
         print("Note: the first two parameters (n, t) will be auto filled and need to be ignored for animation functions")
         print("Error Details:")
         print(e)
+    return None
 
 
+# remove the option "<name> <int>" from the given argument list
+# @return: the value of the option, the default if it is not given or False if the value is invalid
+def _PopIntOption(args, name, default=None):
+    if name not in args:
+        return default
+    index = args.index(name)
+    try:
+        value = int(args[index + 1])
+    except (IndexError, ValueError):
+        print("Error: %s expects a number" % (name))
+        return False
+    if value < 1:
+        print("Error: %s expects a number greater than 0" % (name))
+        return False
+    del args[index : index + 2]
+    return value
+
+
+# render an animation from animator.py into a clip file in CLIP_DIR
+# @param args: array of string: [<animation function name>, <number of frames>, <optional parameters for animation function>...]
+def BakeAnimation(device, args):
+    global animator
+    try:
+        animation = getattr(animator, args[0])
+        frames = int(args[1])
+    except AttributeError:
+        print("Error: could not find function '%s' in animator.py" %(args[0]))
+        return
+    except (IndexError, ValueError):
+        print("Usage: animation bake <name> <frames> [optional params]")
+        return
+    if(frames < 1):
+        # an empty clip can not be played
+        print("Usage: animation bake <name> <frames> [optional params]\n<frames> has to be at least 1")
+        return
+    castedArgs = [CastString(arg, warn=True) for arg in args[2:]]
+
+    path = os.path.join(CLIP_DIR, args[0] + ".clip")
+    print("Baking %d frames of animation '%s'" % (frames, args[0]))
+    try:
+        os.makedirs(CLIP_DIR, exist_ok=True)
+        render = animator.Animator.Renderer(animation, device.configuration.ledCount, *castedArgs)
+        count = clip.Bake(path, render, device.configuration.ledCount, frames, CLIP_FPS)
+    except TypeError as e:
+        print("Error: Wrong amount of arguments given for animation '%s'." % str(args[0]))
+        print(e)
+        return
+    except OSError as e:
+        print("Error: could not save clip: %s" % (e))
+        return
+    print("Saved %d frames to '%s'. Play it using \"animation clip %s\"" % (count, path, args[0]))
+
+
+# create a player for a baked clip file (see BakeAnimation)
+# @param path: the path of the clip file or the name of a clip in CLIP_DIR
+# @return: a tools.player.AnimationPlayer or None if the clip could not be opened
+def PlayClip(device, path):
+    named = os.path.join(CLIP_DIR, path + ".clip")
+    if not os.path.exists(path) and os.path.exists(named):
+        path = named
+    try:
+        animationClip = clip.Clip(path)
+    except (OSError, ValueError) as e:
+        print("Error: could not open clip: %s" % (e))
+        return None
+    anim = animator.Animator(device, animationClip.fps, coalesce=True)
+    print("Clip '%s': %d frames at %.1f fps" % (path, len(animationClip), animationClip.fps))
+    # the clip stays mapped until the animation is stopped
+    return AnimationPlayer(anim, animationClip, name=path, onFinish=animationClip.Close)
+
 
 # provide help by printint the docstring of the given animation
 # @param name: the string name of an animation function in animator.py
@@ -526,7 +1235,8 @@ def AnimationHelp(name):
 
 def ListAnimations(verbose=True):
     global animator
-    functions = getmembers(animator, isfunction)
+    # animations are functions or classes with a Render() method (stateful animations)
+    functions = getmembers(animator, lambda member: isfunction(member) or (isclass(member) and hasattr(member, "Render")))
     # filter out all private functions
     animation_functions = [function for function in functions if not function[0][0] == '_']
     print("Available Effects:")
@@ -539,18 +1249,6 @@ def ListAnimations(verbose=True):
 
 
 
-# try to convert the given string to a python datatype depending on its contents 
-def _castString(s):
-    try:
-        # note: even though literal_eval is considered mostly safe, do not use this in unintended places.
-        # this is only needed to cast string arguments from the CLI to python parameters for the effects functions.
-        return ast.literal_eval(s)
-    except ValueError:
-        print("Warning: Could not convert value %s into native type; Will be interpreted as string" %(s))
-        return s
-
-
-
 def ScanForDevices():
     print("Scanning for connected devices")
     ports = list_ports.comports()
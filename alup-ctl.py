@@ -0,0 +1,69 @@
+import sys
+import cmd
+import argparse
+
+from tools import daemon
+
+#
+#
+#   Thin client for the ALUP Controller daemon
+#
+#   Start the daemon:           python3 ALUP-Controller.py -p COM6 --daemon
+#   Execute a single command:   python3 alup-ctl.py setall 0xff0000
+#   Interactive shell:          python3 alup-ctl.py
+#
+
+
+class DaemonShell(cmd.Cmd):
+    intro = "Connected to the ALUP Controller daemon. Type 'help' for available commands, 'quit' to leave the daemon running"
+    prompt = "(daemon)> "
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def default(self, line):
+        # every command is executed by the daemon
+        kind, output = self.client.Execute(line)
+        print(output, end="")
+        return kind == daemon.CLOSED
+
+    def do_help(self, args):
+        return self.default(("help " + args).strip())
+
+    def do_quit(self, args):
+        """Leave the shell. The daemon keeps running"""
+        return True
+
+    def do_EOF(self, args):
+        return True
+
+    def emptyline(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+                prog='alup-ctl',
+                description='Send commands to a running ALUP Controller daemon (ALUP-Controller.py --daemon)')
+    parser.add_argument('--socket', action='store', default=daemon.DEFAULT_SOCKET, help="the Unix socket of the daemon")
+    parser.add_argument('--timeout', action='store', type=float, default=None, help="the maximum time in s to wait for a command")
+    parser.add_argument('command', nargs=argparse.REMAINDER, help="the command to execute. Starts an interactive shell if not given")
+    args = parser.parse_args()
+
+    try:
+        client = daemon.DaemonClient(args.socket, args.timeout)
+    except OSError as e:
+        print("Error: could not connect to the daemon at '%s': %s" % (args.socket, e))
+        return 1
+    with client:
+        if len(args.command) == 0:
+            DaemonShell(client).cmdloop()
+            return 0
+        kind, output = client.Execute(" ".join(args.command))
+        print(output, end="")
+        return 1 if kind == daemon.ERROR else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
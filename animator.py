@@ -43,6 +43,22 @@ on the the given time t
 
 To provide help to end users, add a docstring to animation functions.
 
+Stateful animations:
+Animations which need to keep state between frames (e.g. particles) do not have to recompute
+everything from t. Instead of a function, they can be written as
+- a generator function taking n and the extra arguments, which yields one array of colors per frame.
+  It may yield the same list every time and modify it in place. The animation ends when the generator
+  returns or yields an empty array. See Sparkle() for an example.
+- a class whose constructor takes n and the extra arguments, and which has a method Render(t)
+  returning the colors for time step t. See Comet for an example.
+
+Periodic animations:
+If an animation repeats itself after a fixed number of time steps, declare its period using
+the @_Periodic decorator. The Animator then memoizes the colors of every time step within the
+period and calls the animation function only once per step. Frames are still encoded and sent
+by pyalup every time, so this only saves the work of the animation function itself.
+See testAnimation() and blink() for examples.
+
 --------------------------------------------------
                     Notes
 --------------------------------------------------
@@ -61,6 +77,20 @@ make animations stop when empty array is returned
 import time
 import colorsys
 import random
+import inspect
+import threading
+
+# NOTE: only import modules here; all functions in this module are listed as animations
+import tools.fps
+import tools.flowcontrol
+import tools.coalescer
+import tools.dedup
+import tools.renderpool
+import tools.upsample
+from tools import colorarray
+import particles
+import expressions
+import numpy as np
 
 class Animator:
     """
@@ -68,7 +98,7 @@ class Animator:
     play animations on the given ALUP device
 
     """
-    def __init__(self, device, fps:float=30):
+    def __init__(self, device, fps:float=None, window:int=None, coalesce:bool=False, keepalive:float=1.0, workers:int=None, upsample:int=1):
         """
         Default constructor
 
@@ -78,46 +108,251 @@ class Animator:
                      might be hardware limited by the LEDs, microcontroller or connection type.
                      Range: [0, ...]. If the fps are higher than the microcontroller can handle,
                      the true FPS will just be the maximum possible depending on the hardware.
+                     If None, the fps are measured with the first frames, which are sent as fast as
+                     possible, and continuously adjusted while playing (see tools/fps.py).
+                     Measurements are cached per device.
+                     NOTE: t still increases by one per frame, so the animation speed follows the fps
+        @param window: the maximum number of frames in flight (see tools/flowcontrol.py).
+                       Defaults to half of the device's frame buffer
+        @param coalesce: if True, frames are sent from a separate thread which always sends the newest
+                         frame and drops older ones if the link can not keep up (see tools/coalescer.py)
+        @param keepalive: frames identical to the previous one are not sent, except once every `keepalive` seconds.
+                          None sends every frame (see tools/dedup.py)
+        @param workers: if given, animation functions are rendered ahead of time by this many
+                        worker processes (see tools/renderpool.py). Stateful and periodic animations
+                        are always rendered on the main thread
+        @param upsample: the number of frames per animation time step. Only every `upsample`-th frame is
+                         rendered, the frames in between are interpolated (see tools/upsample.py).
+                         NOTE: the animation advances by fps / upsample time steps per second
         """
         self.device = device
         self.fps = fps
+        # frame rate probe and controller; only used for automatic fps
+        self.fpsProbe = None
+        self.fpsController = None
+        if fps is None:
+            self.fps = tools.fps.LoadFps(device)
+            if self.fps is None:
+                # measured with the first frames of the animation (see Play())
+                self.fps = 30
+                self.fpsProbe = tools.fps.FpsProbe(device)
+            else:
+                self.fpsController = tools.fps.FpsController(device, self.fps)
+        # keep the receiver's buffer from filling up
+        self.flowControl = tools.flowcontrol.FlowControl(device, window)
+        # latest-wins send queue; only used if coalescing is enabled
+        self.coalescer = None
+        if coalesce:
+            self.coalescer = tools.coalescer.FrameCoalescer(device, self.flowControl)
+        # suppresses unchanged frames
+        self.dedup = None
+        if keepalive is not None:
+            self.dedup = tools.dedup.FrameDeduplicator(keepalive)
+        self.workers = workers
+        self.upsample = upsample
+        # playback control; Play() runs until Stop() is called or the animation ends
+        self._stop = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        # statistics of the current animation
+        self.frames = 0
+        # frames which took longer than one frame time to render and send
+        self.lateFrames = 0
+        self.startTime = None
         
 
     def Play(self, animation, *args):
         """
-        Play an animation on the ALUP device
+        Play an animation on the ALUP device.
+        Blocks until the animation ends or Stop() is called.
 
-        @param animation: the animation function which should be played
+        @param animation: the animation function, generator function or class which should be played
         @param *args: any extra arguments which the specified animation may
                       need. Does not include the required arguments n and t
                       for animation functions.
         """
+        n = self.device.configuration.ledCount
+        pool = None
+        if self.workers and inspect.isfunction(animation) and not inspect.isgeneratorfunction(animation) and _Period(animation, args) is None:
+            # render upcoming frames in worker processes
+            pool = tools.renderpool.RenderPool(animation, n, args, self.workers)
+            render = pool.Render
+        else:
+            render = Animator.Renderer(animation, n, *args)
+        if self.upsample > 1:
+            # render at a lower rate and interpolate the frames in between
+            render = tools.upsample.FrameUpsampler(render, self.upsample).Render
         # the time counter; increases by one with every new frame
         t = 0
-        while(True):
-            # get the start time of this frame
-            start = time.time()
-            colors = animation(self.device.configuration.ledCount, t, *args)
-
-            # stop the animation if an empty array is received
-            if(len(colors) == 0):
-                # clear the leds
-                self.device.Clear()
-                break
-
-            self.device.SetColors(colors)
-            self.device.Send()
-
-            end = time.time()
-            # sleep for the time which is missing to hit the requested fps
-            time.sleep(max(0, 1/self.fps  - end + start))
-            # increase time counter
-            t += 1
+        # NOTE: a Stop() before Play() started is not discarded; Play() returns right away
+        self.frames = 0
+        self.lateFrames = 0
+        self.startTime = time.time()
+        if self.coalescer is not None:
+            self.coalescer.Start()
+        try:
+            while(not self._stop.is_set()):
+                if not self._resume.is_set():
+                    # paused; check again for stop regularly
+                    self._resume.wait(0.1)
+                    continue
+                # get the start time of this frame
+                start = time.time()
+                colors = render(t)
+
+                # stop the animation if an empty array is received
+                if(len(colors) == 0):
+                    if self.coalescer is not None:
+                        # send the remaining frame first, the coalescer may not send concurrently
+                        self.coalescer.Stop()
+                    # clear the leds
+                    self.device.Clear()
+                    break
+
+                sent = True
+                if self.dedup is not None and not self.dedup.ShouldSend(colors):
+                    # the LEDs already show this frame
+                    sent = False
+                elif self.coalescer is not None:
+                    # hand the frame to the sender thread without blocking
+                    self.coalescer.Submit(colors)
+                    if self.fpsProbe is not None:
+                        # the probe measures the link, not the coalescer
+                        self.coalescer.WaitDelivered()
+                else:
+                    # wait for a free slot in the receiver's buffer, but at most one frame
+                    self.flowControl.Wait(timeout=1/self.fps)
+                    self.device.SetColors(colors)
+                    self.device.Send()
+
+                probing = self.fpsProbe is not None
+                if probing and sent:
+                    fps = self.fpsProbe.Sent()
+                    if fps is not None:
+                        # the probe is done; adjust the measured fps from now on
+                        self.fps = fps
+                        self.fpsProbe = None
+                        self.fpsController = tools.fps.FpsController(self.device, self.fps)
+                elif self.fpsController is not None:
+                    # adjust the fps to the current link capacity
+                    self.fps = self.fpsController.Update()
+
+                end = time.time()
+                self.frames += 1
+                if end - start > 1/self.fps:
+                    self.lateFrames += 1
+                if not (probing and sent):
+                    # sleep for the time which is missing to hit the requested fps
+                    time.sleep(max(0, 1/self.fps  - end + start))
+                # increase time counter
+                t += 1
+        finally:
+            # the stop request is consumed, so the Animator can play again
+            self._stop.clear()
+            if pool is not None:
+                pool.Close()
+            if self.coalescer is not None:
+                self.coalescer.Stop()
+            if self.fpsController is not None and self.fpsController.sustainedFps is not None:
+                # remember the highest sustained fps for the next animation on this device
+                tools.fps.SaveFps(self.device, self.fpsController.sustainedFps)
+
+    def Stop(self):
+        """
+        Stop the animation played by Play(). May be called from any thread
+        """
+        self._stop.set()
+        # wake up a paused animation
+        self._resume.set()
+
+    def Pause(self):
+        """
+        Pause the animation played by Play(). The LEDs keep showing the last frame
+        """
+        self._resume.clear()
+
+    def Resume(self):
+        """
+        Resume a paused animation
+        """
+        self._resume.set()
+
+    def IsPaused(self):
+        return not self._resume.is_set()
+
+    def ActualFps(self):
+        """
+        @return: the average number of frames per second since the animation started
+        """
+        if self.startTime is None:
+            return 0
+        return self.frames / max(time.time() - self.startTime, 1e-6)
+
+    @staticmethod
+    def Renderer(animation, n, *args):
+        """
+        Create a render function for the given animation
+
+        @param animation: an animation function, generator function or class (see module docstring)
+        @param n: the number of LEDs
+        @param *args: extra arguments for the animation
+        @return: a function render(t) returning the colors for time step t.
+                 An empty array marks the end of the animation
+        """
+        if inspect.isgeneratorfunction(animation):
+            # stateful generator; yields one frame per time step
+            generator = animation(n, *args)
+            return lambda t: next(generator, [])
+        if inspect.isclass(animation):
+            # stateful class; renders one frame per call
+            return animation(n, *args).Render
+
+        period = _Period(animation, args)
+        if period is None:
+            return lambda t: animation(n, t, *args)
+        # periodic animation: memoize the colors of every time step within the period
+        colorCache = {}
+        def RenderPeriodic(t):
+            if t % period not in colorCache:
+                colorCache[t % period] = animation(n, t, *args)
+            return colorCache[t % period]
+        return RenderPeriodic
         
          
 
 
 
+def _Periodic(period):
+    """
+    Decorator declaring an animation as periodic.
+    The Animator calls a periodic animation only once per time step within the period and
+    reuses the returned colors afterwards.
+
+    @param period: the number of time steps after which the animation repeats itself, or a function
+                   which takes the extra arguments of the animation and returns the period.
+                   The period may be None if the animation does not repeat for the given arguments.
+    """
+    def decorator(animation):
+        animation.period = period
+        return animation
+    return decorator
+
+
+def _Period(animation, args):
+    """
+    Get the period of the given animation for the given extra arguments
+    @return: the period in time steps or None if the animation is not periodic
+    """
+    period = getattr(animation, "period", None)
+    if callable(period):
+        period = period(*args)
+    if isinstance(period, int) and period > 0:
+        return period
+    return None
+
+
+
+@_Periodic(20)
 def testAnimation(n,t):
     """
     Simple test animation.
@@ -129,13 +364,16 @@ def testAnimation(n,t):
         return [0x00ff00] * n
     
 
+# only integer pauses repeat after a whole number of time steps
+@_Periodic(lambda color=0xffffff, pause=10: 2 * pause if isinstance(pause, int) else None)
 def blink(n,t,color=0xffffff, pause=10):
     """
     Blink the given color every 10 timesteps
     
     color: Hexadecimal integer value defining the color which will blink on all LEDs
 
-    pause: the number of timesteps to pause between switching colors
+    pause: the number of timesteps to pause between switching colors.
+           For non-integer pauses, the colors are not memoized (see _Periodic)
     """
     if (int(t/pause) % 2 == 0):
         # return the selected color
@@ -184,92 +422,160 @@ def _RainbowColor(i):
 
 
 
-def Firework(n, t, position = -1, color = 0xff0000):
-    """
-    This animation is WIP
+def Sparkle(n, color=0xffffff, density=0.02, decay=0.85):
     """
-    if(position < 0):
-        # choose random position
-        position = round(random() * n)
-    if(color < 0):
-        # choose random color
-        color = _RainbowColor(random())
+    Random LEDs light up and slowly fade out again
 
-    """
-    plan: 
-    - spawn white flash at explosion point
-    - make fade from white to color fast after the explosion
-    - propagate colored pixel to both sides with certain expansion speed 
-    - reduce brightness with time
-    - maybe add some noise to the fade down
-    """
-    if (t < 5):
-        return Flash(n, t, position, color)
-    else:
-        return FadeOut(n, t, LogSpread(n, t, position, color))
+    color: Hexadecimal integer value defining the color of the sparkles
 
+    density: the fraction of LEDs which light up per timestep
 
-def SqrtSpread(n, t, position, color, startSpeed):
+    decay: the fraction of its brightness a sparkle keeps per timestep. Range: [0, 1)
     """
-    Spread the received color from the given position to both sides, reducing speed quadratically
+    # this is a stateful (generator) animation: the same buffer is modified and yielded every frame
+    colors = [0x000000] * n
+    r, g, b = _HexToRGB(color)
+    # brightness of all currently lit LEDs by index
+    active = {}
+    while n > 0:
+        # light up new LEDs; the fractional part of the expected amount is applied randomly
+        spawn = int(density * n) + (1 if random.random() < (density * n) % 1 else 0)
+        for _ in range(spawn):
+            active[random.randrange(n)] = 1.0
+
+        for i in list(active):
+            brightness = active[i]
+            if brightness < 1/255:
+                # faded out completely
+                del active[i]
+                colors[i] = 0x000000
+                continue
+            colors[i] = _RGBToHex(int(r * brightness), int(g * brightness), int(b * brightness))
+            active[i] = brightness * decay
+        yield colors
+
+
+class Comet:
     """
-    # calculate speed based on the current point in time
-    #speed = max(0, startSpeed - (0.1*t)**2)
-    speed = startSpeed - 0.1*t
-    # the outermost pixel position of the spread
-    offset = round(speed * t)
+    A comet with a fading tail moving along the LEDs
 
-    # initialize all pixels to black
-    colors = [0x000000 for i in range(n)]
-    print("offset: %d speed: %f t: %d" % (offset, speed, t))
-    # make all pixels from the given startPosition +- position have the given color
+    color: Hexadecimal integer value defining the color of the comet
 
-    # indices of boder pixels
-    minIndex = max(0, position - offset)
-    maxIndex = min(n, position + offset)
+    length: the length of the comet's tail in LEDs
+
+    speed: the number of LEDs the comet moves per timestep
+    """
+    # this is a stateful (class based) animation keeping its buffer and position between frames
+    def __init__(self, n, color=0xffffff, length=10, speed=1.0):
+        self.n = n
+        self.speed = speed
+        self.position = 0.0
+        self.colors = [0x000000] * n
+        r, g, b = _HexToRGB(color)
+        # the colors of the tail, starting at the head; computed only once
+        self.tail = []
+        for i in range(min(length, n)):
+            brightness = 1 - i / length
+            self.tail.append(_RGBToHex(int(r * brightness), int(g * brightness), int(b * brightness)))
+        # LEDs lit in the last frame
+        self._lit = []
+
+    def Render(self, t):
+        if self.n == 0:
+            return []
+        # only reset the LEDs of the last frame instead of reallocating the whole buffer
+        for i in self._lit:
+            self.colors[i] = 0x000000
+        head = int(self.position) % self.n
+        self._lit = [(head - i) % self.n for i in range(len(self.tail))]
+        for i, color in zip(self._lit, self.tail):
+            self.colors[i] = color
+        self.position += self.speed
+        return self.colors
+
+
+
+def Firework(n, position=-1, color=-1, sparks=80, speed=1.5, rate=0.02):
+    """
+    Exploding fireworks
 
-    print("min %d , max %d" % (minIndex, maxIndex))
+    position: the LED at which the fireworks explode. Random for every explosion if negative
 
-    colors[minIndex : maxIndex] = [color for _ in range(1 + (2* offset))] # todo: this does not quite work, wrong pixels are set
-    # cut the ends if they are too big
-    colors = colors[0:n]
+    color: Hexadecimal integer value defining the color of the sparks. Random for every explosion if negative
 
-    # assertion which makes sure the length is right
-    assert len(colors) == n
+    sparks: the number of sparks per explosion
 
-    return colors
+    speed: the average initial speed of the sparks in LEDs per timestep
 
-def FadeOut(n, t, speed, _colors):
+    rate: the probability of a new explosion per timestep. If 0, only one explosion is shown
     """
-    reduce colors linearly until they are black
-    
+    system = particles.ParticleSystem(n, friction=0.08)
+    if n == 0:
+        return
+    _Explode(system, n, position, color, sparks, speed)
+    while len(system) > 0 or rate > 0:
+        if rate > 0 and random.random() < rate:
+            _Explode(system, n, position, color, sparks, speed)
+        system.Update()
+        yield system.Render()
+
+
+def _Explode(system, n, position, color, sparks, speed):
     """
-    # we need to make a copy of the list because we would otherwise
-    # cause a loopback 
-    # todo is this really needed or could we just modify the existing array
-    # would definitely be faster (but problematic for float speeds / rounding error)
-    colors = list(_colors)
-    # calculate an even reduction for the current point in time
-    reduction = max(0, round(speed * t))
-
-    if(reduction >= 255):
-        # tell the animator that this animation is finished
-        return []
-
-    for i in range(len(colors)):
-        # get the led's rgb values from the hex color
-        r,g,b = _HexToRGB(colors[i])
-        # apply the reduction
-        r = max(0, r - reduction)
-        g = max(0, g - reduction)
-        b = max(0, b - reduction)
-        # convert the rgb values back to rgb 
-        colors[i] = _RGBToHex(r,g,b)
+    Emit the particles of one firework explosion into the given particle system
+    """
+    if position < 0:
+        position = random.random() * n
+    if color < 0:
+        color = _RainbowColor(random.random())
+    # short white flash at the explosion point
+    system.Emit(position, 0.0, 0xffffff, life=4)
+    # sparks flying to both sides with slightly varying brightness and life times
+    velocities = np.random.normal(0, speed, sparks)
+    brightness = np.random.uniform(0.5, 1.0, sparks)
+    colors = colorarray.ToRGB([color]) * brightness[:, None]
+    lifes = np.random.uniform(15, 45, sparks)
+    system.Emit(position, velocities, colorarray.ToHex(colors), lifes)
+
+
+def Meteor(n, color=0xffaa55, speed=0.7, tail=2, rate=0.01):
+    """
+    Meteors moving along the LEDs, leaving a glowing trail of sparks
 
-    return colors
+    color: Hexadecimal integer value defining the color of the meteors
 
+    speed: the speed of the meteors in LEDs per timestep
 
-# todo: quadratic fadeout, looks nice but was a bug
+    tail: the number of trail sparks each meteor emits per timestep
+
+    rate: the probability of a new meteor per timestep (in addition to the first one)
+    """
+    system = particles.ParticleSystem(n)
+    # positions of all meteor heads
+    heads = [0.0]
+    while n > 0:
+        if random.random() < rate:
+            heads.append(0.0)
+        for i in range(len(heads)):
+            # the trail sparks stay where they were emitted and fade out
+            system.Emit(heads[i] + np.random.uniform(-speed, 0, tail), 0.0, color, np.random.uniform(5, 25, tail))
+            heads[i] += speed
+        heads = [head for head in heads if head < n]
+        # the meteor heads are particles living for a single frame
+        system.Emit(np.array(heads), 0.0, 0xffffff, 1)
+        frame = system.Render()
+        system.Update()
+        yield frame
+
+
+def Expression(n, t, expression):
+    """
+    Evaluate a math expression for every LED and time step, e.g. "hsv(x + t / 100)"
+
+    expression: the expression returning the hex color of LED i at time step t (see expressions.py for the syntax)
+    """
+    # compiled only once, the compiled expression is cached
+    return expressions.Compile(expression)(n, t)
 
 
 # convert R/G/B colors in range 0-255 to a single hex value with format 0xrrggbb
@@ -200,6 +200,20 @@ def Repeat(n, pattern):
     return [pattern[i % len(pattern)] for i in range(n)]
 
 
+def Expression(n, expression):
+    """
+    Evaluate a math expression for every LED, e.g. "hsv(x)" or "0xff0000 if i % 2 else 0x0000ff"
+    @param n: the size of the returned array
+    @param expression: the expression returning the hex color of LED i (see expressions.py for the syntax)
+
+    @return: an array containing the color of each LED
+    @raise ValueError: if the expression is invalid
+    """
+    # imported here, as NumPy is only needed for expressions
+    import expressions
+    return expressions.Compile(expression)(n)
+
+
 # convert R/G/B colors in range 0-255 to a single hex value with format 0xrrggbb
 def _RGBToHex(r, g, b):
     color = r
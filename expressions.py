@@ -0,0 +1,236 @@
+"""
+expressions.py
+
+Compiles math expressions into vectorized effects and animations, so new effects can be
+tried out from the CLI without editing effects.py:
+    effect expr "hsv(x + t / 100)"
+    animation expr "hsv(noise(i / 8 + t / 20), 1, 0.5 + 0.5 * sin(t / 10))"
+
+An expression is parsed and checked once and then evaluated with NumPy for all LEDs at the
+same time: the variable i is an array of all LED indices instead of a single index.
+
+--------------------------------------------------
+                Expression syntax
+--------------------------------------------------
+
+Python expression syntax limited to numbers, arithmetic (+ - * / // % **),
+comparisons, and, or, not, 'a if condition else b' and calls of the built-in functions.
+
+Variables:
+    i: the index of the LED
+    n: the number of LEDs
+    t: the time step (always 0 for effects)
+    x: the position of the LED in range [0, 1): i / n
+    pi, e
+
+Functions:
+    hsv(h, s=1, v=1): the color for hue h, saturation s and value v, all in range [0, 1]. Hue wraps around
+    rgb(r, g, b): the color for the red, green and blue components in range [0, 1]
+    noise(x): smooth 1D value noise in range [0, 1]
+    sin, cos, tan, abs, sqrt, exp, log, floor, ceil, min, max, clamp(v, low=0, high=1), mix(a, b, f)
+
+The result of an expression is the hex color 0xRRGGBB of every LED, e.g. the result of hsv()
+or a color like 0xff0000. Colors can not be mixed arithmetically; use mix() or hsv() instead.
+
+--------------------------------------------------
+                    Notes
+--------------------------------------------------
+- Only the syntax above is allowed; everything else (attributes, subscripts, other names)
+  is rejected with a ValueError when compiling
+- Compiled expressions are cached, so animations compile their expression only once
+
+"""
+import ast
+import functools
+
+import numpy as np
+
+
+def _Hsv(h, s=1.0, v=1.0):
+    h = np.mod(h, 1.0)
+    s = np.clip(s, 0, 1)
+    v = np.clip(v, 0, 1)
+
+    # vectorized hsv to rgb conversion
+    def Channel(k):
+        k = np.mod(k + h * 6, 6)
+        return v - v * s * np.clip(np.minimum(k, 4 - k), 0, 1)
+    return _Rgb(Channel(5), Channel(3), Channel(1))
+
+
+def _Rgb(r, g, b):
+    r, g, b = (np.rint(np.clip(c, 0, 1) * 255).astype(np.int64) for c in (r, g, b))
+    return (r << 16) | (g << 8) | b
+
+
+def _Noise(x):
+    x = np.asarray(x, dtype=np.float64)
+    cell = np.floor(x)
+    fraction = x - cell
+    # smooth interpolation between pseudo random values at the integer positions
+    fraction = fraction * fraction * (3 - 2 * fraction)
+    return _Lattice(cell) * (1 - fraction) + _Lattice(cell + 1) * fraction
+
+
+def _Lattice(cell):
+    # integer hash of the cell, mapped to [0, 1]
+    h = cell.astype(np.int64) * 374761393 & 0xffffffff
+    h = (h ^ (h >> 13)) * 1274126177 & 0xffffffff
+    h = h ^ (h >> 16)
+    return (h & 0xffff) / 0xffff
+
+
+def _Mix(a, b, f):
+    # blend the colors a and b per channel
+    a, b = (np.asarray(c).astype(np.int64) for c in (a, b))
+    f = np.clip(f, 0, 1)
+    return _Rgb(*(((a >> shift) & 0xff) / 255 * (1 - f) + ((b >> shift) & 0xff) / 255 * f for shift in (16, 8, 0)))
+
+
+_FUNCTIONS = {
+    "hsv": _Hsv,
+    "rgb": _Rgb,
+    "noise": _Noise,
+    "mix": _Mix,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "floor": np.floor,
+    "ceil": np.ceil,
+    "min": np.minimum,
+    "max": np.maximum,
+    "clamp": lambda v, low=0.0, high=1.0: np.clip(v, low, high),
+}
+
+_CONSTANTS = {
+    "pi": np.pi,
+    "e": np.e,
+}
+
+_VARIABLES = ["i", "n", "t", "x"]
+
+# syntax which may be used in expressions
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name,
+    ast.Constant, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub, ast.Not,
+    ast.And, ast.Or, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+class _Vectorize(ast.NodeTransformer):
+    """
+    Rewrites the parts of an expression which do not work on arrays into NumPy calls
+    """
+    def _Call(self, name, args, node):
+        call = ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+        return ast.copy_location(call, node)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._Call("_where", [node.test, node.body, node.orelse], node)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        name = "_and" if isinstance(node.op, ast.And) else "_or"
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = self._Call(name, [result, value], node)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self._Call("_not", [node.operand], node)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        # split chained comparisons (a < b < c) into (a < b) and (b < c)
+        result = None
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            comparison = ast.copy_location(ast.Compare(left=left, ops=[op], comparators=[right]), node)
+            result = comparison if result is None else self._Call("_and", [result, comparison], node)
+            left = right
+        return result
+
+    def visit_Constant(self, node):
+        # calculate with floats, so huge powers overflow instead of hanging on big integers
+        return ast.copy_location(ast.Constant(value=float(node.value)), node)
+
+
+class Expression():
+    """
+    A compiled expression. Use Compile() to create one
+    """
+    def __init__(self, source:str):
+        """
+        @param source: the expression (see module docstring)
+        @raise ValueError: if the expression is invalid
+        """
+        self.source = source
+        try:
+            self._code = self._Compile(source)
+        except SyntaxError as e:
+            raise ValueError("Invalid expression '%s': %s" % (source, e.msg))
+        except OverflowError:
+            raise ValueError("Invalid expression '%s': number too large" % (source))
+        except (RecursionError, MemoryError):
+            raise ValueError("Invalid expression '%s': nested too deeply" % (source))
+        self._namespace = {"__builtins__": {}, "_where": np.where, "_and": np.logical_and,
+                           "_or": np.logical_or, "_not": np.logical_not}
+        self._namespace.update(_FUNCTIONS)
+        self._namespace.update(_CONSTANTS)
+        # LED indices of the last n, reused between frames
+        self._indices = np.arange(0, dtype=np.float64)
+
+    def _Compile(self, source):
+        # parse, validate and vectorize the expression
+        # @raise ValueError: if the expression contains anything not allowed
+        tree = ast.parse(source.strip(), mode="eval")
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError("Invalid expression '%s': '%s' is not allowed" % (source, type(node).__name__))
+            if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+                raise ValueError("Invalid expression '%s': only numbers are allowed as constants" % (source))
+            if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.keywords):
+                raise ValueError("Invalid expression '%s': unknown function call '%s'" % (source, ast.unparse(node.func)))
+            if isinstance(node, ast.Name) and node.id not in _FUNCTIONS and node.id not in _CONSTANTS and node.id not in _VARIABLES:
+                raise ValueError("Invalid expression '%s': unknown name '%s'" % (source, node.id))
+        tree = ast.fix_missing_locations(_Vectorize().visit(tree))
+        return compile(tree, "<expression>", "eval")
+
+    def __call__(self, n, t=0):
+        """
+        Evaluate the expression for all LEDs
+        @param n: the number of LEDs
+        @param t: the time step
+        @return: a list of n hex colors
+        @raise ValueError: if the expression can not be evaluated
+        """
+        if len(self._indices) != n:
+            self._indices = np.arange(n, dtype=np.float64)
+        variables = {"i": self._indices, "n": float(n), "t": float(t), "x": self._indices / max(n, 1)}
+        try:
+            with np.errstate(all="ignore"):
+                result = eval(self._code, self._namespace, variables)
+            result = np.nan_to_num(np.broadcast_to(result, (n,)).astype(np.float64))
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise ValueError("Could not evaluate expression '%s': %s" % (self.source, e))
+        return np.clip(result, 0, 0xffffff).astype(np.int64).tolist()
+
+
+@functools.lru_cache(maxsize=64)
+def Compile(source:str) -> Expression:
+    """
+    Compile an expression (see module docstring)
+    @raise ValueError: if the expression is invalid
+    """
+    return Expression(source)
@@ -0,0 +1,153 @@
+"""
+particles.py
+
+A vectorized 1D particle engine for particle based animations (fireworks, sparkles, meteors, ...)
+
+All particles of a system are stored in NumPy arrays (position, velocity, color and life),
+so updating and drawing thousands of particles only takes a few array operations per frame
+instead of a Python loop per LED.
+
+Usage (inside a generator animation, see animator.py):
+    system = ParticleSystem(n)
+    system.Emit(position=10, velocity=np.random.normal(0, 1, 50), color=0xff0000, life=30)
+    while system:
+        system.Update()
+        yield system.Render()
+
+--------------------------------------------------
+                    Notes
+--------------------------------------------------
+- Positions and velocities are given in LEDs and LEDs per time step
+- Colors are given as hex colors 0xRRGGBB (single value or array)
+- Particles are drawn with additive blending and fade out linearly over their life
+- Particles are anti-aliased: a particle between two LEDs lights up both of them
+
+"""
+import numpy as np
+
+from tools import colorarray
+
+
+class ParticleSystem():
+    """
+    A set of particles moving along a strip of n LEDs
+    """
+    def __init__(self, n, capacity=4096, friction=0.0):
+        """
+        @param n: the number of LEDs
+        @param capacity: the maximum number of particles alive at the same time.
+                         Particles emitted while the system is full are discarded
+        @param friction: the fraction of velocity each particle loses per time step. Range: [0, 1)
+        """
+        self.n = n
+        self.capacity = capacity
+        self.friction = friction
+        # the number of particles currently alive. Only the first `count` entries of each array are valid
+        self.count = 0
+        self.position = np.zeros(capacity, dtype=np.float32)
+        self.velocity = np.zeros(capacity, dtype=np.float32)
+        # rgb colors in range [0, 255]
+        self.color = np.zeros((capacity, 3), dtype=np.float32)
+        # remaining and initial life in time steps
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.maxLife = np.ones(capacity, dtype=np.float32)
+        # reused output buffer
+        self._frame = np.zeros((n, 3), dtype=np.float32)
+
+    def __len__(self):
+        return self.count
+
+    def Emit(self, position, velocity=0.0, color=0xffffff, life=30, count=None):
+        """
+        Emit new particles. All parameters may either be scalars or arrays of the same length.
+
+        @param position: the start position(s) in LEDs
+        @param velocity: the velocity(s) in LEDs per time step
+        @param color: the hex color(s) 0xRRGGBB
+        @param life: the life time(s) in time steps
+        @param count: the number of particles to emit. Defaults to the length of the given arrays (or 1)
+        @return: the number of emitted particles
+        """
+        arguments = (position, velocity, color, life)
+        if any(np.ndim(argument) > 0 and np.size(argument) == 0 for argument in arguments):
+            # nothing to emit
+            return 0
+        if count is None:
+            count = max(np.size(argument) for argument in arguments)
+        count = min(count, self.capacity - self.count)
+        if count <= 0:
+            return 0
+        # particles which do not fit into the system are discarded
+        position, velocity, color, life = (_Take(argument, count) for argument in arguments)
+        new = slice(self.count, self.count + count)
+        self.position[new] = position
+        self.velocity[new] = velocity
+        self.color[new] = colorarray.ToRGB(np.broadcast_to(color, (count,)), dtype=np.float32)
+        self.life[new] = life
+        self.maxLife[new] = life
+        self.count += count
+        return count
+
+    def Update(self, dt=1.0):
+        """
+        Move all particles and remove the ones which died or left the strip
+        @param dt: the length of the time step
+        """
+        alive = slice(0, self.count)
+        self.position[alive] += self.velocity[alive] * dt
+        self.velocity[alive] *= (1 - self.friction) ** dt
+        self.life[alive] -= dt
+
+        keep = (self.life[alive] > 0) & (self.position[alive] > -1) & (self.position[alive] < self.n)
+        kept = int(np.count_nonzero(keep))
+        if kept < self.count:
+            # move all remaining particles to the front
+            for array in (self.position, self.velocity, self.color, self.life, self.maxLife):
+                array[:kept] = array[alive][keep]
+            self.count = kept
+
+    def Render(self, background=None):
+        """
+        Draw all particles using additive blending
+        @param background: optional hex color list or RGB array the particles are drawn onto
+        @return: a list of n hex colors
+        """
+        return colorarray.ToHex(self.RenderRGB(background))
+
+    def RenderRGB(self, background=None):
+        """
+        Like Render(), but returns the RGB array of shape (n, 3) for further processing.
+        NOTE: the array is reused by the next call
+        """
+        frame = self._frame
+        if background is None:
+            frame[:] = 0
+        elif isinstance(background, np.ndarray):
+            frame[:] = background
+        else:
+            frame[:] = colorarray.ToRGB(background)
+
+        if self.count == 0 or self.n == 0:
+            return frame
+        alive = slice(0, self.count)
+        # linear fade out over the life time
+        colors = self.color[alive] * (self.life[alive] / self.maxLife[alive])[:, None]
+
+        # anti-aliasing: split every particle between the two neighboring LEDs
+        left = np.floor(self.position[alive])
+        rightWeight = self.position[alive] - left
+        left = left.astype(np.int64)
+        for index, weight in ((left, 1 - rightWeight), (left + 1, rightWeight)):
+            valid = (index >= 0) & (index < self.n)
+            # accumulate all channels with a single bincount using the flat index of each channel
+            flatIndex = (index[valid, None] * 3 + np.arange(3)).ravel()
+            weights = (colors[valid] * weight[valid, None]).ravel()
+            frame += np.bincount(flatIndex, weights, minlength=self.n * 3).reshape(self.n, 3)
+        return frame
+
+
+def _Take(argument, count):
+    # the first `count` values of an array argument; scalars are broadcast anyway
+    if np.ndim(argument) == 0:
+        return argument
+    return np.asarray(argument)[:count]
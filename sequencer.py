@@ -0,0 +1,224 @@
+"""
+sequencer.py
+
+Plays a playlist of effects and animations with crossfades between them,
+e.g. for unattended shows.
+
+The Sequencer is a class based animation (see animator.py) and can be played like any other animation:
+    items = LoadPlaylist("show.txt")
+    Animator(device, 30).Play(Sequencer, items)
+
+--------------------------------------------------
+                Playlist files
+--------------------------------------------------
+
+One item per line:
+    <duration in s> effect <effect name> [optional params]
+    <duration in s> animation <animation name> [optional params]
+
+Empty lines and lines starting with '#' are ignored.
+Example:
+    # warm up
+    10 effect Christmas
+    30 animation Rainbow 2.0
+    20 animation blink 0xff0000 5
+
+--------------------------------------------------
+                    Notes
+--------------------------------------------------
+- Durations are converted into time steps using the fps given to LoadPlaylist()
+- The next item is rendered ahead on a background thread before the crossfade starts,
+  so transitions do not stall the frame loop
+- If an animation ends early (returns []), the next item starts without crossfade
+
+"""
+import inspect
+import threading
+
+import effects
+import animator
+from tools import colorarray
+from tools.arguments import CastString, CheckAnimationArguments
+
+
+class PlaylistItem():
+    """
+    One effect or animation of a playlist
+    """
+    def __init__(self, function, args=(), duration=300, isEffect=False):
+        """
+        @param function: the effect function (effects.py) or animation (animator.py)
+        @param args: extra arguments for the effect or animation
+        @param duration: the duration of the item in time steps, including the crossfade to the next item
+        @param isEffect: True if function is an effect, False for animations
+        """
+        self.function = function
+        self.args = args
+        self.duration = duration
+        self.isEffect = isEffect
+        self.name = getattr(function, "__name__", str(function))
+
+    def Renderer(self, n):
+        """
+        @return: a function render(t) returning the colors of this item for its local time step t
+        """
+        if self.isEffect:
+            # effects are static; render them only once
+            colors = self.function(n, *self.args)
+            return lambda t: colors
+        return animator.Animator.Renderer(self.function, n, *self.args)
+
+
+def LoadPlaylist(path, fps=30):
+    """
+    Load a playlist file (see module docstring)
+    @param path: the path of the playlist file
+    @param fps: the frame rate used to convert durations in s into time steps
+    @return: a list of PlaylistItem
+    @raise ValueError: if a line is invalid, including arguments which do not fit the effect or animation
+    """
+    items = []
+    with open(path, "r") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            parts = line.split()
+            if len(parts) < 3 or parts[1] not in ["effect", "animation"]:
+                raise ValueError("Line %d: expected '<duration> effect|animation <name> [params]'" % (number))
+            try:
+                duration = max(1, round(float(parts[0]) * fps))
+            except ValueError:
+                raise ValueError("Line %d: invalid duration '%s'" % (number, parts[0]))
+            isEffect = parts[1] == "effect"
+            module = effects if isEffect else animator
+            function = getattr(module, parts[2], None)
+            if function is None or parts[2].startswith("_"):
+                raise ValueError("Line %d: unknown %s '%s'" % (number, parts[1], parts[2]))
+            args = [CastString(arg) for arg in parts[3:]]
+            try:
+                # check the arguments now instead of in the middle of the show
+                if isEffect:
+                    inspect.signature(function).bind(0, *args)
+                else:
+                    CheckAnimationArguments(function, 0, args)
+            except TypeError as e:
+                raise ValueError("Line %d: invalid arguments for %s '%s': %s" % (number, parts[1], parts[2], e))
+            items.append(PlaylistItem(function, args, duration, isEffect))
+    return items
+
+
+class _Prewarmed():
+    """
+    An item whose first frames are rendered ahead of time on a background thread
+    """
+    def __init__(self, item, n, frames):
+        self.item = item
+        self._render = None
+        self._frames = []
+        self._thread = threading.Thread(target=self._Prerender, args=(n, frames), daemon=True)
+        self._thread.start()
+
+    def _Prerender(self, n, frames):
+        self._render = self.item.Renderer(n)
+        for t in range(frames):
+            colors = self._render(t)
+            # copy, as stateful animations may reuse their buffer
+            self._frames.append(list(colors))
+            if len(colors) == 0:
+                break
+
+    def Frame(self, t):
+        """
+        @return: the colors of the item for its local time step t. Time steps have to be requested in order
+        """
+        if self._thread.is_alive():
+            self._thread.join()
+        if t < len(self._frames):
+            return self._frames[t]
+        return self._render(t)
+
+
+class Sequencer:
+    """
+    Plays a playlist of effects and animations with crossfades
+
+    items: a list of sequencer.PlaylistItem (see LoadPlaylist())
+
+    crossfade: the length of the crossfade between two items in time steps
+
+    loop: if True, the playlist restarts after the last item. Otherwise the animation ends
+    """
+    def __init__(self, n, items, crossfade=30, loop=True):
+        if len(items) == 0:
+            raise ValueError("The playlist is empty")
+        self.n = n
+        self.items = items
+        self.crossfade = crossfade
+        self.loop = loop
+        # the index of the playing item and the time step at which it started
+        self.index = 0
+        self._start = 0
+        self._current = _Prewarmed(items[0], n, 0)
+        self._next = None
+        # the number of frames of the next item which were already shown during the crossfade
+        self._nextShown = 0
+
+    def _NextIndex(self):
+        if self.index + 1 < len(self.items):
+            return self.index + 1
+        return 0 if self.loop else None
+
+    def _Advance(self, t):
+        """
+        Switch to the next item at time step t
+        @return: False if the playlist ended
+        """
+        nextIndex = self._NextIndex()
+        if nextIndex is None:
+            return False
+        if self._next is None:
+            self._next = _Prewarmed(self.items[nextIndex], self.n, self.crossfade)
+        self.index = nextIndex
+        # continue the next item after the frames already shown during the crossfade
+        self._start = t - self._nextShown
+        self._current = self._next
+        self._next = None
+        self._nextShown = 0
+        return True
+
+    def Render(self, t):
+        # skip items which are over or ended early. If no item renders a frame
+        # within one pass over the playlist, the show ends
+        for _ in range(len(self.items) + 1):
+            item = self.items[self.index]
+            local = t - self._start
+            if local < item.duration:
+                colors = self._current.Frame(local)
+                if len(colors) > 0:
+                    break
+            if not self._Advance(t):
+                return []
+        else:
+            return []
+
+        fadeStart = item.duration - min(self.crossfade, item.duration)
+        nextIndex = self._NextIndex()
+        if nextIndex is None:
+            return colors
+        if self._next is None:
+            # start rendering the next item ahead of time
+            self._next = _Prewarmed(self.items[nextIndex], self.n, self.crossfade)
+        if local < fadeStart:
+            return colors
+
+        nextColors = self._next.Frame(local - fadeStart)
+        if len(nextColors) != len(colors):
+            # the next item ended already or has a different size; no blending possible
+            return colors
+        self._nextShown = local - fadeStart + 1
+        # blend linearly from the current to the next item
+        alpha = (local - fadeStart + 1) / (item.duration - fadeStart + 1)
+        current = colorarray.ToRGB(colors, dtype=float)
+        upcoming = colorarray.ToRGB(nextColors, dtype=float)
+        return colorarray.ToHex(current + (upcoming - current) * alpha)
@@ -0,0 +1,144 @@
+import time
+import unittest
+from types import SimpleNamespace
+import animator
+from animator import Animator
+from tools.player import AnimationPlayer
+
+
+class _FakeDevice():
+    def __init__(self, ledCount=3):
+        self.configuration = SimpleNamespace(ledCount=ledCount, frameBufferSize=4, deviceName="test")
+        self.frame = SimpleNamespace(colors=[], offset=0, timestamp=0)
+        self.latency = 1
+        self._unansweredFrames = []
+        self.sent = []
+
+    def SetColors(self, colors):
+        self.frame.colors = colors
+
+    def Send(self):
+        self.sent.append(list(self.frame.colors))
+
+    def Clear(self):
+        self.sent.append([0] * self.configuration.ledCount)
+
+
+class TestAnimator(unittest.TestCase):
+    def test_RendererFunction(self):
+        render = Animator.Renderer(animator.testAnimation, 2)
+        self.assertEqual(render(0), [0xff0000] * 2)
+        self.assertEqual(render(10), [0x00ff00] * 2)
+        # the colors of periodic animations are memoized
+        self.assertIs(render(20), render(0))
+
+    def test_RendererGenerator(self):
+        def Counter(n, limit):
+            colors = [0] * n
+            for i in range(limit):
+                colors[0] = i
+                yield colors
+        render = Animator.Renderer(Counter, 2, 2)
+        self.assertEqual(render(0), [0, 0])
+        self.assertEqual(render(1), [1, 0])
+        self.assertEqual(render(2), [])
+
+    def test_RendererClass(self):
+        render = Animator.Renderer(animator.Comet, 5, 0xffffff, 2)
+        self.assertEqual(render(0), [0xffffff, 0, 0, 0, 0x7f7f7f])
+        self.assertEqual(render(1), [0x7f7f7f, 0xffffff, 0, 0, 0])
+
+    def test_Sparkle(self):
+        render = Animator.Renderer(animator.Sparkle, 10, 0xff0000, 0.5)
+        colors = render(0)
+        self.assertEqual(len(colors), 10)
+        self.assertTrue(any(color != 0 for color in colors))
+        self.assertEqual(Animator.Renderer(animator.Sparkle, 0)(0), [])
+
+    def test_Meteor(self):
+        # the first meteor leaves the strip after 43 steps, no other meteor is started
+        render = Animator.Renderer(animator.Meteor, 30, 0xffaa55, 0.7, 2, 0)
+        for t in range(60):
+            self.assertEqual(len(render(t)), 30)
+
+    def test_PeriodicMemoization(self):
+        calls = []
+        @animator._Periodic(4)
+        def Counter(n, t):
+            calls.append(t)
+            return [t] * n
+        render = Animator.Renderer(Counter, 2)
+        frames = [render(t) for t in range(10)]
+        # the animation is only called once per step within the period
+        self.assertEqual(calls, [0, 1, 2, 3])
+        self.assertEqual(frames[5], [1, 1])
+        self.assertIs(frames[9], frames[1])
+
+    def test_Period(self):
+        self.assertEqual(animator._Period(animator.blink, ()), 20)
+        self.assertEqual(animator._Period(animator.blink, (0xffffff, 3)), 6)
+        self.assertIsNone(animator._Period(animator.blink, (0xffffff, 0.5)))
+        self.assertIsNone(animator._Period(animator.Rainbow, ()))
+
+
+    def test_PlayUntilEnd(self):
+        device = _FakeDevice()
+        def Countdown(n, t):
+            return [t] * n if t < 3 else []
+        Animator(device, fps=1000, keepalive=None).Play(Countdown)
+        self.assertEqual(device.sent, [[0] * 3, [1] * 3, [2] * 3, [0] * 3])
+
+    def test_Upsample(self):
+        device = _FakeDevice(1)
+        def Ramp(n, t):
+            return [t * 40] * n if t < 3 else []
+        anim = Animator(device, fps=1000, keepalive=None, upsample=4)
+        anim.Play(Ramp)
+        self.assertEqual(device.sent, [[0]] * 4 + [[10], [20], [30], [40], [50], [60], [70], [80], [0]])
+
+    def test_BackgroundPlayer(self):
+        device = _FakeDevice()
+        anim = Animator(device, fps=200)
+        player = AnimationPlayer(anim, animator.Rainbow)
+        player.Start()
+        time.sleep(0.05)
+        self.assertTrue(player.IsRunning())
+        player.Pause()
+        self.assertIn("paused", player.Status())
+        player.Resume()
+        player.Stop()
+        self.assertFalse(player.IsRunning())
+        self.assertIn("stopped", player.Status())
+        self.assertGreater(anim.frames, 0)
+
+    def test_CoalescedSendFails(self):
+        device = _FakeDevice()
+        def Send():
+            raise ConnectionError("reconnecting failed")
+        device.Send = Send
+        player = AnimationPlayer(Animator(device, fps=200, coalesce=True), animator.Rainbow)
+        player.Start()
+        player._thread.join(2)
+        # the animation stops instead of playing into the void
+        self.assertFalse(player.IsRunning())
+        self.assertIsInstance(player.error, ConnectionError)
+        self.assertIn("failed", player.Status())
+
+    def test_StopBeforeStart(self):
+        device = _FakeDevice()
+        anim = Animator(device, fps=200)
+        player = AnimationPlayer(anim, animator.Rainbow)
+        # a stop request arriving before the player thread runs is not lost
+        anim.Stop()
+        player.Start()
+        self.assertTrue(player.Stop())
+        self.assertEqual(anim.frames, 0)
+        # the animator can play again afterwards
+        player = AnimationPlayer(anim, animator.Rainbow)
+        player.Start()
+        time.sleep(0.05)
+        self.assertTrue(player.Stop())
+        self.assertGreater(anim.frames, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import tempfile
+import unittest
+from unittest import mock
+from tools import baud, cache
+
+
+class TestBaud(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(cache, "CACHE_DIR", self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.attempts = []
+
+    def _Connect(self, port, rate, timeout):
+        # a device answering at 230400 baud only
+        self.attempts.append(rate)
+        return "device" if rate == 230400 else None
+
+    def test_DetectBaud(self):
+        with mock.patch.object(baud, "_Connect", self._Connect):
+            self.assertEqual(baud.DetectBaud("/dev/ttyTEST", [115200, 230400, 9600]), ("device", 230400))
+            self.assertEqual(self.attempts, [115200, 230400])
+            # the detected baud rate is tried first next time
+            self.attempts.clear()
+            self.assertEqual(baud.DetectBaud("/dev/ttyTEST", [115200, 230400, 9600]), ("device", 230400))
+            self.assertEqual(self.attempts, [230400])
+
+    def test_NoDevice(self):
+        with mock.patch.object(baud, "_Connect", lambda port, rate, timeout: None):
+            self.assertIsNone(baud.DetectBaud("/dev/ttyTEST", [115200, 9600]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import statistics
+import unittest
+from types import SimpleNamespace
+from tools import calibration
+
+
+class _FakeDevice():
+    # measures a time delta of 1000ms with normally distributed noise.
+    # Only every `respondEvery`-th Send() receives a response
+    def __init__(self, noise, respondEvery=1):
+        self.frame = SimpleNamespace(colors=[], timestamp=42)
+        self.noise = noise
+        self.respondEvery = respondEvery
+        self.random = random.Random(0)
+        self.raw = []
+        self.sent = 0
+        self._time_delta_ms_raw = None
+        self._onFrameResponse = None
+
+    @property
+    def time_delta_ms(self):
+        return statistics.median(self.raw[-100:])
+
+    def Send(self):
+        self.sent += 1
+        if self.sent % self.respondEvery:
+            return
+        self._time_delta_ms_raw = 1000 + self.random.gauss(0, self.noise)
+        self.raw.append(self._time_delta_ms_raw)
+        if self._onFrameResponse is not None:
+            self._onFrameResponse(self.frame)
+
+
+class TestCalibration(unittest.TestCase):
+    def test_FastLink(self):
+        device = _FakeDevice(0.5)
+        result = calibration.Calibrate(device, accuracy=1.0, budget=5.0)
+        self.assertTrue(result.converged)
+        # far fewer frames than the fixed calibration
+        self.assertLess(result.frames, 50)
+        self.assertAlmostEqual(result.delta, 1000, delta=1.0)
+        self.assertEqual(device.frame.timestamp, 42)
+
+    def test_NoisyLink(self):
+        # more frames are needed for the same accuracy
+        fast = calibration.Calibrate(_FakeDevice(0.5), accuracy=1.0)
+        noisy = calibration.Calibrate(_FakeDevice(4), accuracy=1.0)
+        self.assertTrue(noisy.converged)
+        self.assertGreater(noisy.frames, fast.frames)
+        self.assertAlmostEqual(noisy.delta, 1000, delta=2.0)
+
+    def test_SlowResponses(self):
+        # the time delta is only sampled once per response, not once per Send()
+        device = _FakeDevice(0.5, respondEvery=3)
+        callback = []
+        device._onFrameResponse = callback.append
+        result = calibration.Calibrate(device, accuracy=1.0)
+        self.assertTrue(result.converged)
+        self.assertAlmostEqual(result.spread, calibration._StandardError(device.raw), delta=1e-9)
+        self.assertEqual(len(callback), len(device.raw))
+        self.assertEqual(device._onFrameResponse, callback.append)
+
+    def test_Budget(self):
+        # can not converge, stops after the time budget
+        result = calibration.Calibrate(_FakeDevice(100), accuracy=0.1, budget=0.05)
+        self.assertFalse(result.converged)
+        self.assertLess(result.duration, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from tools import clip
+
+
+def _Animation(n, t, color=0x010203):
+    if t >= 3:
+        return []
+    return [color * t] * n
+
+
+class TestClip(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.clip")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_BakeAndPlay(self):
+        count = clip.Bake(self.path, lambda t: _Animation(4, t), 4, 10, 25)
+        self.assertEqual(count, 3)
+        with clip.Clip(self.path) as animationClip:
+            self.assertEqual(len(animationClip), 3)
+            self.assertEqual(animationClip.ledCount, 4)
+            self.assertEqual(animationClip.fps, 25)
+            self.assertEqual(animationClip.Frame(0), [0x000000] * 4)
+            self.assertEqual(animationClip.Frame(2), [0x020406] * 4)
+            # playback loops
+            self.assertEqual(animationClip(4, 4), [0x010203] * 4)
+
+    def test_Padding(self):
+        clip.Bake(self.path, lambda t: [0xffffff], 3, 1)
+        with clip.Clip(self.path) as animationClip:
+            self.assertEqual(animationClip.Frame(0), [0xffffff, 0x000000, 0x000000])
+
+    def test_Chunks(self):
+        frames = clip.CHUNK_FRAMES * 2 + 5
+        clip.Bake(self.path, lambda t: [t, t + 1], 2, frames)
+        with clip.Clip(self.path) as animationClip:
+            self.assertEqual([animationClip.Frame(t) for t in range(frames + 3)],
+                             [[t % frames, t % frames + 1] for t in range(frames + 3)])
+            # random access across blocks
+            self.assertEqual(animationClip.Frame(1), [1, 2])
+            self.assertEqual(animationClip.Frame(frames - 1), [frames - 1, frames])
+
+    def test_BakeError(self):
+        # a failing animation leaves neither a partial clip nor temporary files behind
+        clip.Bake(self.path, lambda t: [0x010101], 1, 1)
+        def Failing(t):
+            if t == 2:
+                raise RuntimeError("render failed")
+            return [0xffffff]
+        self.assertRaises(RuntimeError, clip.Bake, self.path, Failing, 1, 5)
+        self.assertEqual(os.listdir(self.directory.name), ["test.clip"])
+        with clip.Clip(self.path) as animationClip:
+            self.assertEqual((len(animationClip), animationClip.Frame(0)), (1, [0x010101]))
+
+    def test_InvalidFile(self):
+        with open(self.path, "wb") as file:
+            file.write(b"no clip")
+        self.assertRaises(ValueError, clip.Clip, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
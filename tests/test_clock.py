@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from tools import cache, clock
+
+
+def _Device(delta, raw=None):
+    return SimpleNamespace(configuration=SimpleNamespace(deviceName="test"), time_delta_ms=delta,
+                           _time_delta_ms_raw=raw, latency=2)
+
+
+class TestClock(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(cache, "CACHE_DIR", self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def test_SaveLoad(self):
+        self.assertIsNone(clock.LoadClockModel(_Device(0)))
+        clock.SaveClockModel(_Device(1000), drift=1e-5, latency=4)
+        model = clock.LoadClockModel(_Device(0))
+        self.assertEqual((model["delta"], model["drift"], model["latency"]), (1000, 1e-5, 4))
+        # saving without a drift keeps the stored one
+        clock.SaveClockModel(_Device(1200))
+        model = clock.LoadClockModel(_Device(0))
+        self.assertEqual((model["delta"], model["drift"], model["latency"]), (1200, 1e-5, 2))
+
+    def test_PredictDelta(self):
+        model = {"delta": 1000, "drift": 1e-4, "time": 100, "latency": 0}
+        self.assertAlmostEqual(clock.PredictDelta(model, 100), 1000)
+        # 0.1ms per s
+        self.assertAlmostEqual(clock.PredictDelta(model, 200), 1010)
+
+    def test_SeedClock(self):
+        clock.SaveClockModel(_Device(1000))
+        device = _Device(0, raw=1010)
+        self.assertTrue(clock.SeedClock(device))
+        self.assertAlmostEqual(device.time_delta_ms, 1000, places=0)
+
+    def test_DiscardSeed(self):
+        clock.SaveClockModel(_Device(1000))
+        # the receiver restarted, its clock started from zero
+        device = _Device(5, raw=5)
+        self.assertFalse(clock.SeedClock(device))
+        self.assertEqual(device.time_delta_ms, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
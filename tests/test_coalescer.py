@@ -0,0 +1,64 @@
+import time
+import unittest
+import threading
+from types import SimpleNamespace
+from tools.coalescer import FrameCoalescer
+
+
+class _FakeDevice():
+    def __init__(self):
+        self.frame = SimpleNamespace(colors=[], offset=0)
+        self.sent = []
+        # block sending until released to simulate a slow link
+        self.release = threading.Event()
+
+    def SetColors(self, colors):
+        self.frame.colors = colors
+
+    def Send(self):
+        self.release.wait()
+        self.sent.append(self.frame.colors)
+
+
+class TestFrameCoalescer(unittest.TestCase):
+    def test_LatestWins(self):
+        device = _FakeDevice()
+        coalescer = FrameCoalescer(device)
+        coalescer.Start()
+        coalescer.Submit([1])
+        # wait until the sender thread picked up the first frame and blocks in Send()
+        time.sleep(0.05)
+        for i in range(2, 6):
+            coalescer.Submit([i])
+        device.release.set()
+        coalescer.Stop()
+
+        self.assertEqual(device.sent, [[1], [5]])
+        self.assertEqual(coalescer.produced, 5)
+        self.assertEqual(coalescer.delivered, 2)
+        self.assertEqual(coalescer.dropped, 3)
+
+    def test_SubmitCopies(self):
+        device = _FakeDevice()
+        device.release.set()
+        colors = [1, 2]
+        with FrameCoalescer(device) as coalescer:
+            coalescer.Submit(colors)
+            colors[0] = 0
+        self.assertEqual(device.sent, [[1, 2]])
+
+    def test_SendFails(self):
+        device = _FakeDevice()
+        def Send():
+            raise ConnectionError("connection lost")
+        device.Send = Send
+        with FrameCoalescer(device) as coalescer:
+            coalescer.Submit([1])
+            # the error of the sender thread is raised to the producer
+            self.assertRaises(ConnectionError, coalescer.WaitDelivered)
+            self.assertRaises(ConnectionError, coalescer.Submit, [2])
+        self.assertEqual(coalescer.produced, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
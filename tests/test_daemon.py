@@ -0,0 +1,90 @@
+import io
+import os
+import socket
+import tempfile
+import stat
+import threading
+import unittest
+from unittest import mock
+from tools import daemon
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not supported")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "alup.sock")
+        self.commands = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _Handler(self, line):
+        self.commands.append(line)
+        if line == "exit":
+            return daemon.CLOSED, "bye\n"
+        if line == "fail":
+            raise RuntimeError("failed")
+        return daemon.OK, line.upper()
+
+    def test_Commands(self):
+        server = daemon.DaemonServer(self._Handler, self.path)
+        server.Start()
+        try:
+            with daemon.DaemonClient(self.path, timeout=5) as client:
+                self.assertEqual(client.Execute("setall 0xff0000"), (daemon.OK, "SETALL 0XFF0000"))
+                self.assertEqual(client.Execute("fail")[0], daemon.ERROR)
+                # a second client is served by the same daemon
+                with daemon.DaemonClient(self.path, timeout=5) as other:
+                    self.assertEqual(other.Execute("clear"), (daemon.OK, "CLEAR"))
+                self.assertEqual(client.Execute("exit"), (daemon.CLOSED, "bye\n"))
+            self.assertTrue(server.Wait(5))
+            self.assertFalse(os.path.exists(self.path))
+        finally:
+            server.Stop()
+        self.assertEqual(self.commands, ["setall 0xff0000", "fail", "clear", "exit"])
+
+    def test_Permissions(self):
+        # the directory of the socket is created for the current user only
+        self.path = os.path.join(self.directory.name, "run", "alup.sock")
+        server = daemon.DaemonServer(self._Handler, self.path)
+        server.Start()
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode), 0o700)
+        finally:
+            server.Stop()
+
+    def test_DefaultSocket(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": "/run/user/1000"}):
+            self.assertEqual(daemon._DefaultSocket(), "/run/user/1000/alup-controller.sock")
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": ""}):
+            self.assertTrue(daemon._DefaultSocket().startswith(daemon.cache.CACHE_DIR))
+
+    def test_SocketInUse(self):
+        server = daemon.DaemonServer(self._Handler, self.path)
+        server.Start()
+        try:
+            self.assertRaises(OSError, daemon.DaemonServer(self._Handler, self.path).Start)
+        finally:
+            server.Stop()
+        self.assertRaises(OSError, daemon.DaemonClient, self.path)
+
+
+class TestOutputCapture(unittest.TestCase):
+    def test_Threads(self):
+        stream = io.StringIO()
+        stdout = daemon.OutputCapture(stream)
+        with stdout.Capture(io.StringIO()) as output:
+            print("command", file=stdout)
+            # e.g. an animation printing in the background
+            thread = threading.Thread(target=print, args=("background",), kwargs={"file": stdout})
+            thread.start()
+            thread.join()
+        print("after", file=stdout)
+        self.assertEqual(output.getvalue(), "command\n")
+        self.assertEqual(stream.getvalue(), "background\nafter\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
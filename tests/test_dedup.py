@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from tools import dedup
+from tools.dedup import FrameDeduplicator
+
+
+class TestFrameDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.clock = SimpleNamespace(now=100)
+        patcher = mock.patch.object(dedup, "time", SimpleNamespace(time=lambda: self.clock.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_Unchanged(self):
+        deduplicator = FrameDeduplicator(keepalive=1.0)
+        self.assertTrue(deduplicator.ShouldSend([1, 2]))
+        self.assertFalse(deduplicator.ShouldSend([1, 2]))
+        self.assertTrue(deduplicator.ShouldSend([1, 3]))
+        self.assertEqual((deduplicator.sent, deduplicator.suppressed), (2, 1))
+
+    def test_Keepalive(self):
+        deduplicator = FrameDeduplicator(keepalive=1.0)
+        self.assertTrue(deduplicator.ShouldSend([1]))
+        self.clock.now += 0.5
+        self.assertFalse(deduplicator.ShouldSend([1]))
+        self.clock.now += 0.5
+        # sent again, so the receiver resyncs if a frame got lost
+        self.assertTrue(deduplicator.ShouldSend([1]))
+        self.assertFalse(deduplicator.ShouldSend([1]))
+
+    def test_Reset(self):
+        deduplicator = FrameDeduplicator()
+        deduplicator.ShouldSend([1])
+        deduplicator.Reset()
+        self.assertTrue(deduplicator.ShouldSend([1]))
+
+    def test_Offset(self):
+        deduplicator = FrameDeduplicator()
+        deduplicator.ShouldSend([1], offset=0)
+        self.assertTrue(deduplicator.ShouldSend([1], offset=5))
+        self.assertFalse(deduplicator.ShouldSend([1], offset=5))
+
+    def test_HashCollision(self):
+        # -1 and -2 have the same hash; the frames differ nonetheless
+        self.assertEqual(hash(-1), hash(-2))
+        deduplicator = FrameDeduplicator()
+        deduplicator.ShouldSend([-1])
+        self.assertTrue(deduplicator.ShouldSend([-2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
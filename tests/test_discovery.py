@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import subprocess
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from tools import discovery
+
+
+class TestDiscovery(unittest.TestCase):
+    def test_ExpandHosts(self):
+        self.assertEqual(discovery.ExpandHosts("192.168.1.10-12, alup-1.local"), ["192.168.1.10", "192.168.1.11", "192.168.1.12", "alup-1.local"])
+        self.assertEqual(discovery.ExpandHosts("10.0.0.0/30,10.0.0.9/32"), ["10.0.0.1", "10.0.0.2", "10.0.0.9"])
+        self.assertEqual(discovery.ExpandHosts(""), [])
+        self.assertRaises(ValueError, discovery.ExpandHosts, "10.0.0.0/33")
+
+    def test_RunConcurrently(self):
+        def Probe(value, delay):
+            time.sleep(delay)
+            if value < 0:
+                raise ConnectionError()
+            return value
+        start = time.time()
+        results = discovery.RunConcurrently([(Probe, (i, 0.1)) for i in range(10)] + [(Probe, (-1, 0)), (Probe, (99, 2))], 0.5)
+        # the probes run at the same time; the hanging one is cut off
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(results, list(range(10)) + [None, None])
+        self.assertEqual(discovery.RunWithTimeout(Probe, 1, 3, 0), 3)
+
+    def test_Workers(self):
+        running = []
+        peak = []
+        def Probe(value):
+            running.append(value)
+            peak.append(len(running))
+            time.sleep(0.1)
+            running.remove(value)
+            return value
+        # only two functions run at a time
+        self.assertEqual(discovery.RunConcurrently([(Probe, (i,)) for i in range(6)], 2.0, workers=2), list(range(6)))
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(discovery.RunConcurrently([], 1), [])
+
+    def test_AllHostsProbed(self):
+        probed = {}
+        def ProbeTcp(host, port, timeout, opened):
+            # a silent host; the connection attempt times out
+            probed[host] = timeout
+            time.sleep(timeout * 0.5)
+            raise TimeoutError()
+        hosts = discovery.ExpandHosts("10.0.0.0/28")
+        with mock.patch.object(discovery, "ProbeTcp", ProbeTcp), mock.patch.object(discovery, "MAX_WORKERS", 4):
+            self.assertEqual(discovery.Discover([], hosts, timeout=0.8), [])
+        # 14 hosts on 4 workers: each probe gets a quarter of the budget
+        self.assertEqual(sorted(probed), sorted(hosts))
+        self.assertEqual(set(probed.values()), {0.2})
+
+    def test_HangingProbeExit(self):
+        # a probe which hangs forever does not keep the process alive
+        script = "import time; from tools import discovery; discovery.RunWithTimeout(time.sleep, 0.2, 10)"
+        start = time.time()
+        subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True, timeout=10)
+        self.assertLess(time.time() - start, 5)
+
+    def test_CloseHangingProbes(self):
+        device = SimpleNamespace(connected=True)
+        device.Disconnect = lambda: setattr(device, "connected", False)
+        def ProbeTcp(host, port, timeout, opened):
+            opened.append(device)
+            time.sleep(1)
+        with mock.patch.object(discovery, "ProbeTcp", ProbeTcp):
+            self.assertEqual(discovery.Discover([], ["alup.local"], timeout=0.1), [])
+        self.assertFalse(device.connected)
+
+    def test_ClosedPort(self):
+        self.assertEqual(discovery.Discover([], ["127.0.0.1"], tcpPort=1, timeout=0.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
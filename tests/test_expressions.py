@@ -0,0 +1,39 @@
+import unittest
+import effects
+import animator
+import expressions
+
+
+class TestExpressions(unittest.TestCase):
+    def test_Colors(self):
+        self.assertEqual(expressions.Compile("0xff0000")(3), [0xff0000] * 3)
+        self.assertEqual(expressions.Compile("hsv(x)")(3), [0xff0000, 0x00ff00, 0x0000ff])
+        self.assertEqual(expressions.Compile("rgb(1, 0.5, 0)")(1), [0xff8000])
+        self.assertEqual(expressions.Compile("mix(0x000000, 0xffffff, 0.5)")(1), [0x808080])
+
+    def test_Conditions(self):
+        self.assertEqual(expressions.Compile("0xff0000 if i < n / 2 else 0x0000ff")(4), [0xff0000] * 2 + [0x0000ff] * 2)
+        self.assertEqual(expressions.Compile("0 < i < 3 and not i == 1")(4), [0, 0, 1, 0])
+        self.assertEqual(expressions.Compile("t")(2, 5), [5, 5])
+
+    def test_Noise(self):
+        values = expressions.Compile("rgb(noise(i / 4), 0, 0)")(32)
+        self.assertTrue(all(0 <= value <= 0xff0000 for value in values))
+        self.assertEqual(values, expressions.Compile("rgb(noise(i / 4), 0, 0)")(32))
+
+    def test_Invalid(self):
+        for source in ["__import__('os')", "i.real", "(lambda: 1)()", "[1, 2]", "'red'", "foo(i)", "y", "1 +"]:
+            self.assertRaises(ValueError, expressions.Compile, source)
+        self.assertRaises(ValueError, expressions.Compile("9 ** 9 ** 9"), 3)
+        # huge numbers and deeply nested expressions
+        self.assertRaises(ValueError, expressions.Compile, "1" + "0" * 400)
+        self.assertRaises(ValueError, expressions.Compile, "-" * 100_000 + "1")
+        self.assertRaises(ValueError, expressions.Compile, "(" * 1000 + "1" + ")" * 1000)
+
+    def test_EffectAndAnimation(self):
+        self.assertEqual(effects.Expression(2, "0x00ff00"), [0x00ff00] * 2)
+        self.assertEqual(animator.Expression(2, 3, "t * 2"), [6, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
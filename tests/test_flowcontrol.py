@@ -0,0 +1,68 @@
+import time
+import asyncio
+import unittest
+from types import SimpleNamespace
+from tools.flowcontrol import FlowControl
+
+
+def _Now():
+    return time.time_ns() / 1_000_000
+
+
+class _FakeDevice():
+    # frames were sent `age` ms ago, one every `interval` ms (oldest first)
+    def __init__(self, inFlight, age=0, interval=0, latency=50):
+        self.configuration = SimpleNamespace(frameBufferSize=4)
+        now = _Now()
+        self._unansweredFrames = [SimpleNamespace(_t_frame_out=now - age + i * interval) for i in range(inFlight)]
+        self.latency = latency
+        self.flushes = 0
+
+    def FlushBuffer(self):
+        self.flushes += 1
+        self._unansweredFrames.clear()
+
+    def ReceivePending(self):
+        # one response arrived
+        self._unansweredFrames.pop(0)
+
+
+class TestFlowControl(unittest.TestCase):
+    def test_Ready(self):
+        flowControl = FlowControl(_FakeDevice(1))
+        self.assertEqual(flowControl.window, 2)
+        self.assertTrue(flowControl.Wait(timeout=0))
+        self.assertEqual(flowControl.waits, 0)
+
+    def test_WaitForOneSlot(self):
+        # four frames in flight on a window of two: waits for the round trip of the third newest frame only
+        device = _FakeDevice(4, age=30, interval=10, latency=50)
+        flowControl = FlowControl(device)
+        start = time.time()
+        self.assertTrue(flowControl.Wait(timeout=1.0))
+        self.assertAlmostEqual(time.time() - start, 0.04, delta=0.02)
+        # the window was not emptied
+        self.assertEqual((device.flushes, len(device._unansweredFrames), flowControl.waits), (0, 4, 1))
+
+    def test_Drain(self):
+        device = _FakeDevice(4, latency=1000)
+        flowControl = FlowControl(device, drain=device.ReceivePending)
+        self.assertTrue(flowControl.Wait(timeout=1.0))
+        # one slot was freed, the other frames stay in flight
+        self.assertEqual(len(device._unansweredFrames), 1)
+
+    def test_Timeout(self):
+        # a receiver which does not answer
+        flowControl = FlowControl(_FakeDevice(4, latency=1000), drain=lambda: None)
+        start = time.time()
+        self.assertFalse(flowControl.Wait(timeout=0.05))
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_WaitAsync(self):
+        device = _FakeDevice(4, age=100, latency=50)
+        self.assertTrue(asyncio.run(FlowControl(device).WaitAsync(timeout=1.0)))
+        self.assertEqual(device.flushes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
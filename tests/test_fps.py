@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from tools import fps as fpsModule
+from tools.fps import FpsController, FpsProbe
+
+
+def _FakeDevice(latency=10, openResponses=0, frameBufferSize=8):
+    device = SimpleNamespace()
+    device.configuration = SimpleNamespace(frameBufferSize=frameBufferSize, ledCount=10, deviceName="test")
+    device.latency = latency
+    device._unansweredFrames = [None] * openResponses
+    device.flushed = 0
+    device.FlushBuffer = lambda: setattr(device, "flushed", device.flushed + 1)
+    return device
+
+
+class TestFpsController(unittest.TestCase):
+    def test_Increase(self):
+        device = _FakeDevice()
+        controller = FpsController(device, fps=10, increase=2.0)
+        fps = controller.Update()
+        self.assertAlmostEqual(fps, 10.2)
+
+    def test_DecreaseOnOpenResponses(self):
+        device = _FakeDevice()
+        controller = FpsController(device, fps=40, decrease=0.5)
+        controller.Update()
+        device._unansweredFrames = [None] * 5
+        self.assertTrue(controller.IsCongested())
+        fps = controller.Update()
+        self.assertAlmostEqual(fps, 20.025)
+
+    def test_DecreaseOnLatency(self):
+        device = _FakeDevice(latency=10)
+        controller = FpsController(device, fps=40, decrease=0.5)
+        controller.Update()
+        device.latency = 30
+        fps = controller.Update()
+        self.assertAlmostEqual(fps, 20.025)
+        # no second decrease within the same round trip
+        self.assertAlmostEqual(controller.Update(), 20.025)
+
+    def test_Limits(self):
+        device = _FakeDevice()
+        controller = FpsController(device, fps=200, minFps=5, maxFps=60)
+        self.assertEqual(controller.fps, 60)
+        self.assertEqual(controller.Update(), 60)
+        device._unansweredFrames = [None] * 8
+        controller.decrease = 0.01
+        self.assertEqual(controller.Update(), 5)
+
+    def test_CongestedBeforeUpdate(self):
+        controller = FpsController(_FakeDevice())
+        self.assertFalse(controller.IsCongested())
+
+    def test_Sustained(self):
+        clock = SimpleNamespace(now=0)
+        device = _FakeDevice()
+        with mock.patch.object(fpsModule, "time", SimpleNamespace(time=lambda: clock.now)):
+            controller = FpsController(device, fps=40, decrease=0.5, steadyTime=1.0)
+            controller.Update()
+            self.assertIsNone(controller.sustainedFps)
+            clock.now = 1.0
+            controller.Update()
+            sustained = controller.sustainedFps
+            self.assertAlmostEqual(sustained, 40.05)
+            # a congested rate is never sustained
+            device._unansweredFrames = [None] * 5
+            clock.now = 2.0
+            controller.Update()
+            self.assertEqual(controller.sustainedFps, sustained)
+            device._unansweredFrames = []
+            clock.now = 2.5
+            controller.Update()
+            self.assertEqual(controller.sustainedFps, sustained)
+
+
+class TestFpsProbe(unittest.TestCase):
+    def test_Probe(self):
+        clock = SimpleNamespace(now=0)
+        device = _FakeDevice()
+        with mock.patch.object(fpsModule, "time", SimpleNamespace(time=lambda: clock.now)):
+            probe = FpsProbe(device, frames=10)
+            self.assertIsNone(probe.Sent())
+            for _ in range(9):
+                clock.now += 0.01
+                self.assertIsNone(probe.Sent())
+            clock.now += 0.01
+            self.assertAlmostEqual(probe.Sent(), 90)
+        self.assertEqual(device.flushed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import unittest
+import importlib.util
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# maximum time in s for importing the CLI
+IMPORT_BUDGET = 0.5
+HEAVY_MODULES = ["numpy", "matplotlib", "tqdm"]
+
+
+def _Run(code):
+    """
+    Run the given code in a fresh interpreter, as this process already imported most modules
+    @return: the output of the code
+    """
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return result.stdout.strip()
+
+
+class TestImports(unittest.TestCase):
+    def test_LazyImport(self):
+        output = _Run(
+            "import sys\n"
+            "from tools.lazy import LazyImport\n"
+            "upsample = LazyImport('tools.upsample')\n"
+            "print('numpy' in sys.modules)\n"
+            "upsample.FrameUpsampler\n"
+            "print('numpy' in sys.modules)\n")
+        self.assertEqual(output.split(), ["False", "True"])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyalup") and importlib.util.find_spec("serial"), "pyalup and pyserial are required")
+    def test_CliImportTime(self):
+        output = _Run(
+            "import sys, time, importlib.util\n"
+            "start = time.perf_counter()\n"
+            "spec = importlib.util.spec_from_file_location('controller', 'ALUP-Controller.py')\n"
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+            "print(time.perf_counter() - start)\n"
+            "print('loaded:' + ','.join(name for name in %r if name in sys.modules))\n" % (HEAVY_MODULES))
+        duration, loaded = output.splitlines()
+        self.assertLess(float(duration), IMPORT_BUDGET)
+        self.assertEqual(loaded, "loaded:")
+
+
+if __name__ == '__main__':
+    unittest.main()
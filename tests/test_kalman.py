@@ -0,0 +1,72 @@
+import random
+import statistics
+import unittest
+from tools.kalman import ClockTracker
+
+
+def _Simulate(frames, skew=5e-5, offset=5000, seed=0):
+    # time stamps of frames sent every 10ms to a receiver whose clock runs `skew` fast,
+    # with jittery latencies and the occasional frame delayed by a full buffer
+    rand = random.Random(seed)
+    for i in range(frames):
+        t_frame_out = i * 10.0
+        t_in = t_frame_out + rand.uniform(1, 4) + (100 if rand.random() < 0.02 else 0)
+        t_out = t_in + 0.5
+        t_response_in = t_out + rand.uniform(1, 4)
+        receiver = lambda t: t + offset + skew * t
+        yield t_frame_out, receiver(t_in), receiver(t_out), t_response_in, receiver
+
+
+class TestClockTracker(unittest.TestCase):
+    def test_Converges(self):
+        tracker = ClockTracker()
+        for t_frame_out, t_in, t_out, t_response_in, receiver in _Simulate(3000):
+            tracker.AddMeasurement(t_frame_out, t_in, t_out, t_response_in)
+        self.assertAlmostEqual(tracker.skew, 5e-5, delta=1e-5)
+        self.assertAlmostEqual(tracker.ReceiverTime(30_000), receiver(30_000), delta=1.0)
+
+    def test_BetterThanMedian(self):
+        # compare the one step ahead prediction to the median of the last 100 raw time deltas
+        tracker = ClockTracker()
+        raw = []
+        kalmanErrors = []
+        medianErrors = []
+        for i, (t_frame_out, t_in, t_out, t_response_in, receiver) in enumerate(_Simulate(5000)):
+            if i > 500:
+                truth = receiver(t_response_in) - t_response_in
+                kalmanErrors.append(abs(tracker.Offset(t_response_in) - truth))
+                medianErrors.append(abs(statistics.median(raw[-100:]) - truth))
+            tracker.AddMeasurement(t_frame_out, t_in, t_out, t_response_in)
+            raw.append(((t_in - t_frame_out) + (t_out - t_response_in)) / 2)
+        self.assertLess(statistics.mean(kalmanErrors), statistics.mean(medianErrors))
+
+    def test_Outlier(self):
+        tracker = ClockTracker()
+        for t_frame_out, t_in, t_out, t_response_in, receiver in _Simulate(500):
+            tracker.AddMeasurement(t_frame_out, t_in, t_out, t_response_in)
+        offset = tracker.Offset(5000)
+        # a measurement far off the prediction with a short round trip is rejected
+        self.assertFalse(tracker.AddMeasurement(5000, receiver(5001) + 100, receiver(5001.5) + 100, 5003))
+        self.assertEqual(tracker.rejected, 1)
+        self.assertAlmostEqual(tracker.Offset(5000), offset, delta=0.01)
+
+    def test_OffsetStep(self):
+        tracker = ClockTracker()
+        for t_frame_out, t_in, t_out, t_response_in, receiver in _Simulate(500):
+            tracker.AddMeasurement(t_frame_out, t_in, t_out, t_response_in)
+        # the receiver rebooted; its clock jumped by 4000ms
+        for t_frame_out, t_in, t_out, t_response_in, receiver in _Simulate(100, offset=9000, seed=1):
+            t_frame_out += 5000
+            t_response_in += 5000
+            tracker.AddMeasurement(t_frame_out, t_in + 5000, t_out + 5000, t_response_in)
+        self.assertEqual(tracker.resets, 1)
+        self.assertAlmostEqual(tracker.Offset(6000), receiver(1000) - 1000, delta=1.0)
+
+    def test_NoMeasurement(self):
+        tracker = ClockTracker()
+        self.assertIsNone(tracker.Offset(0))
+        self.assertIsNone(tracker.ReceiverTime(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
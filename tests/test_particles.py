@@ -0,0 +1,54 @@
+import unittest
+from particles import ParticleSystem
+
+
+class TestParticleSystem(unittest.TestCase):
+    def test_Render(self):
+        system = ParticleSystem(4)
+        system.Emit(1, color=0xff0000, life=10)
+        self.assertEqual(system.Render(), [0x000000, 0xff0000, 0x000000, 0x000000])
+
+    def test_AntiAliasing(self):
+        system = ParticleSystem(3)
+        system.Emit(0.5, color=0xfefefe, life=10)
+        self.assertEqual(system.Render(), [0x7f7f7f, 0x7f7f7f, 0x000000])
+
+    def test_AdditiveBlending(self):
+        system = ParticleSystem(2)
+        system.Emit([0, 0, 1], color=[0x800000, 0x800000, 0x000010], life=10)
+        self.assertEqual(system.Render(), [0xff0000, 0x000010])
+
+    def test_Update(self):
+        system = ParticleSystem(5)
+        system.Emit([0, 2], velocity=[1, 10], color=0x0000ff, life=[4, 4])
+        system.Update()
+        # the fast particle left the strip
+        self.assertEqual(len(system), 1)
+        # the remaining particle moved and faded
+        self.assertEqual(system.Render(), [0x000000, 0x0000bf, 0x000000, 0x000000, 0x000000])
+        for _ in range(3):
+            system.Update()
+        self.assertEqual(len(system), 0)
+
+    def test_Capacity(self):
+        system = ParticleSystem(10, capacity=3)
+        self.assertEqual(system.Emit(0, count=5), 3)
+        self.assertEqual(system.Emit(0), 0)
+
+    def test_CapacityArrays(self):
+        system = ParticleSystem(10, capacity=3)
+        self.assertEqual(system.Emit([0, 1], velocity=[1, 2], color=[0xff0000, 0x00ff00], life=[5, 6]), 2)
+        # only the first particle fits
+        self.assertEqual(system.Emit([2, 3, 4], velocity=[3, 4, 5], color=[0x0000ff, 0x0000ff, 0x0000ff], life=[7, 8, 9]), 1)
+        self.assertEqual(list(system.position[:3]), [0, 1, 2])
+        self.assertEqual(list(system.life[:3]), [5, 6, 7])
+
+    def test_EmitEmpty(self):
+        system = ParticleSystem(10)
+        self.assertEqual(system.Emit([], 0.0, 0xffffff, 1), 0)
+        self.assertEqual(system.Emit(0, velocity=[], life=[]), 0)
+        self.assertEqual(len(system), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
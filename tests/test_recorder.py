@@ -0,0 +1,88 @@
+import os
+import time
+import tempfile
+import unittest
+from types import SimpleNamespace
+from tools import recorder
+
+
+class _FakeDevice():
+    def __init__(self):
+        self.frame = SimpleNamespace(colors=[], offset=0, timestamp=0)
+        self.sent = []
+
+    def SetColors(self, colors):
+        self.frame.colors = colors
+
+    def Send(self, frame=None):
+        frame = self.frame if frame is None else frame
+        self.sent.append((list(frame.colors), frame.offset))
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.rec")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_RecordAndReplay(self):
+        device = _FakeDevice()
+        with recorder.Recorder(device, self.path) as rec:
+            device.SetColors([0xff0000, 0x00ff00])
+            device.Send()
+            device.frame.offset = 3
+            device.frame.timestamp = 1234
+            device.SetColors([0x0000ff])
+            device.Send()
+        self.assertEqual(rec.frames, 2)
+        # the original Send() is restored
+        self.assertNotIn("Send", vars(device))
+
+        records = list(recorder.ReadRecording(self.path))
+        self.assertEqual([record[1:] for record in records], [(0, 0, [0xff0000, 0x00ff00]), (1234, 3, [0x0000ff])])
+        self.assertLessEqual(records[0][0], records[1][0])
+
+        target = _FakeDevice()
+        self.assertEqual(recorder.Replay(target, self.path, None), 2)
+        self.assertEqual(target.sent, [([0xff0000, 0x00ff00], 0), ([0x0000ff], 3)])
+
+    def test_Append(self):
+        device = _FakeDevice()
+        for _ in range(2):
+            with recorder.Recorder(device, self.path):
+                device.Send()
+        self.assertEqual(len(list(recorder.ReadRecording(self.path))), 2)
+
+
+    def test_ReplaySpeed(self):
+        device = _FakeDevice()
+        for _ in range(2):
+            with recorder.Recorder(device, self.path):
+                device.Send()
+            # a long pause between two sessions
+            time.sleep(0.2)
+        start = time.time()
+        self.assertEqual(recorder.Replay(_FakeDevice(), self.path, 1.0, maxGap=0.01), 2)
+        self.assertLess(time.time() - start, 0.1)
+        self.assertRaises(ValueError, recorder.Replay, _FakeDevice(), self.path, 0)
+
+    def test_StopWrapped(self):
+        device = _FakeDevice()
+        rec = recorder.Recorder(device, self.path)
+        rec.Start()
+        # another wrapper installed on top of the recording
+        recordingSend = device.Send
+        wrapped = []
+        def WrappedSend(frame=None):
+            wrapped.append(frame)
+            return recordingSend(frame)
+        device.Send = WrappedSend
+        rec.Stop()
+        self.assertIs(device.Send, WrappedSend)
+        device.Send()
+        self.assertEqual((len(wrapped), len(device.sent), rec.frames), (1, 1, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+import unittest
+import animator
+from tools.renderpool import RenderPool
+
+
+class TestRenderPool(unittest.TestCase):
+    def test_Ordered(self):
+        with RenderPool(animator.Rainbow, 20, (2.0,), workers=2) as pool:
+            for t in range(10):
+                self.assertEqual(pool.Render(t), animator.Rainbow(20, t, 2.0))
+            # jumping back restarts the lookahead
+            self.assertEqual(pool.Render(3), animator.Rainbow(20, 3, 2.0))
+
+    def test_Stateful(self):
+        self.assertRaises(ValueError, RenderPool, animator.Comet, 10)
+        self.assertRaises(ValueError, RenderPool, animator.Sparkle, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
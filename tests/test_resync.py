@@ -0,0 +1,76 @@
+import threading
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from tools import resync
+
+
+class _FakeDevice():
+    # a receiver whose clock runs 100ppm fast. Like pyALUP, Send() returns before the
+    # response arrives; responses are processed by the next Send() or FlushBuffer()
+    def __init__(self, clock):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.lastSendTime = 0
+        self.time_delta_ms = 1000
+        self._time_delta_ms_raw = None
+        self._onFrameResponse = None
+        self.pending = 0
+        self.sent = 0
+
+    def Send(self):
+        self.FlushBuffer()
+        self.sent += 1
+        self.pending += 1
+
+    def FlushBuffer(self):
+        for _ in range(self.pending):
+            self._time_delta_ms_raw = 1000 + 1e-4 * self.clock.now * 1000
+            if self._onFrameResponse is not None:
+                self._onFrameResponse(None)
+        self.pending = 0
+
+
+class TestResynchronizer(unittest.TestCase):
+    def setUp(self):
+        self.clock = SimpleNamespace(now=0)
+        patcher = mock.patch.object(resync, "time", SimpleNamespace(time=lambda: self.clock.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.device = _FakeDevice(self.clock)
+
+    def test_Drift(self):
+        sync = resync.Resynchronizer(self.device, maxError=1.0, minInterval=0.5, maxInterval=60)
+        self.assertEqual(sync.Interval(), 0.5)
+        for now in (0, 10, 20, 30):
+            self.clock.now = now
+            self.assertTrue(sync.Sync())
+        self.assertAlmostEqual(sync.drift, 1e-4)
+        self.assertAlmostEqual(self.device.time_delta_ms, 1003)
+        # 1ms of error after 10s
+        self.assertAlmostEqual(sync.Interval(), 10)
+
+    def test_LateResponse(self):
+        # every sample holds the time delta of its own response, not the one of the previous sync
+        callback = []
+        self.device._onFrameResponse = callback.append
+        sync = resync.Resynchronizer(self.device)
+        for now in (0, 10):
+            self.clock.now = now
+            sync.Sync()
+        self.assertEqual(sync.samples, [(0, 1000), (10, 1001)])
+        # a callback which was registered before is still called
+        self.assertEqual(len(callback), 2)
+        self.assertEqual(self.device._onFrameResponse, callback.append)
+
+    def test_Busy(self):
+        sync = resync.Resynchronizer(self.device)
+        with self.device.lock:
+            # animation traffic has priority
+            self.assertFalse(sync.Sync())
+        self.assertEqual((self.device.sent, sync.skipped), (0, 1))
+        self.assertTrue(sync.Sync())
+
+
+if __name__ == '__main__':
+    unittest.main()
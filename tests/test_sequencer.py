@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+import effects
+import animator
+import sequencer
+from sequencer import Sequencer, PlaylistItem
+
+
+class TestSequencer(unittest.TestCase):
+    def test_Crossfade(self):
+        items = [PlaylistItem(effects.SingleColor, [0xff0000], 5, True), PlaylistItem(effects.SingleColor, [0x0000ff], 10, True)]
+        playlist = Sequencer(1, items, crossfade=3, loop=False)
+        colors = [playlist.Render(t) for t in range(13)]
+        self.assertEqual(colors[:2], [[0xff0000]] * 2)
+        self.assertEqual(colors[2:5], [[0xbf003f], [0x7f007f], [0x3f00bf]])
+        # the second item continues after the frames shown during the crossfade
+        self.assertEqual(colors[5:12], [[0x0000ff]] * 7)
+        self.assertEqual(colors[12], [])
+
+    def test_Loop(self):
+        items = [PlaylistItem(effects.SingleColor, [0xff0000], 2, True), PlaylistItem(effects.SingleColor, [0x00ff00], 2, True)]
+        playlist = Sequencer(1, items, crossfade=0)
+        colors = [playlist.Render(t)[0] for t in range(6)]
+        self.assertEqual(colors, [0xff0000, 0xff0000, 0x00ff00, 0x00ff00, 0xff0000, 0xff0000])
+
+    def test_AnimationEndsEarly(self):
+        def Short(n, t):
+            return [0x000001] * n if t < 2 else []
+        items = [PlaylistItem(Short, [], 100), PlaylistItem(animator.testAnimation, [], 10)]
+        playlist = Sequencer(1, items, crossfade=5, loop=False)
+        colors = [playlist.Render(t) for t in range(3)]
+        self.assertEqual(colors, [[0x000001], [0x000001], [0xff0000]])
+
+    def test_NoFrames(self):
+        # every item ends right away; the show ends instead of skipping items forever
+        def Empty(n, t):
+            return []
+        playlist = Sequencer(1, [PlaylistItem(Empty, [], 10), PlaylistItem(Empty, [], 10)], crossfade=0)
+        self.assertEqual(playlist.Render(0), [])
+
+    def test_LoadPlaylist(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "show.txt")
+            with open(path, "w") as file:
+                file.write("# comment\n\n1.5 effect SingleColor 0xff0000\n2 animation blink 0x00ff00 5\n")
+            items = sequencer.LoadPlaylist(path, fps=10)
+            self.assertEqual([(item.name, item.args, item.duration, item.isEffect) for item in items],
+                             [("SingleColor", [0xff0000], 15, True), ("blink", [0x00ff00, 5], 20, False)])
+
+            with open(path, "w") as file:
+                file.write("1 effect DoesNotExist\n")
+            self.assertRaises(ValueError, sequencer.LoadPlaylist, path)
+
+            # wrong arguments are reported when loading, not while playing
+            for line in ["1 effect SingleColor 1 2 3\n", "1 animation blink 1 2 3\n"]:
+                with open(path, "w") as file:
+                    file.write(line)
+                self.assertRaises(ValueError, sequencer.LoadPlaylist, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
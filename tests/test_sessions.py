@@ -0,0 +1,37 @@
+import unittest
+from tools.sessions import SessionManager
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.sessions = SessionManager()
+        self.sessions.Add("COM6", "a", tags=["stage"])
+        self.sessions.Add("10.0.0.2:5012", "b")
+        self.sessions.Add("COM7", "c", tags=["stage", "left"])
+
+    def test_Select(self):
+        self.assertEqual(self.sessions.Select("all"), [("COM6", "a"), ("10.0.0.2:5012", "b"), ("COM7", "c")])
+        self.assertEqual(self.sessions.Select("COM7"), [("COM7", "c")])
+        self.assertEqual(self.sessions.Select("stage"), [("COM6", "a"), ("COM7", "c")])
+        self.sessions.Untag("COM7", "stage")
+        self.assertEqual(self.sessions.Select("stage"), [("COM6", "a")])
+        self.assertEqual(self.sessions.Select("unknown"), [])
+
+    def test_UseAndRemove(self):
+        self.sessions.Use("COM7")
+        self.assertEqual(self.sessions.active, "COM7")
+        self.assertRaises(KeyError, self.sessions.Use, "COM8")
+        self.assertEqual(self.sessions.Remove("COM7"), "c")
+        self.assertIsNone(self.sessions.active)
+        self.assertEqual(self.sessions.Names(), ["COM6", "10.0.0.2:5012"])
+        self.assertEqual(self.sessions.Tags("COM7"), [])
+
+    def test_Names(self):
+        self.assertRaises(ValueError, self.sessions.Add, "COM6", "d")
+        self.assertRaises(ValueError, self.sessions.Add, "all", "d")
+        self.assertEqual(self.sessions.UniqueName("COM6"), "COM6-2")
+        self.assertEqual(self.sessions.UniqueName("COM8"), "COM8")
+
+
+if __name__ == '__main__':
+    unittest.main()
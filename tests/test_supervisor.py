@@ -0,0 +1,97 @@
+import unittest
+from types import SimpleNamespace
+from tools.supervisor import SupervisedDevice
+
+
+class _FakeDevice():
+    def __init__(self, failures):
+        self.frame = SimpleNamespace(colors=[], offset=0)
+        self.time_delta_ms = 0
+        self.latency = 1
+        self._time_delta_ms_raw = None
+        self.connected = True
+        self.sent = []
+        # the number of sends which fail before the link "breaks" for good
+        self.failures = failures
+
+    def SetColors(self, colors):
+        self.frame.colors = colors
+
+    def Send(self):
+        if self.failures == 0:
+            raise ConnectionResetError("link lost")
+        self.failures -= 1
+        self.sent.append((list(self.frame.colors), self.frame.offset))
+
+    def Disconnect(self):
+        self.connected = False
+
+
+class TestSupervisedDevice(unittest.TestCase):
+    def setUp(self):
+        self.devices = []
+        # the number of successful sends of each connection; None for connection attempts which fail.
+        # the first connection breaks after one frame, the first reconnect attempt fails
+        self.failures = [1, None, 100]
+        # the raw time delta measured by new connections
+        self.raw = None
+
+    def _Connect(self):
+        failures = self.failures[len(self.devices)]
+        self.devices.append(None)
+        if failures is None:
+            raise ConnectionRefusedError()
+        device = _FakeDevice(failures)
+        device._time_delta_ms_raw = self.raw
+        self.devices[-1] = device
+        return device
+
+    def test_Reconnect(self):
+        device = SupervisedDevice(self._Connect, backoff=0)
+        device._onFrameResponse = "callback"
+        device.time_delta_ms = 42
+        device.SetColors([1, 2])
+        device.Send()
+        device.SetColors([3, 4])
+        device.frame.offset = 5
+        # the link breaks; the frame is sent on the new connection
+        device.Send()
+        first, failed, second = self.devices
+        self.assertIsNone(failed)
+        self.assertFalse(first.connected)
+        self.assertIs(device.device, second)
+        self.assertEqual(device.reconnects, 1)
+        self.assertEqual(second.sent, [([3, 4], 5)])
+        self.assertEqual(second._onFrameResponse, "callback")
+        self.assertEqual(second.time_delta_ms, 42)
+
+    def test_ReceiverRestart(self):
+        device = SupervisedDevice(self._Connect, backoff=0)
+        # e.g. seeded from the stored clock model
+        device.time_delta_ms = 5000.5
+        device.SetColors([1])
+        device.Send()
+        # the receiver restarted, its clock started from zero
+        self.raw = -100
+        device.Send()
+        self.assertEqual(device.reconnects, 1)
+        self.assertEqual(device.device.time_delta_ms, 0)
+
+    def test_GiveUp(self):
+        self.failures = [0, None, None, None]
+        device = SupervisedDevice(self._Connect, retries=2, backoff=0)
+        device.SetColors([1])
+        self.assertRaises(ConnectionRefusedError, device.Send)
+        self.assertEqual(len(self.devices), 3)
+
+    def test_Disconnect(self):
+        self.failures = [0]
+        device = SupervisedDevice(self._Connect, backoff=0)
+        device.Disconnect()
+        # an intentionally closed connection is not restored
+        self.assertRaises(ConnectionResetError, device.Send)
+        self.assertEqual(len(self.devices), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
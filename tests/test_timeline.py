@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+import timeline
+from timeline import Timeline
+
+
+class TestTimeline(unittest.TestCase):
+    def test_Linear(self):
+        scene = Timeline(2, [(0, [0x000000, 0xff0000], "linear"), (4, [0xffffff, 0x000000], "linear")], loop=False)
+        self.assertEqual(scene.Render(0), [0x000000, 0xff0000])
+        self.assertEqual(scene.Render(2), [0x7f7f7f, 0x7f0000])
+        self.assertEqual(scene.Render(4), [])
+
+    def test_Step(self):
+        scene = Timeline(1, [(0, [0xff0000], "step"), (10, [0x00ff00], "step"), (20, [0x00ff00], "step")])
+        self.assertEqual(scene.Render(9), [0xff0000])
+        self.assertEqual(scene.Render(10), [0x00ff00])
+        # the timeline loops
+        self.assertEqual(scene.Render(25), [0xff0000])
+
+    def test_Easing(self):
+        scene = Timeline(1, [(0, [0x000000], "in"), (10, [0x0000ff], "linear")], loop=False)
+        self.assertEqual(scene.Render(5), [0x00003f])
+        self.assertRaises(ValueError, Timeline, 1, [(0, [0], "unknown")])
+
+    def test_LoadTimeline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "scene.txt")
+            with open(path, "w") as file:
+                file.write("# comment\n0 inout SingleColor 0xff0000\n\n0.5 step SingleColor 0x0000ff\n")
+            keyframes = timeline.LoadTimeline(path, 2, fps=10)
+            self.assertEqual(keyframes, [(0, [0xff0000] * 2, "inout"), (5, [0x0000ff] * 2, "step")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+timeline.py
+
+Keyframe based scenes: colors for all LEDs are defined at certain points in time (keyframes)
+and interpolated in between using easing curves.
+
+All interpolation coefficients are precomputed per segment (the time between two keyframes),
+so rendering a frame only costs one vectorized linear interpolation.
+
+The Timeline is a class based animation (see animator.py) and can be played like any other animation:
+    keyframes = [(0, [0xff0000] * n, "inout"), (30, [0x0000ff] * n, "linear")]
+    Animator(device, 30).Play(Timeline, keyframes)
+
+--------------------------------------------------
+                Timeline files
+--------------------------------------------------
+
+One keyframe per line, the colors of a keyframe are generated by an effect from effects.py:
+    <time in s> <easing> <effect name> [optional params]
+
+The easing of a keyframe is used for the transition to the next keyframe.
+Empty lines and lines starting with '#' are ignored.
+Example:
+    0   inout  SingleColor 0xff0000
+    2   linear Rainbow
+    4   step   SingleColor 0x000000
+    5   step   SingleColor 0x000000
+
+--------------------------------------------------
+                    Notes
+--------------------------------------------------
+- Available easings: see EASINGS
+- Keyframe times are time steps of the Animator (converted from s using the fps given to LoadTimeline())
+- The timeline either loops or ends after the last keyframe
+
+"""
+import math
+import bisect
+
+import numpy as np
+
+import effects
+from tools import colorarray
+from tools.arguments import CastString
+
+# easing curves mapping the progress u in [0, 1] of a segment to an interpolation factor in [0, 1]
+EASINGS = {
+    "linear": lambda u: u,
+    # hold the color of the keyframe until the next keyframe
+    "step": lambda u: 0.0,
+    "in": lambda u: u * u,
+    "out": lambda u: 1 - (1 - u) * (1 - u),
+    "inout": lambda u: u * u * (3 - 2 * u),
+    "sine": lambda u: 0.5 - 0.5 * math.cos(math.pi * u),
+}
+
+
+class Timeline:
+    """
+    Interpolates between keyframes
+
+    keyframes: a list of (time, colors, easing) tuples sorted by time. time is given in time steps,
+               colors is an array of n hex colors and easing the name of the easing curve (see EASINGS)
+               used for the transition to the next keyframe
+
+    loop: if True, the timeline restarts after the last keyframe. Otherwise the animation ends
+    """
+    def __init__(self, n, keyframes, loop=True):
+        if len(keyframes) == 0:
+            raise ValueError("A timeline needs at least one keyframe")
+        keyframes = sorted(keyframes, key=lambda keyframe: keyframe[0])
+        self.n = n
+        self.loop = loop
+        self.duration = keyframes[-1][0]
+
+        # precomputed segments; segment i interpolates from keyframe i to keyframe i + 1
+        self._starts = []
+        self._lengths = []
+        self._easings = []
+        self._origins = []
+        self._deltas = []
+        for i in range(len(keyframes)):
+            time, colors, easing = keyframes[i]
+            if easing not in EASINGS:
+                raise ValueError("Unknown easing '%s'. Available: %s" % (easing, ", ".join(EASINGS)))
+            origin = self._ToRGB(colors)
+            if i + 1 < len(keyframes):
+                nextTime, nextColors, _ = keyframes[i + 1]
+                delta = self._ToRGB(nextColors) - origin
+            else:
+                # the last keyframe holds its colors
+                nextTime, delta = time, np.zeros_like(origin)
+            self._starts.append(time)
+            self._lengths.append(max(1, nextTime - time))
+            self._easings.append(EASINGS[easing])
+            self._origins.append(origin)
+            self._deltas.append(delta)
+
+    def _ToRGB(self, colors):
+        # pad or cut the keyframe to n LEDs
+        colors = (list(colors) + [0x000000] * self.n)[:self.n]
+        return colorarray.ToRGB(colors, dtype=np.float32)
+
+    def Render(self, t):
+        if self.duration > 0 and t >= self.duration:
+            if not self.loop:
+                return []
+            t = t % self.duration
+        i = max(0, bisect.bisect_right(self._starts, t) - 1)
+        progress = min(1.0, (t - self._starts[i]) / self._lengths[i])
+        factor = self._easings[i](progress)
+        return colorarray.ToHex(self._origins[i] + self._deltas[i] * factor)
+
+
+def LoadTimeline(path, n, fps=30):
+    """
+    Load a timeline file (see module docstring)
+    @param path: the path of the timeline file
+    @param n: the number of LEDs
+    @param fps: the frame rate used to convert times in s into time steps
+    @return: a list of keyframes for the Timeline animation
+    @raise ValueError: if a line is invalid
+    """
+    keyframes = []
+    with open(path, "r") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            parts = line.split()
+            if len(parts) < 3:
+                raise ValueError("Line %d: expected '<time> <easing> <effect name> [params]'" % (number))
+            try:
+                time = round(float(parts[0]) * fps)
+            except ValueError:
+                raise ValueError("Line %d: invalid time '%s'" % (number, parts[0]))
+            if parts[1] not in EASINGS:
+                raise ValueError("Line %d: unknown easing '%s'" % (number, parts[1]))
+            effect = getattr(effects, parts[2], None)
+            if effect is None or parts[2].startswith("_"):
+                raise ValueError("Line %d: unknown effect '%s'" % (number, parts[2]))
+            args = [CastString(arg) for arg in parts[3:]]
+            keyframes.append((time, effect(n, *args), parts[1]))
+    return keyframes
@@ -0,0 +1,45 @@
+import ast
+import inspect
+
+"""
+
+    Parsing of effect and animation arguments
+
+    Effects and animations take their extra arguments as python values, while the CLI,
+    playlists and timelines provide them as strings. CastString() converts one string
+    argument into its native type; CheckAnimationArguments() verifies the arguments
+    against the signature of an animation before it is played, e.g. on a background thread.
+
+"""
+
+
+def CastString(s, warn=False):
+    """
+    Cast a string argument to its native python type, e.g. "0xff0000" to an int
+    @param s: the string argument
+    @param warn: if True, print a warning if the string is kept as it is
+    @return: the native value, or the string itself if it is no python literal
+    """
+    try:
+        # note: even though literal_eval is considered mostly safe, do not use this in unintended places.
+        # this is only needed to cast string arguments to python parameters for the effects functions.
+        return ast.literal_eval(s)
+    except (ValueError, SyntaxError):
+        if warn:
+            print("Warning: Could not convert value %s into native type; Will be interpreted as string" %(s))
+        return s
+
+
+def CheckAnimationArguments(animation, n, args):
+    """
+    Check that the given extra arguments fit the signature of an animation (see animator.py)
+    @param animation: the animation function, generator function or class
+    @param n: the number of LEDs
+    @param args: the extra arguments
+    @raise TypeError: if the arguments do not fit
+    """
+    if(inspect.isgeneratorfunction(animation) or inspect.isclass(animation)):
+        # stateful animations only take n and the extra arguments
+        inspect.signature(animation).bind(n, *args)
+    else:
+        inspect.signature(animation).bind(n, 0, *args)
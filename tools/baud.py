@@ -0,0 +1,91 @@
+import logging
+
+from tools import cache
+from tools.discovery import RunWithTimeout
+
+"""
+
+    Automatic baud rate detection for serial ALUP devices
+
+    Device.SerialConnect() hangs if the baud rate does not match the receiver.
+    DetectBaud() tries a list of standard baud rates, each with a strict timeout,
+    and remembers the working baud rate of every device (port and USB serial number)
+    on disk, so known devices connect right away on the next run.
+
+    NOTE: a serial port can only be opened with one baud rate at a time, so the baud rates
+    of one port are tried one after another. Different ports can be probed concurrently
+    (see tools/discovery.py).
+
+"""
+logger = logging.getLogger(__name__)
+
+# name of the on-disk cache holding the baud rate of each serial device
+CACHE_NAME = "baud"
+
+# baud rates to try, most common first
+BAUD_RATES = [115200, 921600, 500000, 230400, 1000000, 2000000, 250000, 57600, 38400, 19200, 9600]
+
+
+def DetectBaud(port:str, rates=None, timeout:float=1.5, useCache:bool=True):
+    """
+    Connect to the ALUP device on the given serial port using the first working baud rate
+
+    @param port: the serial port, e.g. "COM6" or "/dev/ttyUSB0"
+    @param rates: the baud rates to try. Defaults to BAUD_RATES
+    @param timeout: the maximum time in s for the handshake at one baud rate
+    @param useCache: if True, the cached baud rate of the device is tried first
+    @return: a tuple (device, baud) with the connected device, or None if no baud rate worked
+    """
+    key = _CacheKey(port)
+    rates = list(BAUD_RATES if rates is None else rates)
+    if useCache:
+        cached = cache.Load(CACHE_NAME).get(key)
+        if cached is not None:
+            logger.info("Trying cached baud rate for '%s': %d" % (key, cached))
+            # try the cached baud rate first
+            rates = [cached] + [rate for rate in rates if rate != cached]
+
+    for baud in rates:
+        logger.info("Trying baud rate %d on '%s'" % (baud, port))
+        device = _Connect(port, baud, timeout)
+        if device is not None:
+            SaveBaud(port, baud)
+            return device, baud
+    return None
+
+
+def SaveBaud(port:str, baud:int):
+    """
+    Store the given baud rate for the device on the given serial port
+    """
+    data = cache.Load(CACHE_NAME)
+    data[_CacheKey(port)] = baud
+    cache.Save(CACHE_NAME, data)
+
+
+def _Connect(port, baud, timeout):
+    # imported on use, so the baud rate detection can be used without a device library
+    from pyalup.Device import Device
+    device = Device()
+    if RunWithTimeout(_SerialConnect, timeout, device, port, baud) is not None:
+        return device
+    # the handshake did not complete in time; close the port, so the next attempt can open it
+    try:
+        device.Disconnect()
+    except Exception as e:
+        logger.debug("Could not close '%s' after a failed handshake: %s" % (port, e))
+    return None
+
+
+def _SerialConnect(device, port, baud):
+    device.SerialConnect(port, baud)
+    return device
+
+
+def _CacheKey(port):
+    # a port may be used by different devices; identify them by their USB serial number if available
+    import serial.tools.list_ports as list_ports
+    for info in list_ports.comports():
+        if info.device == port and info.serial_number:
+            return "%s/%s" % (port, info.serial_number)
+    return port
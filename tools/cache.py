@@ -0,0 +1,53 @@
+import os
+import json
+import logging
+
+"""
+
+    A small on-disk cache for values which were learned about ALUP devices
+    and which should survive a restart of the controller
+    (e.g. link characterizations)
+
+    Every cache is a single JSON file inside CACHE_DIR.
+    The directory can be changed using the ALUP_CACHE_DIR environment variable.
+
+"""
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("ALUP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".alup-controller"))
+
+
+def Load(name):
+    """
+    Load the cache with the given name
+    @param name: the name of the cache file without extension
+    @return: the cached dictionary or an empty dictionary if no (valid) cache exists
+    """
+    path = _CachePath(name)
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read cache '%s': %s" % (path, e))
+        return {}
+
+
+def Save(name, data):
+    """
+    Save the given dictionary as the cache with the given name
+    @param name: the name of the cache file without extension
+    @param data: a JSON serializable dictionary
+    """
+    path = _CachePath(name)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+    except OSError as e:
+        logger.warning("Could not write cache '%s': %s" % (path, e))
+
+
+def _CachePath(name):
+    return os.path.join(CACHE_DIR, name + ".json")
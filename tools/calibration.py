@@ -0,0 +1,102 @@
+import math
+import functools
+import time
+import logging
+import statistics
+from collections import namedtuple
+
+"""
+
+    Adaptive time synchronization calibration
+
+    Device.Calibrate() sends a fixed number of frames, whatever the quality of the link.
+    Calibrate() sends frames until the time delta converged instead: it monitors the
+    spread of the raw time delta measurements and the stability of their median, and
+    stops as soon as the median is accurate to the requested number of milliseconds.
+    A time budget caps the calibration, so fast links calibrate in a fraction of the
+    time while noisy links get all the frames they need.
+
+"""
+logger = logging.getLogger(__name__)
+
+# the result of a calibration
+# converged: True if the target accuracy was reached within the budget
+# frames: the number of frames sent
+# duration: the time in s the calibration took
+# spread: the standard error in ms of the median time delta
+# delta: the calibrated time delta in ms
+CalibrationResult = namedtuple("CalibrationResult", ["converged", "frames", "duration", "spread", "delta"])
+
+# the number of raw time deltas of which pyALUP uses the median (`_time_delta_buffer_size`)
+DEFAULT_WINDOW = 100
+
+
+def Calibrate(device, accuracy:float=1.0, budget:float=5.0, minFrames:int=20):
+    """
+    Calibrate the time synchronization of a device by sending frames until the time delta converged
+
+    @param device: the connected ALUP device
+    @param accuracy: the target accuracy of the time delta in ms
+    @param budget: the maximum time in s for the calibration
+    @param minFrames: the minimum number of frames to send. The median has to be stable for this many frames
+    @return: a CalibrationResult
+    """
+    window = getattr(device, "_time_delta_buffer_size", DEFAULT_WINDOW)
+    samples = []
+    medians = []
+    spread = math.inf
+    frames = 0
+    converged = False
+    # only responses carry a new time delta; a Send() may return before the frame was answered
+    responses = []
+    previousCallback = getattr(device, "_onFrameResponse", None)
+    device._onFrameResponse = functools.partial(_OnFrameResponse, device, responses, previousCallback)
+    # resend the current frame immediately, so the LEDs do not change
+    timestamp = device.frame.timestamp
+    start = time.time()
+    try:
+        while not converged:
+            device.frame.timestamp = 0
+            device.Send()
+            frames += 1
+            for raw in responses:
+                samples.append(raw)
+                recent = samples[-window:]
+                medians.append(statistics.median(recent))
+                if len(recent) >= 2:
+                    spread = _StandardError(recent)
+                if _Converged(medians, spread, accuracy, minFrames):
+                    converged = True
+                    break
+            responses.clear()
+            if not converged and time.time() - start >= budget:
+                break
+    finally:
+        device._onFrameResponse = previousCallback
+        device.frame.timestamp = timestamp
+
+    result = CalibrationResult(converged, frames, time.time() - start, spread, device.time_delta_ms)
+    if converged:
+        logger.info("Calibrated after %d frames (%.2fs): time delta %.1fms +- %.2fms" % (frames, result.duration, result.delta, spread))
+    else:
+        logger.warning("Calibration did not converge within %.1fs (%d frames): time delta %.1fms +- %.2fms" % (budget, frames, result.delta, spread))
+    return result
+
+
+def _OnFrameResponse(device, responses, previousCallback, frame):
+    responses.append(device._time_delta_ms_raw)
+    if previousCallback is not None:
+        previousCallback(frame)
+
+
+def _StandardError(samples):
+    # standard error of the median of normally distributed samples
+    return 1.2533 * statistics.stdev(samples) / math.sqrt(len(samples))
+
+
+def _Converged(medians, spread, accuracy, minFrames):
+    if len(medians) < minFrames or spread > accuracy:
+        return False
+    # the median did not move by more than the target accuracy lately
+    recent = medians[-minFrames:]
+    return max(recent) - min(recent) <= accuracy
@@ -0,0 +1,142 @@
+import os
+import mmap
+import struct
+import logging
+
+from tools import colorarray
+
+"""
+
+    Baked animation clips
+
+    Rendering complex animations in Python for every frame limits the frame rate on weak hosts.
+    Bake() renders an animation once into a clip file which can then be played back
+    without any rendering by memory-mapping it.
+
+    Playback decodes the memory-mapped frames in blocks of CHUNK_FRAMES frames, so
+    sequential playback converts the packed bytes once per block instead of once per frame.
+
+    File format (little endian):
+        header: magic "ALUPCLIP" (8 bytes), version (uint16), LED count (uint32),
+                frame count (uint32), fps (float32)
+        frames: frame count * LED count * 3 bytes of packed RGB values (r, g, b, r, g, b, ...)
+
+"""
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ALUPCLIP"
+VERSION = 1
+HEADER = struct.Struct("<8sHIIf")
+# the number of frames decoded at once during playback
+CHUNK_FRAMES = 64
+
+
+def Bake(path, render, n, frames, fps=30):
+    """
+    Render an animation into a clip file
+
+    @param path: the path of the clip file which is created (or overwritten). The file is only
+                 replaced once the clip is complete
+    @param render: a function render(t) returning the colors of the animation for time step t
+                   (see Animator.Renderer() in animator.py)
+    @param n: the number of LEDs
+    @param frames: the number of frames to render. Stops earlier if the animation ends (returns [])
+    @param fps: the frame rate at which the clip should be played back
+    @return: the number of rendered frames
+    """
+    black = [0x000000] * n
+    # render into a temporary file, so errors do not leave a partial clip behind
+    temporary = path + ".part"
+    try:
+        with open(temporary, "wb") as file:
+            # write the header with a placeholder frame count; updated when done
+            file.write(HEADER.pack(MAGIC, VERSION, n, 0, fps))
+            count = 0
+            for t in range(frames):
+                colors = render(t)
+                if len(colors) == 0:
+                    # the animation finished
+                    break
+                # pad / cut the frame to exactly n LEDs
+                colors = (list(colors) + black)[:n]
+                file.write(colorarray.ToBytes(colors))
+                count += 1
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, VERSION, n, count, fps))
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return count
+
+
+class Clip():
+    """
+    A baked animation clip which is memory-mapped for playback.
+
+    A Clip can be played like any animation function: calling clip(n, t)
+    returns frame t (looping). n is ignored as the LED count is fixed by the clip.
+    """
+    def __init__(self, path):
+        """
+        @param path: the path of the clip file
+        @raise ValueError: if the file is not a valid clip
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header = self._file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError("'%s' is not a clip file: File too short" % (path))
+            magic, version, self.ledCount, self.frameCount, self.fps = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("'%s' is not a clip file" % (path))
+            if version != VERSION:
+                raise ValueError("Unsupported clip version %d" % (version))
+            self.frameSize = self.ledCount * 3
+            if self.frameCount == 0 or self.frameSize == 0:
+                raise ValueError("Clip '%s' is empty" % (path))
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._map) < HEADER.size + self.frameCount * self.frameSize:
+                raise ValueError("Clip '%s' is truncated" % (path))
+        except Exception:
+            self._file.close()
+            raise
+        self.__name__ = path
+        # the decoded block of frames starting at frame _chunkStart
+        self._chunk = []
+        self._chunkStart = 0
+
+    def __len__(self):
+        return self.frameCount
+
+    def Frame(self, i):
+        """
+        Get frame i of the clip
+        @return: a list of hex colors with one entry for each LED
+        """
+        i %= self.frameCount
+        if not self._chunkStart <= i < self._chunkStart + len(self._chunk):
+            # decode the next block of frames at once
+            end = min(i + CHUNK_FRAMES, self.frameCount)
+            start = HEADER.size + i * self.frameSize
+            colors = colorarray.FromBytes(self._map[start : HEADER.size + end * self.frameSize])
+            self._chunk = [colors[k : k + self.ledCount] for k in range(0, len(colors), self.ledCount)]
+            self._chunkStart = i
+        return self._chunk[i - self._chunkStart]
+
+    def __call__(self, n, t):
+        if n != self.ledCount and t == 0:
+            logger.warning("Clip was baked for %d LEDs but the device has %d" % (self.ledCount, n))
+        return self.Frame(t)
+
+    def Close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
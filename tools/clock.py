@@ -0,0 +1,105 @@
+import time
+import logging
+
+from tools import cache
+
+"""
+
+    Persisted clock model of ALUP devices
+
+    The time synchronization of a device (the time delta between the sender's and the
+    receiver's clock) is learned from scratch on every connection, and the drift measured
+    by 'measure_drift' is thrown away. The clock model stores the last time delta, the drift
+    rate and the latency of each device on disk. On the next connection, the time delta is
+    predicted from the model and used as seed, so timestamps are accurate from the first frame.
+
+    If the receiver was restarted in the meantime, its clock starts from zero again.
+    A seed which disagrees with the first measured (raw) time delta is therefore discarded.
+
+"""
+logger = logging.getLogger(__name__)
+
+# name of the on-disk cache holding the clock model of each device
+CACHE_NAME = "clock"
+
+# the maximum difference in ms between the predicted and the measured time delta for a seed to be used
+MAX_SEED_ERROR_MS = 50
+
+
+def SaveClockModel(device, drift:float=None, latency:float=None):
+    """
+    Store the current time synchronization of the given device
+    @param device: the connected ALUP device
+    @param drift: the measured drift of the receiver's clock in s/s. Keeps the stored drift if None
+    @param latency: the typical device latency in ms. Defaults to the device's current latency
+    """
+    data = cache.Load(CACHE_NAME)
+    key = _CacheKey(device)
+    model = data.get(key, {})
+    model["delta"] = device.time_delta_ms
+    model["time"] = time.time()
+    model["latency"] = device.latency if latency is None else latency
+    if drift is not None:
+        model["drift"] = drift
+    model.setdefault("drift", 0.0)
+    data[key] = model
+    cache.Save(CACHE_NAME, data)
+
+
+def LoadClockModel(device):
+    """
+    @return: the stored clock model of the given device as dictionary with the keys
+             delta (ms), drift (s/s), latency (ms) and time (when it was saved), or None
+    """
+    return cache.Load(CACHE_NAME).get(_CacheKey(device))
+
+
+def PredictDelta(model, now:float=None):
+    """
+    Predict the time delta of a device from its clock model
+    @param model: the clock model (see LoadClockModel())
+    @param now: the time in s for which the delta is predicted. Defaults to the current time
+    @return: the predicted time delta in ms
+    """
+    now = time.time() if now is None else now
+    # the receiver's clock runs (1 + drift) times as fast as the sender's clock
+    return model["delta"] + model["drift"] * (now - model["time"]) * 1000
+
+
+def SeedClock(device, tolerance:float=MAX_SEED_ERROR_MS):
+    """
+    Seed the time synchronization of a freshly connected device with its stored clock model.
+    The seed is discarded if it disagrees with the raw time delta measured while connecting.
+    @param device: the connected ALUP device
+    @param tolerance: the maximum difference in ms between the predicted and the measured time delta
+    @return: True if the seed was applied
+    """
+    model = LoadClockModel(device)
+    if model is None:
+        return False
+    return ApplySeed(device, PredictDelta(model), tolerance + model.get("latency", 0))
+
+
+def ApplySeed(device, predicted:float, tolerance:float=MAX_SEED_ERROR_MS):
+    """
+    Use the given time delta for the device, unless it disagrees with the raw time delta measured by the device
+    @param predicted: the predicted time delta in ms
+    @param tolerance: the maximum difference in ms between the predicted and the measured time delta
+    @return: True if the seed was applied
+    """
+    measured = getattr(device, "_time_delta_ms_raw", None)
+    if measured is not None and abs(measured - predicted) > tolerance:
+        # e.g. the receiver restarted and its clock started from zero
+        logger.info("Discarding time delta seed: predicted %.1fms, measured %.1fms" % (predicted, measured))
+        return False
+    try:
+        device.time_delta_ms = predicted
+    except AttributeError:
+        logger.debug("The time delta can not be seeded")
+        return False
+    logger.info("Seeded time delta with %.1fms" % (predicted))
+    return True
+
+
+def _CacheKey(device):
+    return device.configuration.deviceName
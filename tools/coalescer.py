@@ -0,0 +1,143 @@
+import time
+import threading
+import logging
+
+"""
+
+    Latest-wins output stage for ALUP devices
+
+    When a source produces frames faster than the link can carry them, sending every
+    frame makes the latency grow without bound. The FrameCoalescer sits in front of
+    Device.Send(): producers submit frames without blocking and a sender thread always
+    sends the newest pending frame. Older pending frames are dropped, so the
+    end-to-end latency stays at one frame even when the link is overloaded.
+
+"""
+logger = logging.getLogger(__name__)
+
+
+class FrameCoalescer():
+    """
+    Coalescing send queue for one device
+    """
+    def __init__(self, device, flowControl=None, waitTimeout:float=0.1):
+        """
+        @param device: the connected ALUP device. While the coalescer is running, only the
+                       coalescer may send to the device
+        @param flowControl: optional FlowControl instance (see tools/flowcontrol.py) which
+                            is waited on before each send
+        @param waitTimeout: the maximum time in s to wait for the flow control before sending anyway
+        """
+        self.device = device
+        self.flowControl = flowControl
+        self.waitTimeout = waitTimeout
+        # the newest frame which was not sent yet as (colors, offset) or None
+        self._pending = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        # the exception which stopped the sender thread, if any
+        self.error = None
+        # statistics
+        self.produced = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._startTime = None
+
+    def Start(self):
+        """
+        Start the sender thread
+        """
+        if self._running:
+            return
+        self._running = True
+        self.error = None
+        self._startTime = time.time()
+        self._thread = threading.Thread(target=self._Run, name="FrameCoalescer", daemon=True)
+        self._thread.start()
+
+    def Stop(self, timeout:float=1.0):
+        """
+        Stop the sender thread. A pending frame is still sent before stopping
+        @param timeout: the maximum time in s to wait for the sender thread
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def Submit(self, colors, offset=0):
+        """
+        Queue the given frame for sending, replacing any frame which was not sent yet.
+        This never blocks on the device.
+        @param colors: the array of hex colors to send. It is copied, so the caller may reuse it
+        @param offset: the LED offset of the frame
+        @raise Exception: the exception which stopped the sender thread, e.g. because the connection was lost
+        """
+        with self._condition:
+            if self.error is not None:
+                raise self.error
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (list(colors), offset)
+            self.produced += 1
+            self._condition.notify()
+
+    def WaitDelivered(self, timeout:float=1.0):
+        """
+        Wait until every submitted frame was sent or dropped
+        @param timeout: the maximum time in s to wait
+        @return: True if all frames were handled, False on timeout
+        @raise Exception: the exception which stopped the sender thread
+        """
+        with self._condition:
+            handled = self._condition.wait_for(lambda: self.delivered + self.dropped >= self.produced or not self._running, timeout)
+            if self.error is not None:
+                raise self.error
+            return handled
+
+    def Rates(self):
+        """
+        @return: (produced fps, delivered fps) since the coalescer was started
+        """
+        if self._startTime is None:
+            return (0, 0)
+        elapsed = max(time.time() - self._startTime, 1e-6)
+        return (self.produced / elapsed, self.delivered / elapsed)
+
+    def _Run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                if self._pending is None:
+                    # stopped and nothing left to send
+                    return
+                colors, offset = self._pending
+                self._pending = None
+
+            try:
+                if self.flowControl is not None:
+                    self.flowControl.Wait(self.waitTimeout)
+                self.device.SetColors(colors)
+                self.device.frame.offset = offset
+                self.device.Send()
+                with self._condition:
+                    self.delivered += 1
+                    self._condition.notify_all()
+            except Exception as e:
+                logger.error("Sending failed, stopping frame coalescer: %s" % (e))
+                with self._condition:
+                    self.error = e
+                    self._running = False
+                    self._condition.notify_all()
+                return
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, *args):
+        self.Stop()
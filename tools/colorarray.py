@@ -0,0 +1,50 @@
+import numpy as np
+
+"""
+
+    Conversion between lists of hex colors (0xRRGGBB), as used by effects, animations
+    and pyalup, and NumPy RGB arrays of shape (n, 3) for vectorized processing
+
+"""
+
+
+def ToRGB(colors, dtype=np.uint8):
+    """
+    Convert a list of hex colors into an RGB array
+    @param colors: a list (or array) of hex colors in the format 0xRRGGBB
+    @param dtype: the dtype of the returned array
+    @return: an array of shape (n, 3) containing the r, g and b values in range [0, 255]
+    """
+    hexColors = np.asarray(colors, dtype=np.uint32)
+    rgb = np.empty((len(hexColors), 3), dtype=dtype)
+    rgb[:, 0] = (hexColors >> 16) & 0xFF
+    rgb[:, 1] = (hexColors >> 8) & 0xFF
+    rgb[:, 2] = hexColors & 0xFF
+    return rgb
+
+
+def ToHex(rgb):
+    """
+    Convert an RGB array into a list of hex colors.
+    Values are clipped to the range [0, 255]; float values are truncated.
+    @param rgb: an array of shape (n, 3)
+    @return: a list of n hex colors in the format 0xRRGGBB
+    """
+    rgb = np.clip(rgb, 0, 255).astype(np.uint32)
+    return ((rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]).tolist()
+
+
+def FromBytes(data):
+    """
+    Convert packed RGB bytes (r, g, b, r, g, b, ...) into a list of hex colors
+    @param data: a bytes-like object with a length divisible by 3
+    @return: a list of hex colors in the format 0xRRGGBB
+    """
+    return ToHex(np.frombuffer(data, dtype=np.uint8).reshape(-1, 3))
+
+
+def ToBytes(colors):
+    """
+    Convert a list of hex colors into packed RGB bytes (r, g, b, r, g, b, ...)
+    """
+    return ToRGB(colors).tobytes()
@@ -0,0 +1,269 @@
+import os
+import socket
+import struct
+import threading
+import contextlib
+import logging
+
+from tools import cache
+
+"""
+
+    Controller daemon and thin clients
+
+    Every start of the controller reconnects to the device, redoes the handshake and
+    recalibrates the time synchronization before anything can be sent. In daemon mode
+    the controller keeps the connection open and executes commands received from
+    thin clients (see alup-ctl.py) over a local Unix socket instead.
+
+    Protocol:
+    Every message is a header struct "<BI" (kind, payload length) followed by the payload.
+    Clients send COMMAND messages containing one CLI command line (UTF-8).
+    The daemon answers every command with one message of kind OK, ERROR or CLOSED
+    containing the command's output (UTF-8). CLOSED means the command ended the session
+    (e.g. 'exit') and the daemon shuts down.
+
+    The socket lives in a directory only the current user can access ($XDG_RUNTIME_DIR or a
+    private directory inside the cache directory) and is only accessible by its owner.
+
+    The output of a command is captured per thread using an OutputCapture, so output of
+    animations and other background threads is not mixed into the answer of a client.
+
+"""
+logger = logging.getLogger(__name__)
+
+# message kinds
+COMMAND = 1
+OK = 0
+ERROR = 2
+CLOSED = 3
+
+_HEADER = struct.Struct("<BI")
+
+
+def _DefaultSocket():
+    # a per-user directory, so other users can neither connect nor take the path first
+    directory = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(cache.CACHE_DIR, "run")
+    return os.path.join(directory, "alup-controller.sock")
+
+
+# the default location of the daemon's socket
+DEFAULT_SOCKET = os.environ.get("ALUP_SOCKET") or _DefaultSocket()
+
+
+def SendMessage(sock, kind:int, payload:bytes):
+    """
+    Send one message over the given socket
+    """
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def ReceiveMessage(sock):
+    """
+    Receive one message from the given socket
+    @return: a tuple (kind, payload) or None if the connection was closed
+    """
+    header = _ReceiveExactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    kind, length = _HEADER.unpack(header)
+    payload = _ReceiveExactly(sock, length)
+    if payload is None:
+        return None
+    return kind, payload
+
+
+def _ReceiveExactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class DaemonServer():
+    """
+    Serves commands from clients connected to a Unix socket
+    """
+    def __init__(self, handler, path:str=DEFAULT_SOCKET):
+        """
+        @param handler: function handler(line) executing one command line. Returns a tuple (kind, output)
+                        where kind is OK, ERROR or CLOSED. Commands of all clients are executed one at a time
+        @param path: the path of the Unix socket
+        """
+        self.handler = handler
+        self.path = path
+        self._socket = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def Start(self):
+        """
+        Create the socket and start accepting clients in the background
+        @raise OSError: if the socket can not be created, e.g. because another daemon is running
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            os.chmod(directory, 0o700)
+        if os.path.exists(self.path):
+            if _IsListening(self.path):
+                raise OSError("Another daemon is already listening on '%s'" % (self.path))
+            # left over from a daemon which did not shut down cleanly
+            os.unlink(self.path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the current user may control the devices. The socket is created with these permissions,
+        # so nobody can connect before they are set
+        umask = os.umask(0o177)
+        try:
+            self._socket.bind(self.path)
+        finally:
+            os.umask(umask)
+        self._socket.listen()
+        self._closed.clear()
+        threading.Thread(target=self._Accept, name="DaemonServer", daemon=True).start()
+        logger.info("Daemon listening on '%s'" % (self.path))
+
+    def Wait(self, timeout:float=None):
+        """
+        Block until the daemon was stopped
+        @return: True if the daemon was stopped, False on timeout
+        """
+        return self._closed.wait(timeout)
+
+    def Stop(self):
+        """
+        Stop accepting clients and remove the socket
+        """
+        if self._socket is None:
+            return
+        self._socket.close()
+        self._socket = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._closed.set()
+
+    def _Accept(self):
+        server = self._socket
+        while not self._closed.is_set():
+            try:
+                client, _ = server.accept()
+            except OSError:
+                # the socket was closed
+                break
+            threading.Thread(target=self._Serve, args=(client,), name="DaemonClient", daemon=True).start()
+
+    def _Serve(self, client):
+        with client:
+            while not self._closed.is_set():
+                try:
+                    message = ReceiveMessage(client)
+                except OSError:
+                    break
+                if message is None:
+                    break
+                kind, payload = message
+                if kind != COMMAND:
+                    SendMessage(client, ERROR, b"Unknown message kind %d" % (kind))
+                    continue
+                with self._lock:
+                    try:
+                        kind, output = self.handler(payload.decode("utf-8"))
+                    except Exception as e:
+                        logger.error("Command '%s' failed: %s" % (payload.decode("utf-8", "replace"), e))
+                        kind, output = ERROR, "Error: %s\n" % (e)
+                try:
+                    SendMessage(client, kind, output.encode("utf-8"))
+                except OSError:
+                    break
+                if kind == CLOSED:
+                    self.Stop()
+
+
+class OutputCapture():
+    """
+    A replacement for sys.stdout which captures the output of single threads.
+    The output of all other threads is written to the original stream
+    """
+    def __init__(self, stream):
+        """
+        @param stream: the original stream, e.g. sys.stdout
+        """
+        self.stream = stream
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def Capture(self, output):
+        """
+        Write the output of the current thread into the given stream while the context is active
+        @param output: the stream receiving the output, e.g. an io.StringIO
+        """
+        previous = getattr(self._local, "output", None)
+        self._local.output = output
+        try:
+            yield output
+        finally:
+            self._local.output = previous
+
+    def write(self, text):
+        return self._Target().write(text)
+
+    def flush(self):
+        self._Target().flush()
+
+    def __getattr__(self, name):
+        # e.g. encoding or isatty() of the original stream
+        return getattr(self.stream, name)
+
+    def _Target(self):
+        output = getattr(self._local, "output", None)
+        return self.stream if output is None else output
+
+
+def _IsListening(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+class DaemonClient():
+    """
+    A connection to a running daemon
+    """
+    def __init__(self, path:str=DEFAULT_SOCKET, timeout:float=None):
+        """
+        @param path: the path of the daemon's Unix socket
+        @param timeout: the maximum time in s to wait for the output of a command. None waits forever
+        @raise OSError: if no daemon is listening on the socket
+        """
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(path)
+
+    def Execute(self, line:str):
+        """
+        Execute one command line on the daemon
+        @return: a tuple (kind, output) where kind is OK, ERROR or CLOSED
+        @raise ConnectionError: if the daemon closed the connection
+        """
+        SendMessage(self._socket, COMMAND, line.encode("utf-8"))
+        message = ReceiveMessage(self._socket)
+        if message is None:
+            raise ConnectionError("The daemon closed the connection")
+        kind, payload = message
+        return kind, payload.decode("utf-8")
+
+    def Close(self):
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
@@ -0,0 +1,57 @@
+import time
+
+"""
+
+    Suppression of identical consecutive frames
+
+    Static scenes and simple animations (e.g. blink) send byte-identical frames
+    for most of their runtime. The FrameDeduplicator remembers the last sent frame
+    and suppresses unchanged frames, only letting a keepalive frame through
+    every now and then so the receiver resyncs if a frame got lost.
+    This frees bandwidth for other devices on a shared link.
+
+"""
+
+
+class FrameDeduplicator():
+    """
+    Decides whether a frame needs to be sent
+    """
+    def __init__(self, keepalive:float=1.0):
+        """
+        @param keepalive: the time in s after which an unchanged frame is sent anyway
+        """
+        self.keepalive = keepalive
+        # the last sent frame as (offset, colors). The frame itself is compared, not its hash,
+        # so a hash collision can not suppress a changed frame
+        self._lastFrame = None
+        self._lastSendTime = 0
+        # statistics
+        self.sent = 0
+        self.suppressed = 0
+
+    def ShouldSend(self, colors, offset=0):
+        """
+        Check whether the given frame differs from the last sent frame.
+        If it should be sent, it is remembered as the last sent frame.
+        @param colors: the array of hex colors of the frame
+        @param offset: the LED offset of the frame
+        @return: True if the frame has to be sent, False if it can be suppressed
+        """
+        frame = (offset, tuple(colors))
+        now = time.time()
+        if frame == self._lastFrame and now - self._lastSendTime < self.keepalive:
+            self.suppressed += 1
+            return False
+
+        self._lastFrame = frame
+        self._lastSendTime = now
+        self.sent += 1
+        return True
+
+    def Reset(self):
+        """
+        Forget the last sent frame, forcing the next frame to be sent
+        (e.g. after the LEDs were changed by someone else)
+        """
+        self._lastFrame = None
@@ -0,0 +1,202 @@
+import math
+import time
+import socket
+import logging
+import ipaddress
+import threading
+from collections import namedtuple
+
+"""
+
+    Discovery of ALUP devices
+
+    Probes serial ports and network hosts by connecting to them. Only devices which
+    complete the ALUP handshake are reported, together with their configuration.
+    The probes run concurrently on a bounded number of daemon threads. Network probes get a
+    share of the time budget, so every host is probed and a discovery takes about as long as
+    the whole budget instead of the sum of all probes, even for large networks.
+    Probes which did not finish in time are closed, so they release their ports and sockets.
+    Hanging probes (e.g. SerialConnect at a wrong baud rate) never keep the process from exiting.
+
+"""
+logger = logging.getLogger(__name__)
+
+# the default TCP port of ALUP devices
+TCP_PORT = 5012
+
+# the maximum number of probes running at the same time
+MAX_WORKERS = 64
+
+# a verified ALUP device. kind is "serial" or "tcp", address is the serial port or "host:port"
+DiscoveredDevice = namedtuple("DiscoveredDevice", ["kind", "address", "configuration"])
+
+
+def RunWithTimeout(function, timeout:float, *args):
+    """
+    Run a function on a worker thread and wait at most `timeout` seconds for it.
+    A function which does not finish in time keeps running in the background, but is ignored.
+    @return: the result of the function or None if it failed or timed out
+    """
+    return RunConcurrently([(function, args)], timeout)[0]
+
+
+def RunConcurrently(calls, timeout:float, workers:int=MAX_WORKERS):
+    """
+    Run multiple functions at the same time on daemon threads
+    @param calls: a list of (function, args) tuples
+    @param timeout: the maximum time in s to wait for all functions together
+    @param workers: the maximum number of functions running at the same time.
+                    Functions which did not start before the timeout are skipped and logged
+    @return: a list with the result of each function, or None if it failed, timed out or was skipped
+    """
+    if len(calls) == 0:
+        return []
+    results = [None] * len(calls)
+    finished = [False] * len(calls)
+    deadline = time.time() + timeout
+    lock = threading.Lock()
+    # the index of the next call to start
+    nextCall = [0]
+
+    def Work():
+        while True:
+            with lock:
+                i = nextCall[0]
+                if i >= len(calls) or time.time() >= deadline:
+                    return
+                nextCall[0] += 1
+            function, args = calls[i]
+            try:
+                result = function(*args)
+            except Exception as e:
+                logger.debug("%s%s failed: %s" % (getattr(function, "__name__", function), args, e))
+                result = None
+            with lock:
+                results[i] = result
+                finished[i] = True
+
+    # daemon threads, so functions which hang forever do not keep the process alive
+    threads = [threading.Thread(target=Work, name="Discovery", daemon=True) for _ in range(min(workers, len(calls)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(0, deadline - time.time()))
+
+    with lock:
+        # functions which did not finish in time are ignored
+        started = nextCall[0]
+        nextCall[0] = len(calls)
+        results = [result if done else None for result, done in zip(results, finished)]
+    if started < len(calls):
+        logger.warning("%d of %d probes did not start within %.1fs" % (len(calls) - started, len(calls), timeout))
+    return results
+
+
+def ExpandHosts(spec:str):
+    """
+    Get all hosts of a host specification
+    @param spec: comma separated hosts, networks or ranges, e.g. "192.168.1.0/24", "192.168.1.10-20" or "alup.local"
+    @return: a list of host names / ip addresses
+    @raise ValueError: if a network or range is invalid
+    """
+    hosts = []
+    for part in spec.split(","):
+        part = part.strip()
+        if part == "":
+            continue
+        if "/" in part:
+            network = ipaddress.ip_network(part, strict=False)
+            # single host networks (/32) have no separate host addresses
+            hosts += [str(host) for host in (network.hosts() if network.num_addresses > 1 else network)]
+        elif _IsRange(part):
+            # range of the last octet, e.g. 192.168.1.10-20
+            start, end = part.rsplit("-", 1)
+            prefix, first = start.rsplit(".", 1)
+            hosts += ["%s.%d" % (prefix, last) for last in range(int(first), int(end) + 1)]
+        else:
+            hosts.append(part)
+    return hosts
+
+
+def _IsRange(part):
+    start, _, end = part.rpartition("-")
+    try:
+        return isinstance(ipaddress.ip_address(start), ipaddress.IPv4Address) and end.isdigit() and int(end) <= 255
+    except ValueError:
+        # a host name
+        return False
+
+
+def ProbeSerial(port:str, baud:int=115200, opened=None):
+    """
+    Connect to a serial port and read the configuration of the ALUP device
+    @param opened: optional list to which the probing device is added, so it can be closed if the probe hangs
+    @return: a DiscoveredDevice
+    @raise Exception: if the port does not answer using ALUP
+    """
+    from pyalup.Device import Device
+    device = Device()
+    if opened is not None:
+        opened.append(device)
+    device.SerialConnect(port, baud)
+    try:
+        return DiscoveredDevice("serial", port, device.configuration)
+    finally:
+        device.Disconnect()
+
+
+def ProbeTcp(host:str, port:int=TCP_PORT, timeout:float=1.0, opened=None):
+    """
+    Connect to a network host and read the configuration of the ALUP device
+    @param opened: optional list to which the probing device is added, so it can be closed if the probe hangs
+    @return: a DiscoveredDevice
+    @raise Exception: if the host does not answer using ALUP
+    """
+    # check for an open port first; the ALUP handshake takes much longer to fail
+    socket.create_connection((host, port), timeout).close()
+    from pyalup.Device import Device
+    device = Device()
+    if opened is not None:
+        opened.append(device)
+    device.TcpConnect(host, port)
+    try:
+        return DiscoveredDevice("tcp", "%s:%d" % (host, port), device.configuration)
+    finally:
+        device.Disconnect()
+
+
+def Discover(ports=None, hosts=(), baud:int=115200, tcpPort:int=TCP_PORT, timeout:float=2.0):
+    """
+    Probe serial ports and network hosts for ALUP devices concurrently
+    @param ports: the serial ports to probe. Defaults to all available serial ports
+    @param hosts: the network hosts to probe (see ExpandHosts())
+    @param baud: the baud rate used for serial ports
+    @param tcpPort: the TCP port used for network hosts
+    @param timeout: the maximum time in s for the whole discovery. Each network probe gets a share of it,
+                    so all hosts are probed even if there are more hosts than MAX_WORKERS
+    @return: a list of DiscoveredDevice
+    """
+    if ports is None:
+        import serial.tools.list_ports as list_ports
+        ports = [port.device for port in list_ports.comports()]
+    # the devices opened by each probe
+    opened = [[] for _ in range(len(ports) + len(hosts))]
+    # the number of probes run one after another by each worker
+    rounds = max(1, math.ceil((len(ports) + len(hosts)) / MAX_WORKERS))
+    probeTimeout = timeout / rounds
+    calls = [(ProbeSerial, (port, baud, opened[i])) for i, port in enumerate(ports)]
+    calls += [(ProbeTcp, (host, tcpPort, probeTimeout, opened[len(ports) + i])) for i, host in enumerate(hosts)]
+    results = RunConcurrently(calls, timeout)
+    for result, devices in zip(results, opened):
+        if result is None:
+            # the probe failed or is still connecting; release its port or socket
+            for device in devices:
+                _Close(device)
+    return [result for result in results if result is not None]
+
+
+def _Close(device):
+    try:
+        device.Disconnect()
+    except Exception as e:
+        logger.debug("Could not close a probe: %s" % (e))
@@ -0,0 +1,121 @@
+import time
+import asyncio
+import logging
+
+"""
+
+    Sender-side flow control for ALUP devices
+
+    Every frame which was sent but not yet acknowledged occupies a slot in the
+    receiver's frame buffer (see `configuration.frameBufferSize`). If the sender
+    keeps sending while the buffer is full, Device.Send() blocks until a response
+    arrives. FlowControl keeps the number of frames in flight below a target
+    window and lets producers check or wait for a free slot before sending,
+    so they can pace themselves instead.
+
+    NOTE: pyALUP only processes responses inside Send() and FlushBuffer() on the calling
+    thread, so the number of unanswered frames does not drop while a producer merely waits.
+    FlushBuffer() waits for all outstanding responses and would empty the whole window, so it
+    is not used. Instead, a slot counts as free once the oldest frame beyond the window has been
+    in flight for one round trip (the device latency): its response has arrived and is processed
+    by the next Send(). A drain function which processes already received responses without
+    blocking can be given to free slots exactly instead.
+
+"""
+logger = logging.getLogger(__name__)
+
+
+class FlowControl():
+    """
+    Flow control window for one device
+    """
+    def __init__(self, device, window:int=None, pollInterval:float=0.0005, drain=None):
+        """
+        @param device: the connected ALUP device
+        @param window: the maximum number of frames in flight. Defaults to half of the receiver's frame buffer
+        @param pollInterval: time in s between two checks of the device state while waiting
+        @param drain: optional function processing the responses which already arrived, without waiting
+                      for the others. It is called on the waiting thread while the window is full
+        """
+        self.device = device
+        self.drain = drain
+        if window is None:
+            window = device.configuration.frameBufferSize // 2
+        self.window = max(1, window)
+        self.pollInterval = pollInterval
+        # statistics: number of times a producer had to wait and the total time spent waiting in s
+        self.waits = 0
+        self.waitTime = 0
+
+    def InFlight(self):
+        """
+        @return: the number of frames which were sent but not yet answered by the receiver
+        """
+        return len(self.device._unansweredFrames)
+
+    def Ready(self):
+        """
+        @return: True if another frame can be sent without exceeding the window
+        """
+        return self.InFlight() < self.window
+
+    def Wait(self, timeout:float):
+        """
+        Block until another frame can be sent, i.e. until one slot of the window is free
+        @param timeout: the maximum time to wait in s
+        @return: True if the device is ready, False if the timeout expired
+        """
+        if self.Ready():
+            return True
+        start = time.time()
+        self.waits += 1
+        try:
+            while True:
+                self._Drain()
+                if self._SlotFree():
+                    return True
+                if time.time() - start >= timeout:
+                    logger.debug("Flow control timed out with %d frames in flight" % (self.InFlight()))
+                    return False
+                time.sleep(self.pollInterval)
+        finally:
+            self.waitTime += time.time() - start
+
+    async def WaitAsync(self, timeout:float):
+        """
+        Awaitable version of Wait() for use in asyncio producers.
+        The responses are processed on a worker thread, so the device must not be used while waiting.
+        """
+        if self.Ready():
+            return True
+        loop = asyncio.get_running_loop()
+        start = time.time()
+        self.waits += 1
+        try:
+            while True:
+                if self.drain is not None:
+                    # not cancelled on timeout: the worker would keep using the device in the background
+                    await loop.run_in_executor(None, self.drain)
+                if self._SlotFree():
+                    return True
+                if time.time() - start >= timeout:
+                    return False
+                await asyncio.sleep(self.pollInterval)
+        finally:
+            self.waitTime += time.time() - start
+
+    def _Drain(self):
+        if self.drain is not None:
+            self.drain()
+
+    def _SlotFree(self):
+        frames = self.device._unansweredFrames
+        if len(frames) < self.window:
+            return True
+        # the response of this frame frees the first slot
+        frame = frames[len(frames) - self.window]
+        sent = getattr(frame, "_t_frame_out", None)
+        latency = getattr(self.device, "latency", None)
+        if sent is None or latency is None:
+            return False
+        return time.time_ns() / 1_000_000 >= sent + latency
@@ -0,0 +1,161 @@
+import time
+import logging
+
+from tools import cache
+
+"""
+
+    Automatic frame rate selection for ALUP devices
+
+    The highest frame rate a device can sustain depends on the baud rate / network,
+    the number of LEDs and the receiver hardware. Instead of guessing it, the
+    sustainable frame rate is measured by sending the first frames of an animation as
+    fast as possible (or taken from the cache of an earlier run) and then continuously
+    adjusted by an AIMD controller (additive increase, multiplicative decrease) which
+    reacts to rising latency and to frames backing up in the receiver's buffer.
+    Only frame rates which were sustained without congestion are cached.
+
+"""
+logger = logging.getLogger(__name__)
+
+# name of the on-disk cache holding the last known good frame rate of each device
+CACHE_NAME = "fps"
+
+
+def LoadFps(device):
+    """
+    @return: the cached sustainable frame rate of the given device, or None if it has to be probed (see FpsProbe)
+    """
+    key = _CacheKey(device)
+    cached = cache.Load(CACHE_NAME).get(key)
+    if cached is not None:
+        logger.info("Using cached frame rate for '%s': %.1f fps" % (key, cached))
+    return cached
+
+
+class FpsProbe():
+    """
+    Measures the throughput of a device using the first frames of an animation,
+    which have to be sent as fast as possible
+    """
+    def __init__(self, device, frames:int=20):
+        """
+        @param device: the ALUP device which is probed
+        @param frames: the number of frames to measure
+        """
+        self.device = device
+        self.frames = frames
+        self._sent = 0
+        self._start = None
+
+    def Sent(self):
+        """
+        Call this after every frame sent to the device
+        @return: the estimated frame rate after the last probe frame, None before
+        """
+        if self._start is None:
+            # the first frame starts the measurement
+            self._start = time.time()
+            return None
+        self._sent += 1
+        if self._sent < self.frames:
+            return None
+        # wait for all outstanding responses so the probe measures the complete round trip
+        self.device.FlushBuffer()
+        elapsed = time.time() - self._start
+        # leave some headroom below the measured throughput
+        fps = 0.9 * self._sent / max(elapsed, 1e-6)
+        logger.info("Probed frame rate for '%s': %.1f fps" % (_CacheKey(self.device), fps))
+        return fps
+
+
+def SaveFps(device, fps):
+    """
+    Store the given frame rate as the characterization of the given device
+    """
+    data = cache.Load(CACHE_NAME)
+    data[_CacheKey(device)] = fps
+    cache.Save(CACHE_NAME, data)
+
+
+def _CacheKey(device):
+    # the frame rate depends on the device and its number of LEDs
+    return "%s/%d" % (device.configuration.deviceName, device.configuration.ledCount)
+
+
+class FpsController():
+    """
+    AIMD frame rate controller.
+
+    After every sent frame, Update() has to be called. As long as the link is not congested,
+    the frame rate is increased by a constant amount per second. As soon as the device latency rises
+    noticeably above the lowest latency seen so far, or frames start to back up in the receiver's buffer,
+    the frame rate is reduced by a constant factor.
+    """
+    def __init__(self, device, fps:float=30, minFps:float=1, maxFps:float=120, increase:float=2.0, decrease:float=0.75, latencyFactor:float=1.5, steadyTime:float=1.0):
+        """
+        @param device: the ALUP device which is controlled
+        @param fps: the initial frame rate
+        @param minFps, maxFps: the range in which the frame rate is kept
+        @param increase: the additive increase of the frame rate in fps per second while the link is not congested
+        @param decrease: the multiplicative decrease factor applied on congestion. Range: (0, 1)
+        @param latencyFactor: the link counts as congested if the device latency exceeds the
+                              lowest observed latency by this factor
+        @param steadyTime: the time in s a frame rate has to be kept without congestion to count as sustainable
+        """
+        self.device = device
+        self.minFps = minFps
+        self.maxFps = maxFps
+        self.fps = min(maxFps, max(minFps, fps))
+        self.increase = increase
+        self.decrease = decrease
+        self.latencyFactor = latencyFactor
+        self.steadyTime = steadyTime
+        # the highest frame rate sustained for steadyTime without congestion, None if there was none yet
+        self.sustainedFps = None
+        # the lowest device latency seen so far in ms. Serves as the uncongested reference
+        self.baseLatency = None
+        # the maximum number of open responses before the link counts as congested
+        self.maxOpenResponses = max(1, device.configuration.frameBufferSize // 2)
+        # time of the last decrease; the rate is reduced at most once per round trip
+        self._lastDecrease = 0
+        # time since which the link was not congested
+        self._steadySince = None
+
+    def Update(self):
+        """
+        Adjust the frame rate according to the current state of the device.
+        Call this once after every sent frame.
+        @return: the new frame rate
+        """
+        latency = self.device.latency
+        if self.baseLatency is None or latency < self.baseLatency:
+            self.baseLatency = latency
+
+        now = time.time()
+        if self.IsCongested():
+            self._steadySince = None
+            # only decrease once per round trip, as the effect of the last decrease is not visible before
+            if (now - self._lastDecrease) * 1000 >= latency:
+                self.fps = max(self.minFps, self.fps * self.decrease)
+                self._lastDecrease = now
+        else:
+            if self._steadySince is None:
+                self._steadySince = now
+            elif now - self._steadySince >= self.steadyTime:
+                self.sustainedFps = max(self.sustainedFps or 0, self.fps)
+            # increase by `increase` fps per second, independent of the current frame rate
+            self.fps = min(self.maxFps, self.fps + self.increase / self.fps)
+        return self.fps
+
+    def IsCongested(self):
+        """
+        @return: True if the receiver's buffer fills up or the latency rises above the uncongested latency
+        """
+        if len(self.device._unansweredFrames) > self.maxOpenResponses:
+            return True
+        if self.baseLatency is None:
+            # no latency reference before the first Update()
+            return False
+        # allow for 1ms of jitter on very fast links
+        return self.device.latency > self.baseLatency * self.latencyFactor + 1
@@ -0,0 +1,153 @@
+import time
+
+"""
+
+    Kalman filtered tracking of a receiver's clock
+
+    pyALUP estimates the time delta to the receiver as the median of the last raw time deltas
+    (see `_time_delta_buffer_size`). The median lags behind and has no drift term, so its
+    error grows with the drift of the receiver's clock.
+    A ClockTracker fuses the four time stamps of every answered frame in a Kalman filter
+    with the state (offset, skew): the offset of the receiver's clock to the sender's clock
+    in ms and the rate at which it changes in ms/ms (= s/s). Each frame yields an NTP style
+    offset measurement whose uncertainty grows with the frame's round trip time, so frames
+    delayed by a full buffer or a busy link barely move the estimate.
+
+    All times are in ms. Pure Python, as the 2x2 matrices do not warrant NumPy.
+
+"""
+
+
+class ClockTracker():
+    """
+    Tracks the offset and skew of a receiver's clock
+    """
+    def __init__(self, offsetNoise:float=1e-6, skewNoise:float=1e-12, measurementNoise:float=0.25, gate:float=5.0, maxRejections:int=10):
+        """
+        @param offsetNoise: the variance in ms^2 the offset wanders by per ms (clock jitter)
+        @param skewNoise: the variance in (ms/ms)^2 the skew wanders by per ms (e.g. temperature changes)
+        @param measurementNoise: the base variance in ms^2 of an offset measurement (time stamp resolution)
+        @param gate: measurements further than this many standard deviations from the prediction are rejected
+        @param maxRejections: after this many consecutive rejected measurements, the offset is assumed to have
+                              jumped (e.g. the receiver rebooted) and the tracker restarts from the next measurement
+        """
+        self.offsetNoise = offsetNoise
+        self.skewNoise = skewNoise
+        self.measurementNoise = measurementNoise
+        self.gate = gate
+        self.maxRejections = maxRejections
+        # the state at self.time: offset in ms and skew in ms/ms
+        self.offset = None
+        self.skew = 0.0
+        self.time = None
+        # covariance of (offset, skew)
+        self.P = [[0.0, 0.0], [0.0, 0.0]]
+        # statistics
+        self.updates = 0
+        self.rejected = 0
+        self.resets = 0
+        self._rejectedInRow = 0
+
+    def Update(self, frame):
+        """
+        Add the time stamps of an answered frame
+        @param frame: a frame with the time stamps _t_frame_out, _t_receiver_in, _t_receiver_out and _t_response_in
+        @return: True if the measurement was used, False if it was rejected as outlier
+        """
+        return self.AddMeasurement(frame._t_frame_out, frame._t_receiver_in, frame._t_receiver_out, frame._t_response_in)
+
+    def AddMeasurement(self, t_frame_out:float, t_receiver_in:float, t_receiver_out:float, t_response_in:float):
+        """
+        Add the four time stamps of one frame
+        @param t_frame_out: sender time when the frame was sent
+        @param t_receiver_in: receiver time when the frame arrived
+        @param t_receiver_out: receiver time when the response was sent
+        @param t_response_in: sender time when the response arrived
+        @return: True if the measurement was used, False if it was rejected as outlier
+        """
+        # the offset assuming symmetric tx and rx latencies, measured halfway through the round trip
+        measured = ((t_receiver_in - t_frame_out) + (t_receiver_out - t_response_in)) / 2
+        at = (t_frame_out + t_response_in) / 2
+        # the offset is wrong by at most half of the network round trip (asymmetric latencies)
+        roundTrip = max((t_response_in - t_frame_out) - (t_receiver_out - t_receiver_in), 0)
+        R = self.measurementNoise + (roundTrip / 2) ** 2 / 3
+
+        if self.offset is None:
+            self._Reset(measured, at, R)
+            return True
+
+        self._Predict(at)
+        P = self.P
+        innovation = measured - self.offset
+        S = P[0][0] + R
+        if innovation ** 2 > self.gate ** 2 * S and self.updates > 2:
+            self.rejected += 1
+            self._rejectedInRow += 1
+            if self._rejectedInRow >= self.maxRejections:
+                # not an outlier, but a step of the receiver's clock. The skew of its oscillator stays the same
+                self.resets += 1
+                self._Reset(measured, at, R)
+                return True
+            return False
+        self._rejectedInRow = 0
+
+        # Kalman gain for the measurement matrix H = [1, 0]
+        k0 = P[0][0] / S
+        k1 = P[1][0] / S
+        self.offset += k0 * innovation
+        self.skew += k1 * innovation
+        self.P = [[(1 - k0) * P[0][0], (1 - k0) * P[0][1]],
+                  [P[1][0] - k1 * P[0][0], P[1][1] - k1 * P[0][1]]]
+        self.updates += 1
+        return True
+
+    def Offset(self, now:float=None):
+        """
+        @param now: the sender time in ms. Defaults to the current time
+        @return: the predicted offset of the receiver's clock in ms at the given time, or None before the first measurement
+        """
+        if self.offset is None:
+            return None
+        now = time.time_ns() / 1_000_000 if now is None else now
+        return self.offset + self.skew * (now - self.time)
+
+    def ReceiverTime(self, now:float=None):
+        """
+        Predict the receiver's local time, e.g. to schedule a frame
+        @param now: the sender time in ms. Defaults to the current time
+        @return: the predicted receiver time in ms, or None before the first measurement
+        """
+        now = time.time_ns() / 1_000_000 if now is None else now
+        offset = self.Offset(now)
+        return None if offset is None else now + offset
+
+    def OffsetError(self):
+        """
+        @return: the standard deviation in ms of the current offset estimate
+        """
+        return self.P[0][0] ** 0.5
+
+    def _Reset(self, offset, at, R):
+        self.offset = offset
+        self.time = at
+        self.P = [[R, 0.0], [0.0, 1e-6]]
+        self.updates += 1
+        self._rejectedInRow = 0
+
+    def _Predict(self, now):
+        dt = now - self.time
+        if dt <= 0:
+            # out of order time stamps; keep the state
+            return
+        P = self.P
+        # F = [[1, dt], [0, 1]]
+        p00 = P[0][0] + dt * (P[1][0] + P[0][1]) + dt * dt * P[1][1]
+        p01 = P[0][1] + dt * P[1][1]
+        p10 = P[1][0] + dt * P[1][1]
+        p11 = P[1][1]
+        # process noise: random walk of the offset and of the skew
+        q = self.skewNoise
+        self.P = [[p00 + self.offsetNoise * dt + q * dt ** 3 / 3, p01 + q * dt ** 2 / 2],
+                  [p10 + q * dt ** 2 / 2, p11 + q * dt]]
+        self.offset += self.skew * dt
+        self.time = now
@@ -0,0 +1,38 @@
+import sys
+import importlib
+import importlib.util
+
+"""
+
+    Lazy module imports
+
+    Many modules of the controller depend on NumPy or matplotlib, which take a long
+    time to import. LazyImport() returns a module object right away, but only executes
+    the module the first time one of its attributes is used. This keeps the startup
+    of the CLI fast for sessions which never play an animation or plot metrics.
+
+"""
+
+
+def LazyImport(name:str):
+    """
+    Import a module the first time one of its attributes is accessed
+    @param name: the full name of the module, e.g. "tools.metrics"
+    @return: the module. Already imported modules are returned as they are
+    @raise ModuleNotFoundError: if the module does not exist
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named '%s'" % (name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent != "":
+        # make the module available as attribute of its package, like a regular import
+        setattr(sys.modules[parent], child, module)
+    return module
@@ -1,12 +1,16 @@
 import colorsys
 import time
-from tqdm import tqdm
 from pyalup.Device import Device
 import logging
 import functools
-import numpy as np
-from matplotlib import pyplot as plt
 import statistics
+# NOTE: tqdm, NumPy and matplotlib are imported by the functions using them,
+# so importing this module (e.g. by the CLI) stays fast
+
+from tools.flowcontrol import FlowControl
+from tools import clock
+from tools import calibration
+from tools.kalman import ClockTracker
 
 """
 
@@ -68,6 +72,17 @@ class Metrics():
         # the time it took for the receiver to process the packet
         self.receiver_packet_processing_times = []   
 
+        # Kalman filtered clock tracking (see tools/kalman.py) for comparison with the median based time deltas
+        self.clock_tracker = ClockTracker()
+        # the sender times of all Kalman measurements (the first frame has no prediction)
+        self.kalman_sender_times = []
+        # the time delta predicted by the tracker before it saw the frame
+        self.kalman_time_deltas = []
+        # Error of the receiver time estimate using kalman_time_deltas (comparable to time_estimate_errors)
+        self.kalman_time_estimate_errors = []
+        # Kalman time estimate error corrected by the rx latency estimated using kalman_time_deltas
+        self.kalman_time_estimate_errors_corrected = []
+
         # the number of currently unanswered frames
         #NOTE: use this to monitor receiver's buffer usage
         self.openResponses = []
@@ -80,10 +95,13 @@ class Metrics():
         return len(self.sender_times)
 
 
-def Measure(device:Device,  measurements=10_000):
+def Measure(device:Device,  measurements=10_000, window=None):
     """
     Generate a large amount of ALUP-Packages and measure all relevant stats which are needed for
     calculation of further metrics.
+
+    @param window: if given, keep at most this many frames in flight using sender-side flow control.
+                   If None, frames are sent as fast as Device.Send() allows
     """
 
     if (logger.level > logging.INFO):
@@ -95,12 +113,17 @@ def Measure(device:Device,  measurements=10_000):
     # send some frames to get a first calibration for the time synchronization
     # This is NEEDED when using time stamps later on
     logger.info("Calibrating time delta")
-    device.Calibrate()
-    logger.info("Done")
+    calibration.Calibrate(device)
 
     # register data collection callback to collect data as soon as a frame gets its response
     device._onFrameResponse = functools.partial(log_device_stats, device, metrics)
 
+    flowControl = None
+    if window is not None:
+        flowControl = FlowControl(device, window)
+
+    from tqdm import tqdm
+
     print(f"Starting to take {measurements} Measurements for device '{device.configuration.deviceName}'.\nTo interrupt, press Ctrl + c.")
 
     # log the start time
@@ -109,6 +132,8 @@ def Measure(device:Device,  measurements=10_000):
         for i in tqdm(range(measurements)):
             # generate rainbow colors to simulate real RGB data
             device.SetColors(Rainbow(device.configuration.ledCount, i))
+            if flowControl is not None and not flowControl.Wait(timeout=1.0):
+                logger.warning("No free slot after 1s (%d frames in flight)" % (flowControl.InFlight()))
             # send data to device
             device.Send() 
             # NOTE: stats are logged automatically using a callback function
@@ -119,9 +144,12 @@ def Measure(device:Device,  measurements=10_000):
 
     # remove the callback from the device
     device._onFrameResponse = None
+    SaveClockModel(device, metrics)
     print("\n-------------[Done]-------------")
     print("Total runtime: " + str(time.strftime('%Hh:%Mm:%Ss', time.gmtime(metrics.runtime))))
     print("Measurements: " + str(len(metrics.sender_times)))
+    if flowControl is not None:
+        print("Flow control: waited %d times for %.3fs in total (window: %d)" % (flowControl.waits, flowControl.waitTime, flowControl.window))
     print("-----------------------------")
     return metrics
 
@@ -167,6 +195,17 @@ def log_device_stats(device, metrics, frame):
     time_estimate_error_corrected = time_estimate_error - rx_latency
     metrics.time_estimate_errors_corrected.append(time_estimate_error_corrected)
 
+    # predict the time delta using the Kalman tracker, then let it learn from this frame
+    kalman_time_delta = metrics.clock_tracker.Offset(sender_time)
+    if kalman_time_delta is not None:
+        metrics.kalman_sender_times.append(sender_time)
+        metrics.kalman_time_deltas.append(kalman_time_delta)
+        kalman_time_estimate_error = sender_time + kalman_time_delta - frame._t_receiver_out
+        metrics.kalman_time_estimate_errors.append(kalman_time_estimate_error)
+        kalman_rx_latency = (frame._t_response_in + kalman_time_delta) - frame._t_receiver_out
+        metrics.kalman_time_estimate_errors_corrected.append(kalman_time_estimate_error - kalman_rx_latency)
+    metrics.clock_tracker.Update(frame)
+
     metrics.receiver_packet_processing_times.append(frame._t_receiver_out - frame._t_receiver_in)
     metrics.openResponses.append(len(device._unansweredFrames))
 
@@ -175,6 +214,21 @@ def log_device_stats(device, metrics, frame):
 
 
 
+def SaveClockModel(device, metrics):
+    """
+    Store the time delta, drift and median latency of the given measurements as the device's clock model (see tools/clock.py)
+    """
+    if len(metrics.latencies) == 0:
+        return
+    try:
+        drift = GetDrift(metrics.sender_times, metrics.receiver_out_times)
+    except ZeroDivisionError:
+        # not enough data points; keep the stored drift
+        drift = None
+    clock.SaveClockModel(device, drift, statistics.median(metrics.latencies))
+
+
+
 def PrintSummary(metrics):
     """
     Print a summary of the most relevant metrics
@@ -197,6 +251,9 @@ def PrintSummary(metrics):
     PrintMetricSummary("Time Deltas (raw)", metrics.time_deltas_raw, "ms")
     PrintMetricSummary("Time Synchronization Error", metrics.time_estimate_errors, "ms")
     PrintMetricSummary("Time Synchronization Error (Corrected)", metrics.time_estimate_errors_corrected, "ms")
+    if len(metrics.kalman_time_estimate_errors) > 1:
+        PrintMetricSummary("Time Synchronization Error (Kalman)", metrics.kalman_time_estimate_errors, "ms")
+        PrintMetricSummary("Time Synchronization Error (Kalman, Corrected)", metrics.kalman_time_estimate_errors_corrected, "ms")
     print("\n------[Receiver]--------\n")
     PrintMetricSummary("Receiver Packet Processing time", metrics.receiver_packet_processing_times, "ms")
     PrintMetricSummary("Receiver Buffer Usage", metrics.openResponses)
@@ -226,6 +283,8 @@ def PrintDrift(metrics):
         print(f"True time drift: { receiver_true_time_drift:.10f} s/s or {receiver_true_time_drift * (60*60*24)} s/day")
         print(f"Time drift correction factor: {1/receiver_true_time_slope}")
         print(f"Estimated time drift: {receiver_estimated_time_drift:.10f} s/s or {receiver_estimated_time_drift * (60*60*24)} s/day")
+        tracker = metrics.clock_tracker
+        print(f"Kalman estimated time drift: {tracker.skew:.10f} s/s or {tracker.skew * (60*60*24)} s/day ({tracker.rejected} outliers rejected, {tracker.resets} resets)")
     except ZeroDivisionError:
         print("Could not calculate drift. Not enough data points")
 
@@ -254,6 +313,7 @@ def GetSlope(data_x, data_y):
 def Plot(device, metrics):
     if (metrics is None):
         return
+    from matplotlib import pyplot as plt
      # Create plot
     fig = plt.figure(figsize=(16, 8))
     plt.rcParams['figure.constrained_layout.use'] = True
@@ -305,6 +365,9 @@ def Plot(device, metrics):
     color = next(colors)["color"]
     axes[4].plot(metrics.sender_times, metrics.time_estimate_errors, color=color, alpha=0.3, label = "Estimated Receiver Time Error (Biased)")
     axes[4].plot(metrics.sender_times, metrics.time_estimate_errors_corrected, color=color, alpha=0.8, label = "Estimated Receiver Time Error (Corrected)")
+    color = next(colors)["color"]
+    axes[4].plot(metrics.kalman_sender_times, metrics.kalman_time_estimate_errors, color=color, alpha=0.3, label = "Kalman Receiver Time Error (Biased)")
+    axes[4].plot(metrics.kalman_sender_times, metrics.kalman_time_estimate_errors_corrected, color=color, alpha=0.8, label = "Kalman Receiver Time Error (Corrected)")
 
     #axes[5].plot(sender_times[0], group_latencies, color=color, label = "Group Latency")
 
@@ -345,6 +408,7 @@ def argmedian(data):
     @returns (index, median)
     """
 
+    import numpy as np
     indices = np.argsort(data)
     return (indices[len(data) // 2], data[indices[len(data) // 2]])
 
@@ -0,0 +1,102 @@
+import time
+import threading
+import logging
+
+"""
+
+    Background playback of animations
+
+    Animator.Play() blocks until the animation ends. An AnimationPlayer runs it on a
+    background thread instead, so the CLI stays usable while an animation is playing
+    and the animation can be paused, resumed, stopped and inspected at any time.
+
+"""
+logger = logging.getLogger(__name__)
+
+
+class AnimationPlayer():
+    """
+    Plays one animation on a background thread
+    """
+    def __init__(self, animator, animation, args=(), name=None, onFinish=None):
+        """
+        @param animator: the Animator (see animator.py) used for playing
+        @param animation: the animation to play
+        @param args: extra arguments for the animation
+        @param name: the name of the animation shown in the status. Defaults to the animation's name
+        @param onFinish: optional function called on the player thread after the animation ended or was stopped
+        """
+        self.animator = animator
+        self.animation = animation
+        self.args = args
+        self.name = name or getattr(animation, "__name__", str(animation))
+        self.onFinish = onFinish
+        # the exception which ended the animation, if any
+        self.error = None
+        self._thread = None
+
+    def Start(self):
+        """
+        Start playing the animation in the background
+        """
+        self._thread = threading.Thread(target=self._Run, name="AnimationPlayer", daemon=True)
+        self._thread.start()
+
+    def Stop(self, timeout:float=2.0):
+        """
+        Stop the animation and wait for the player thread to finish
+        @param timeout: the maximum time in s to wait. None waits until the thread finished
+        @return: True if the player thread finished, False if it is still sending
+        """
+        if self._thread is None or self._thread.is_alive():
+            # a finished animation must not leave a stop request behind for the next one
+            self.animator.Stop()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Animation '%s' did not stop within %.1fs" % (self.name, timeout))
+        return not self.IsRunning()
+
+    def Pause(self):
+        self.animator.Pause()
+
+    def Resume(self):
+        self.animator.Resume()
+
+    def IsRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def Status(self):
+        """
+        @return: a human readable summary of the animation's state and live statistics
+        """
+        anim = self.animator
+        if self.IsRunning():
+            state = "paused" if anim.IsPaused() else "playing"
+        elif self.error is not None:
+            state = "failed (%s)" % (self.error)
+        else:
+            state = "stopped"
+        runtime = 0 if anim.startTime is None else time.time() - anim.startTime
+        lines = [
+            "Animation '%s': %s" % (self.name, state),
+            "\tRuntime: %s, Frames: %d" % (time.strftime('%Hh:%Mm:%Ss', time.gmtime(runtime)), anim.frames),
+            "\tFPS: %.1f (target: %.1f), Late frames: %d" % (anim.ActualFps(), anim.fps, anim.lateFrames),
+            "\tSend latency: %sms, Frames in flight: %d" % (anim.device.latency, anim.flowControl.InFlight()),
+        ]
+        if anim.coalescer is not None:
+            produced, delivered = anim.coalescer.Rates()
+            lines.append("\tProduced: %.1f fps, Delivered: %.1f fps, Dropped frames: %d" % (produced, delivered, anim.coalescer.dropped))
+        if anim.dedup is not None:
+            lines.append("\tSuppressed identical frames: %d" % (anim.dedup.suppressed))
+        return "\n".join(lines)
+
+    def _Run(self):
+        try:
+            self.animator.Play(self.animation, *self.args)
+        except Exception as e:
+            logger.error("Animation '%s' failed: %s" % (self.name, e))
+            self.error = e
+        finally:
+            if self.onFinish is not None:
+                self.onFinish()
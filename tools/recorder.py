@@ -0,0 +1,168 @@
+import os
+import time
+import struct
+import threading
+import logging
+
+from tools import colorarray
+
+"""
+
+    Recording and replaying of sent frames
+
+    A Recorder captures every frame sent to a device (colors, offset, time stamp and the
+    local time of sending) into a compact append-only file. Recordings can be streamed
+    back to a device with Replay(), either with the original timing or as fast as possible.
+    This allows reproducing issues from the field and benchmarking the send path
+    with realistic traffic.
+
+    File format (little endian):
+        header: magic "ALUPREC1" (8 bytes)
+        records: send time in ns (int64), frame time stamp in ms (int64), offset (int32),
+                 number of colors (uint32), followed by the colors as packed RGB bytes
+
+"""
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ALUPREC1"
+RECORD = struct.Struct("<qqiI")
+
+# the longest pause in s between two replayed frames, e.g. between appended sessions
+MAX_GAP = 1.0
+
+
+class Recorder():
+    """
+    Records all frames sent to a device while it is running
+    """
+    def __init__(self, device, path):
+        """
+        @param device: the connected ALUP device to record
+        @param path: the recording file. If it exists, new frames are appended
+        """
+        self.device = device
+        self.path = path
+        self.frames = 0
+        self._file = None
+        self._lock = threading.Lock()
+        # the Send() set on the device instance before recording, if any
+        self._previousSend = None
+        self._recordingSend = None
+
+    def Start(self):
+        """
+        Start recording all frames sent using device.Send()
+        """
+        if self._file is not None:
+            return
+        isNew = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "ab")
+        if isNew:
+            self._file.write(MAGIC)
+        # intercept Send() of this device instance
+        self._previousSend = vars(self.device).get("Send")
+        send = self.device.Send
+        def RecordingSend(frame=None):
+            # only forwards once stopped, in case it is wrapped by someone else
+            if self._file is not None:
+                self._Record(self.device.frame if frame is None else frame)
+            if frame is None:
+                return send()
+            return send(frame)
+        self._recordingSend = RecordingSend
+        self.device.Send = RecordingSend
+
+    def Stop(self):
+        """
+        Stop recording and close the file
+        """
+        if self._file is None:
+            return
+        if vars(self.device).get("Send") is self._recordingSend:
+            # restore the previous Send(); if another wrapper was installed on top, it keeps calling ours
+            if self._previousSend is not None:
+                self.device.Send = self._previousSend
+            else:
+                del self.device.Send
+        self._recordingSend = None
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def IsRecording(self):
+        return self._file is not None
+
+    def _Record(self, frame):
+        colors = frame.colors or []
+        data = RECORD.pack(time.time_ns(), frame.timestamp or 0, frame.offset or 0, len(colors)) + colorarray.ToBytes(colors)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(data)
+                self.frames += 1
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, *args):
+        self.Stop()
+
+
+def ReadRecording(path):
+    """
+    Read the frames of a recording file
+    @param path: the recording file
+    @return: a generator yielding (send time in ns, time stamp in ms, offset, colors) for each frame
+    @raise ValueError: if the file is not a recording
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("'%s' is not a recording file" % (path))
+        while True:
+            header = file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                # end of file (a partially written last record is ignored)
+                return
+            sendTime, timestamp, offset, count = RECORD.unpack(header)
+            data = file.read(count * 3)
+            if len(data) < count * 3:
+                return
+            yield (sendTime, timestamp, offset, colorarray.FromBytes(data))
+
+
+def Replay(device, path, speed:float=1.0, maxGap:float=MAX_GAP):
+    """
+    Send the frames of a recording to the given device.
+    Recorded time stamps are not replayed as they refer to the receiver clock of the original session;
+    all frames are applied immediately.
+
+    @param device: the connected ALUP device
+    @param path: the recording file
+    @param speed: playback speed relative to the original timing. None sends as fast as possible
+    @param maxGap: longer pauses in s between two recorded frames (e.g. between appended sessions) are shortened to this
+    @return: the number of sent frames
+    @raise ValueError: if the speed is not positive or the file is not a recording
+    """
+    if speed is not None and speed <= 0:
+        raise ValueError("The playback speed has to be positive")
+    count = 0
+    start = None
+    previousSendTime = None
+    # the recorded time since the first frame in s, without long pauses
+    elapsed = 0
+    for sendTime, _, offset, colors in ReadRecording(path):
+        if speed is not None:
+            if start is None:
+                start = time.time()
+            else:
+                elapsed += min(max(0, (sendTime - previousSendTime) / 1e9), maxGap)
+            previousSendTime = sendTime
+            # wait until the frame is due relative to the first frame
+            due = start + elapsed / speed
+            time.sleep(max(0, due - time.time()))
+        device.SetColors(colors)
+        device.frame.offset = offset
+        device.frame.timestamp = 0
+        device.Send()
+        count += 1
+    return count
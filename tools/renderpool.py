@@ -0,0 +1,128 @@
+import os
+import inspect
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+"""
+
+    Process pool rendering of animations
+
+    Animator.Play() renders every frame on the main thread, so a CPU heavy animation
+    caps the frame rate and several devices share one core because of the GIL.
+    A RenderPool renders upcoming frames of an animation in worker processes ahead of time.
+    The workers write the rendered colors into slots of a shared memory ring buffer
+    instead of sending them back through pipes.
+
+    Only plain animation functions f(n, t, *args) can be rendered in a pool, as each frame
+    needs to be independent of the other frames. Frames are always returned in order,
+    so the result is identical to rendering them on the main thread.
+
+"""
+logger = logging.getLogger(__name__)
+
+# state of the current worker process, set by _RenderFrame()
+_worker = None
+
+
+class RenderPool():
+    """
+    Renders frames of one animation in worker processes
+    """
+    def __init__(self, animation, n, args=(), workers:int=None, lookahead:int=None):
+        """
+        @param animation: a plain animation function f(n, t, *args). Needs to be picklable
+                          (defined at module level)
+        @param n: the number of LEDs
+        @param args: extra arguments for the animation
+        @param workers: the number of worker processes. Defaults to the number of CPUs
+        @param lookahead: the number of frames rendered ahead of time. Defaults to twice the number of workers
+        @raise ValueError: if the animation is stateful (generator or class)
+        """
+        if not inspect.isfunction(animation) or inspect.isgeneratorfunction(animation):
+            raise ValueError("Only animation functions f(n, t) can be rendered in a process pool")
+        self.n = n
+        workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(workers)
+        self.slots = lookahead or 2 * workers
+        # one slot of n uint32 hex colors per frame rendered ahead
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, self.slots * n * 4))
+        self._buffer = np.ndarray((self.slots, n), dtype=np.uint32, buffer=self._memory.buf)
+        # workers are initialized lazily with the animation on their first task
+        self._task = (self._memory.name, self.slots, n, animation, tuple(args))
+        # frames which are currently rendered as (t, future)
+        self._pending = deque()
+        # the next time step to submit
+        self._next = 0
+
+    def Render(self, t):
+        """
+        Get the colors of time step t.
+        Time steps are expected in increasing order; any other order restarts the lookahead.
+        @return: a list of hex colors
+        """
+        if len(self._pending) == 0 or self._pending[0][0] != t:
+            self._Restart(t)
+        self._Fill()
+        _, future = self._pending.popleft()
+        length = future.result()
+        colors = self._buffer[t % self.slots, :length].tolist()
+        # the slot of this frame is free again
+        self._Fill()
+        return colors
+
+    def __call__(self, t):
+        return self.Render(t)
+
+    def _Restart(self, t):
+        for _, future in self._pending:
+            future.cancel()
+        # wait for running tasks, as they may still write into the slots
+        for _, future in self._pending:
+            if not future.cancelled():
+                future.exception()
+        self._pending.clear()
+        self._next = t
+
+    def _Fill(self):
+        while len(self._pending) < self.slots:
+            future = self._executor.submit(_RenderFrame, self._task, self._next, self._next % self.slots)
+            self._pending.append((self._next, future))
+            self._next += 1
+
+    def Close(self):
+        """
+        Stop all workers and free the shared memory
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        del self._buffer
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+
+def _RenderFrame(task, t, slot):
+    """
+    Render time step t in a worker process and write it into the given slot
+    @return: the number of written colors
+    """
+    global _worker
+    if _worker is None or _worker[0] != task[0]:
+        name, slots, n, animation, args = task
+        memory = shared_memory.SharedMemory(name=name)
+        buffer = np.ndarray((slots, n), dtype=np.uint32, buffer=memory.buf)
+        _worker = (name, memory, buffer, n, animation, args)
+    _, _, buffer, n, animation, args = _worker
+
+    colors = animation(n, t, *args)
+    length = min(len(colors), n)
+    buffer[slot, :length] = colors[:length]
+    return length
@@ -0,0 +1,172 @@
+import time
+import logging
+import functools
+import threading
+
+from tools import clock
+
+"""
+
+    Background resynchronization of idle connections
+
+    The time synchronization of a device is only updated when frames are sent, so an
+    idle connection (or one only sending time stamped frames far into the future)
+    drifts away from the receiver's clock. A Resynchronizer sends a sync frame every
+    now and then, fits the drift of the receiver's clock to the measured time deltas
+    and keeps the time delta of the device within the configured error bound.
+
+    The interval adapts to the measured drift: the faster the receiver's clock drifts,
+    the more often it is synchronized. Sync frames never compete with animation traffic:
+    they are skipped while other frames are sent and only sent if the device's lock
+    (see SupervisedDevice) is free.
+
+"""
+logger = logging.getLogger(__name__)
+
+
+class Resynchronizer():
+    """
+    Keeps the time synchronization of an idle device up to date on a background thread
+    """
+    def __init__(self, device, maxError:float=1.0, minInterval:float=0.5, maxInterval:float=60.0, history:int=20):
+        """
+        @param device: the connected device. A SupervisedDevice provides the lock and the time of the last send
+        @param maxError: the maximum error in ms the time delta may drift between two sync frames
+        @param minInterval: the minimum time in s between two sync frames
+        @param maxInterval: the maximum time in s between two sync frames
+        @param history: the number of sync measurements used to fit the drift
+        """
+        self.device = device
+        self.maxError = maxError
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.history = history
+        # the drift of the receiver's clock in s/s. Starts with the drift of the stored clock model
+        model = _LoadClockModel(device)
+        self.drift = model["drift"] if model is not None else 0.0
+        # (sender time in s, raw time delta in ms) of each sync frame
+        self.samples = []
+        # statistics
+        self.syncs = 0
+        self.skipped = 0
+        self._lock = getattr(device, "lock", None) or threading.Lock()
+        self._lastSync = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def Start(self):
+        """
+        Start resynchronizing in the background
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._Run, name="Resynchronizer", daemon=True)
+        self._thread.start()
+
+    def Stop(self, timeout:float=2.0):
+        """
+        Stop resynchronizing and wait for the background thread to finish
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def IsRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def Interval(self):
+        """
+        @return: the current time in s between two sync frames
+        """
+        if len(self.samples) < 3:
+            # the drift is not measured yet
+            return self.minInterval
+        # the time delta drifts by drift * 1000 ms per s
+        driftRate = abs(self.drift) * 1000
+        if driftRate == 0:
+            return self.maxInterval
+        return min(max(self.maxError / driftRate, self.minInterval), self.maxInterval)
+
+    def Sync(self):
+        """
+        Send a sync frame now, unless the device is busy
+        @return: True if a sync frame was sent
+        """
+        # low priority: never wait for animation traffic
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return False
+        # the time of the response and the raw time delta it carried
+        responses = []
+        try:
+            previousCallback = getattr(self.device, "_onFrameResponse", None)
+            self.device._onFrameResponse = functools.partial(_OnFrameResponse, self.device, responses, previousCallback)
+            try:
+                # the last frame is sent again with its original time stamp, so the LEDs do not change
+                self.device.Send()
+                # Send() returns before the response was processed
+                self.device.FlushBuffer()
+            finally:
+                self.device._onFrameResponse = previousCallback
+        finally:
+            self._lock.release()
+        now = time.time()
+        self._lastSync = now
+        self.syncs += 1
+        if len(responses) == 0:
+            return True
+
+        now, raw = responses[-1]
+        self.samples.append((now, raw))
+        del self.samples[:-self.history]
+        if len(self.samples) >= 3:
+            self.drift, predicted = _FitDrift(self.samples, now)
+            # the median of pyALUP lags behind for sparse frames; use the fitted time delta instead
+            try:
+                self.device.time_delta_ms = predicted
+            except AttributeError:
+                logger.debug("The time delta can not be set")
+        return True
+
+    def _Run(self):
+        while not self._stop.is_set():
+            interval = self.Interval()
+            lastSend = max(getattr(self.device, "lastSendTime", 0), self._lastSync)
+            wait = lastSend + interval - time.time()
+            if wait > 0:
+                # other frames were sent recently, so the time synchronization is up to date
+                self._stop.wait(min(wait, self.minInterval))
+                continue
+            try:
+                if not self.Sync():
+                    # busy; try again shortly
+                    self._stop.wait(self.minInterval / 10)
+            except Exception as e:
+                logger.warning("Resynchronization failed: %s" % (e))
+                self._stop.wait(self.maxInterval)
+
+
+def _OnFrameResponse(device, responses, previousCallback, frame):
+    responses.append((time.time(), device._time_delta_ms_raw))
+    if previousCallback is not None:
+        previousCallback(frame)
+
+
+def _FitDrift(samples, now):
+    # least squares fit of the raw time deltas over time
+    # @return: the drift in s/s and the fitted time delta in ms at the given time
+    n = len(samples)
+    meanT = sum(t for t, _ in samples) / n
+    meanD = sum(d for _, d in samples) / n
+    variance = sum((t - meanT) ** 2 for t, _ in samples)
+    if variance == 0:
+        return 0.0, meanD
+    slope = sum((t - meanT) * (d - meanD) for t, d in samples) / variance
+    return slope / 1000, meanD + slope * (now - meanT)
+
+
+def _LoadClockModel(device):
+    try:
+        return clock.LoadClockModel(device)
+    except AttributeError:
+        # the device has no configuration
+        return None
@@ -0,0 +1,107 @@
+"""
+
+    Multiple simultaneous device sessions
+
+    The SessionManager keeps any number of open device sessions by name, so the CLI
+    can switch between devices without disconnecting (and losing the time
+    synchronization of) the others. Sessions can be grouped using tags to run
+    commands on several devices at once.
+
+"""
+
+# the target selecting all sessions
+ALL = "all"
+
+
+class SessionManager():
+    """
+    Named sessions, their tags and the active session
+    """
+    def __init__(self):
+        # sessions by name, in the order they were added
+        self._sessions = {}
+        self._tags = {}
+        # the name of the session currently used by the CLI, if any
+        self.active = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, name):
+        return name in self._sessions
+
+    def Names(self):
+        return list(self._sessions)
+
+    def UniqueName(self, name:str):
+        """
+        @return: the given name, with a number appended if a session with this name already exists
+        """
+        unique = name
+        number = 2
+        while unique in self._sessions or unique == ALL:
+            unique = "%s-%d" % (name, number)
+            number += 1
+        return unique
+
+    def Add(self, name:str, session, tags=()):
+        """
+        Add a session
+        @param name: the unique name of the session
+        @param session: the session object, e.g. a connection of the CLI
+        @param tags: tags of the session
+        @raise ValueError: if the name is already used or reserved
+        """
+        if name in self._sessions or name == ALL:
+            raise ValueError("A session named '%s' already exists" % (name))
+        self._sessions[name] = session
+        self._tags[name] = set(tags)
+
+    def Remove(self, name:str):
+        """
+        Remove a session. If it was the active session, no session is active afterwards
+        @return: the removed session or None if it did not exist
+        """
+        self._tags.pop(name, None)
+        if self.active == name:
+            self.active = None
+        return self._sessions.pop(name, None)
+
+    def Get(self, name:str):
+        """
+        @return: the session with the given name or None
+        """
+        return self._sessions.get(name)
+
+    def Use(self, name:str):
+        """
+        Make the given session the active one
+        @raise KeyError: if there is no session with this name
+        """
+        if name not in self._sessions:
+            raise KeyError(name)
+        self.active = name
+
+    def Tag(self, name:str, *tags):
+        self._tags[name].update(tags)
+
+    def Untag(self, name:str, *tags):
+        self._tags[name].difference_update(tags)
+
+    def Tags(self, name:str):
+        """
+        @return: the sorted tags of the given session
+        """
+        return sorted(self._tags.get(name, ()))
+
+    def Select(self, target:str):
+        """
+        Get all sessions matching the given target
+        @param target: 'all', the name of a session or a tag
+        @return: a list of (name, session) tuples in the order the sessions were added
+        """
+        if target == ALL:
+            return list(self._sessions.items())
+        if target in self._sessions:
+            return [(target, self._sessions[target])]
+        return [(name, session) for name, session in self._sessions.items() if target in self._tags[name]]
@@ -0,0 +1,188 @@
+import time
+import logging
+import threading
+
+from tools import clock
+
+"""
+
+    Supervised device connections
+
+    USB resets and network outages break the connection to a device, which makes
+    every following Send() fail. A SupervisedDevice wraps a Device and reconnects
+    with exponential backoff as soon as a call fails because of the link.
+    After reconnecting, the last frame is shown again, callbacks and other attributes
+    set on the device are restored and the time synchronization of the old connection
+    is reused, so a running animation simply continues.
+
+    A SupervisedDevice can be used in place of a Device.
+
+"""
+logger = logging.getLogger(__name__)
+
+# errors which indicate a broken link (includes serial errors, timeouts and closed sockets)
+LINK_ERRORS = (OSError,)
+
+
+class SupervisedDevice():
+    """
+    Proxy for a Device which reconnects automatically
+    """
+    def __init__(self, connect, device=None, retries:int=None, backoff:float=0.1, maxBackoff:float=5.0):
+        """
+        @param connect: function returning a newly connected Device. Raises an error if the connection failed
+        @param device: the already connected device. If None, connect() is called right away
+        @param retries: the maximum number of reconnection attempts per failure. None retries forever
+        @param backoff: the time in s to wait after the first failed attempt. Doubles with every attempt
+        @param maxBackoff: the maximum time in s between two attempts
+        @raise Exception: any error of connect() if the first connection fails
+        """
+        self._connect = connect
+        self._device = device if device is not None else connect()
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        # held while sending or reconnecting
+        self.lock = threading.RLock()
+        # the time of the last successful send
+        self.lastSendTime = 0
+        # the number of reconnects so far
+        self.reconnects = 0
+        # attributes set through the proxy, restored after reconnecting
+        self._attributes = {}
+        # the colors and offset of the last sent frame
+        self._lastFrame = None
+        # set by Disconnect(); an intentionally closed connection is not restored
+        self._closed = False
+
+    @property
+    def device(self):
+        """
+        The currently connected device
+        """
+        return self._device
+
+    def __getattr__(self, name):
+        # only called for attributes which are not part of the proxy
+        if name in _OWN_ATTRIBUTES:
+            raise AttributeError(name)
+        return getattr(self._device, name)
+
+    def __setattr__(self, name, value):
+        # methods of the proxy may be replaced on the proxy itself (e.g. by the Recorder)
+        if name in _OWN_ATTRIBUTES or hasattr(type(self), name):
+            object.__setattr__(self, name, value)
+        else:
+            # the time synchronization is restored separately, as it is only valid if the receiver was not reset
+            if name not in _UNRESTORED_ATTRIBUTES:
+                self._attributes[name] = value
+            setattr(self._device, name, value)
+
+    def __delattr__(self, name):
+        if name in self.__dict__:
+            object.__delattr__(self, name)
+        else:
+            self._attributes.pop(name, None)
+            delattr(self._device, name)
+
+    def Send(self, *args, **kwargs):
+        with self.lock:
+            frame = self._device.frame
+            self._lastFrame = (frame.colors, frame.offset)
+            try:
+                result = self._device.Send(*args, **kwargs)
+            except LINK_ERRORS as e:
+                # reconnecting sends the last frame again
+                self.Reconnect(e)
+                return None
+            self.lastSendTime = time.time()
+            return result
+
+    def Clear(self, *args, **kwargs):
+        return self._Call("Clear", *args, **kwargs)
+
+    def FlushBuffer(self, *args, **kwargs):
+        return self._Call("FlushBuffer", *args, **kwargs)
+
+    def Calibrate(self, *args, **kwargs):
+        return self._Call("Calibrate", *args, **kwargs)
+
+    def Disconnect(self, *args, **kwargs):
+        with self.lock:
+            self._closed = True
+            return self._device.Disconnect(*args, **kwargs)
+
+    def _Call(self, name, *args, **kwargs):
+        # call a method of the device, retrying once after reconnecting
+        with self.lock:
+            try:
+                return getattr(self._device, name)(*args, **kwargs)
+            except LINK_ERRORS as e:
+                self.Reconnect(e)
+            return getattr(self._device, name)(*args, **kwargs)
+
+    def Reconnect(self, error=None):
+        """
+        Replace the connection by a new one, retrying with exponential backoff.
+        Restores the attributes, time synchronization and last frame of the old connection.
+        @param error: the error which broke the connection, re-raised if reconnecting is not possible
+        @raise Exception: the last connection error if all retries failed
+        """
+        with self.lock:
+            if self._closed:
+                if error is not None:
+                    raise error
+                return
+            logger.warning("Connection lost (%s). Reconnecting..." % (error))
+            old = self._device
+            self._Close(old)
+            delay = self.backoff
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    self._device = self._connect()
+                    self._Restore(old)
+                    break
+                except Exception as e:
+                    if self._device is not old:
+                        # connected, but restoring failed
+                        self._Close(self._device)
+                        self._device = old
+                    if self.retries is not None and attempt >= self.retries:
+                        logger.error("Could not reconnect after %d attempts: %s" % (attempt, e))
+                        raise
+                    logger.info("Reconnect attempt %d failed: %s. Retrying in %.1fs" % (attempt, e, delay))
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.maxBackoff)
+
+            self.reconnects += 1
+            logger.warning("Reconnected after %d attempt(s)" % (attempt))
+
+    def _Close(self, device):
+        try:
+            device.Disconnect()
+        except Exception:
+            # the link is broken already
+            pass
+
+    def _Restore(self, old):
+        device = self._device
+        for name, value in self._attributes.items():
+            setattr(device, name, value)
+        # reuse the time synchronization instead of calibrating again, unless the receiver's clock was reset
+        clock.ApplySeed(device, old.time_delta_ms, clock.MAX_SEED_ERROR_MS + old.latency)
+        if self._lastFrame is not None:
+            colors, offset = self._lastFrame
+            device.SetColors(colors)
+            device.frame.offset = offset
+            device.Send()
+            self.lastSendTime = time.time()
+
+
+# attributes which belong to the proxy instead of the device
+_OWN_ATTRIBUTES = {"_connect", "_device", "retries", "backoff", "maxBackoff", "lock", "lastSendTime", "reconnects",
+                   "_attributes", "_lastFrame", "_closed"}
+
+# attributes forwarded to the device, but not reapplied to a new connection
+_UNRESTORED_ATTRIBUTES = {"time_delta_ms"}
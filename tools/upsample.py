@@ -0,0 +1,75 @@
+import numpy as np
+
+from tools import colorarray
+
+"""
+
+    Temporal upsampling of animations
+
+    Some animations are too expensive to render at the maximum frame rate of the link.
+    A FrameUpsampler renders the animation at a lower "logic" rate (one time step every
+    `factor` frames) and generates the frames in between by linear interpolation
+    between the last two rendered frames. The animation looks smooth at the full
+    frame rate while only a fraction of the frames is rendered.
+
+    NOTE: interpolating towards the newest rendered frame delays the animation by up to one time step
+
+"""
+
+
+class FrameUpsampler():
+    """
+    Interpolates between the frames of a render function
+    """
+    def __init__(self, render, factor:int):
+        """
+        @param render: the render function render(t) of the animation (see Animator.Renderer())
+        @param factor: the number of frames per animation time step. Range: [1, ...]
+        """
+        if factor < 1:
+            raise ValueError("The upsampling factor needs to be at least 1")
+        self.render = render
+        self.factor = factor
+        # the last two rendered frames as RGB arrays
+        self._previous = None
+        self._current = None
+        # the rendered frame as hex colors, returned directly when no interpolation is needed
+        self._currentColors = None
+        self._static = False
+        # the next expected frame
+        self._next = 0
+        # statistics
+        self.rendered = 0
+
+    def Render(self, frame):
+        """
+        Get the colors of the given frame. Frames are expected in increasing order;
+        any other order restarts the interpolation.
+        @param frame: the frame counter, increasing by one per sent frame
+        @return: a list of hex colors. An empty array marks the end of the animation
+        """
+        step, phase = divmod(frame, self.factor)
+        if phase == 0 or frame != self._next or self._current is None:
+            colors = self.render(step)
+            if len(colors) == 0:
+                return []
+            self.rendered += 1
+            rgb = colorarray.ToRGB(colors, dtype=np.float32)
+            if frame != self._next or self._current is None or len(rgb) != len(self._current):
+                # nothing to interpolate from
+                self._previous = rgb
+            else:
+                self._previous = self._current
+            self._current = rgb
+            # copy, as stateful animations may reuse their buffer
+            self._currentColors = list(colors)
+            self._static = np.array_equal(self._previous, self._current)
+        self._next = frame + 1
+
+        if self._static or phase == self.factor - 1:
+            return self._currentColors
+        alpha = (phase + 1) / self.factor
+        return colorarray.ToHex(self._previous + (self._current - self._previous) * alpha)
+
+    def __call__(self, frame):
+        return self.Render(frame)